@@ -0,0 +1,46 @@
+"""Times the parser on import-heavy files.
+
+Every class, function and call visitor used to receive its own copy of the import tables, so the cost of parsing a
+file grew with the number of imports times the number of scopes. Run with::
+
+    python -m benchmarks.bench_imports
+"""
+import timeit
+
+from codegrapher.parser import FileObject
+
+
+def import_heavy_source(imports, classes=20, methods=10):
+    """Builds a module with `imports` import statements followed by `classes` classes of `methods` methods each."""
+    lines = []
+    for index in range(imports):
+        if index % 2:
+            lines.append('import package{0}.module{0} as module{0}'.format(index))
+        else:
+            lines.append('from package{0} import name{0} as alias{0}'.format(index))
+    for class_index in range(classes):
+        lines.append('class Class{}(object):'.format(class_index))
+        for method_index in range(methods):
+            lines.append('    def method{}(self):'.format(method_index))
+            lines.append('        alias0(module1.call(alias2(self.value)), str(len(self.items)))')
+    return '\n'.join(lines) + '\n'
+
+
+def bench(imports, repeat=3):
+    source = import_heavy_source(imports)
+
+    def parse():
+        file_object = FileObject('imports.py', source=source)
+        file_object.visit()
+
+    return min(timeit.repeat(parse, number=1, repeat=repeat))
+
+
+def main():
+    print('{:>8} {:>12}'.format('imports', 'seconds'))
+    for imports in (10, 100, 300, 1000):
+        print('{:>8} {:>12.4f}'.format(imports, bench(imports)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Times call extraction on pathologically nested expressions.
+
+Arguments that are themselves calls used to be visited once per enclosing call, so `f(g(h(x)))` style code took time
+exponential in the nesting depth and recorded the innermost calls many times. Run with::
+
+    python -m benchmarks.bench_nesting
+"""
+import timeit
+
+from codegrapher.parser import FileObject
+
+
+def nested_source(depth):
+    """Builds a method whose body is a single call nested `depth` levels deep, as in ``f0(f1(f2(x)))``."""
+    expression = 'x'
+    for index in reversed(range(depth)):
+        expression = 'f{}({})'.format(index, expression)
+    return 'class Nested(object):\n    def method(self):\n        return {}\n'.format(expression)
+
+
+def builder_source(length):
+    """Builds a method whose body chains `length` builder calls, each taking a call as argument."""
+    expression = 'Builder()'
+    for index in range(length):
+        expression = '{}.step{}(value({}))'.format(expression, index, index)
+    return 'class Chained(object):\n    def method(self):\n        return {}\n'.format(expression)
+
+
+def bench(source, repeat=3):
+    calls = []
+
+    def parse():
+        file_object = FileObject('nested.py', source=source)
+        file_object.visit()
+        calls[:] = [call for call_list in file_object.classes[0].call_tree.values() for call in call_list]
+
+    seconds = min(timeit.repeat(parse, number=1, repeat=repeat))
+    return seconds, len(calls)
+
+
+def main():
+    print('{:>8} {:>8} {:>12} {:>8}'.format('shape', 'size', 'seconds', 'calls'))
+    for depth in (4, 8, 12, 16):
+        seconds, calls = bench(nested_source(depth))
+        print('{:>8} {:>8} {:>12.4f} {:>8}'.format('nested', depth, seconds, calls))
+    for length in (10, 100, 400):
+        seconds, calls = bench(builder_source(length))
+        print('{:>8} {:>8} {:>12.4f} {:>8}'.format('builder', length, seconds, calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Synthetic and real-world corpora for the benchmarks.
+
+Each corpus function writes Python files under a directory and returns their paths, in a deterministic order.
+"""
+import os
+import sysconfig
+
+from benchmarks.bench_imports import import_heavy_source
+from benchmarks.bench_nesting import builder_source, nested_source
+
+
+def class_source(classes, methods, calls):
+    """Builds a module with `classes` classes of `methods` methods, each method making `calls` calls."""
+    lines = ['import os', 'from collections import OrderedDict as od', '']
+    for class_index in range(classes):
+        lines.append('class Class{}(object):'.format(class_index))
+        for method_index in range(methods):
+            lines.append('    def method{}(self, value):'.format(method_index))
+            for call_index in range(calls):
+                lines.append('        self.method{}(os.path.join(od(), str(value)), key=Class{}())'.format(
+                    (method_index + call_index) % methods, (class_index + call_index) % classes))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def write_files(directory, sources):
+    """Writes `(relative name, source)` pairs under `directory`, spreading files over sub-packages."""
+    file_names = []
+    for index, (name, source) in enumerate(sources):
+        package = os.path.join(directory, 'package{}'.format(index // 100))
+        if not os.path.isdir(package):
+            os.makedirs(package)
+        file_name = os.path.join(package, name)
+        with open(file_name, 'w') as output_file:
+            output_file.write(source)
+        file_names.append(file_name)
+    return file_names
+
+
+def many_small_files(directory, scale=1):
+    """Lots of small modules, as found in large applications."""
+    return write_files(directory, (('module{}.py'.format(index), class_source(2, 4, 3))
+                                   for index in range(200 * scale)))
+
+
+def huge_files(directory, scale=1):
+    """A few very large modules."""
+    return write_files(directory, (('huge{}.py'.format(index), class_source(100 * scale, 20, 5))
+                                   for index in range(3)))
+
+
+def deep_nesting(directory, scale=1):
+    """Deeply nested and long chained calls."""
+    sources = []
+    for index in range(20 * scale):
+        sources.append(('nested{}.py'.format(index), nested_source(40)))
+        sources.append(('chained{}.py'.format(index), builder_source(150)))
+    return write_files(directory, sources)
+
+
+def import_heavy(directory, scale=1):
+    """Modules with hundreds of imports."""
+    return write_files(directory, (('imports{}.py'.format(index), import_heavy_source(500))
+                                   for index in range(10 * scale)))
+
+
+def stdlib_root():
+    """Directory of the standard library running the benchmarks, which its modules are named relative to."""
+    return sysconfig.get_paths()['stdlib']
+
+
+def stdlib(directory=None, scale=1):
+    """The Python modules of the standard library running the benchmarks, without its test suites. `scale` limits
+    the number of files to `500 * scale`.
+    """
+    root = stdlib_root()
+    file_names = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames
+                             if name not in ('test', 'tests', 'idle_test', 'site-packages', '__pycache__'))
+        file_names.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith('.py'))
+    return file_names[:500 * scale]
+
+
+CORPORA = {
+    'many_small_files': many_small_files,
+    'huge_files': huge_files,
+    'deep_nesting': deep_nesting,
+    'import_heavy': import_heavy,
+    'stdlib': stdlib,
+}
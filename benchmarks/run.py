@@ -0,0 +1,189 @@
+"""Benchmark suite for the parser and grapher hot paths.
+
+Runs the whole pipeline over each corpus of :mod:`benchmarks.corpus` and reports, as JSON, files and edges processed
+per second, the peak resident set size and the time spent in each stage. Each corpus runs in a fresh process so peak
+memory figures do not leak between corpora. As in the command line tool, every file is kept until all of them are
+parsed and then graphed together; `--lean` drops their ASTs as soon as they are visited. Run with::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json
+    python -m benchmarks.run huge_files --lean
+
+When a baseline is given, corpora more than `--tolerance` slower than in the baseline are reported and the exit status
+is non-zero.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import codegrapher
+from benchmarks.corpus import CORPORA, stdlib_root
+from codegrapher.discovery import find_files
+from codegrapher.graph import FunctionGrapher
+from codegrapher.parser import FileObject
+
+STAGES = ('discover', 'read', 'parse', 'visit', 'filter', 'graph', 'write_dot')
+
+
+def peak_rss_kb():
+    """Peak resident set size of the current process, in kilobytes, or `None` where it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_corpus(name, scale=1, lean=False):
+    """Generates a corpus and times each stage of the pipeline over it.
+
+    Returns:
+        (dict): Measurements for the corpus.
+    """
+    directory = tempfile.mkdtemp(prefix='codegrapher-bench-')
+    try:
+        file_names = CORPORA[name](directory, scale)
+        stages = dict((stage, 0.0) for stage in STAGES)
+        failed = 0
+
+        start = time.perf_counter()
+        if name != 'stdlib':
+            file_names = list(find_files(directory, recursive=True))
+        stages['discover'] += time.perf_counter() - start
+        # files are named relative to the root of their corpus, so their namespaces are those of a real run over it
+        root = stdlib_root() if name == 'stdlib' else directory
+
+        file_objects = []
+        for file_name in file_names:
+            start = time.perf_counter()
+            with open(file_name, 'rb') as input_file:
+                source = input_file.read()
+            read = time.perf_counter()
+            try:
+                file_object = FileObject(os.path.relpath(file_name, root), source=source)
+            except (SyntaxError, ValueError):
+                failed += 1
+                continue
+            parsed = time.perf_counter()
+            file_object.visit()
+            visited = time.perf_counter()
+            file_object.remove_builtins()
+            if lean:
+                file_object.release()
+            file_objects.append(file_object)
+            filtered = time.perf_counter()
+            stages['read'] += read - start
+            stages['parse'] += parsed - read
+            stages['visit'] += visited - parsed
+            stages['filter'] += filtered - visited
+
+        start = time.perf_counter()
+        graph = FunctionGrapher()
+        graph.add_files_to_graph(file_objects)
+        stages['graph'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as output_file:
+            graph.write_dot(output_file)
+        stages['write_dot'] += time.perf_counter() - start
+
+        seconds = sum(stages.values())
+        files = len(file_names) - failed
+        edges = sum(1 for _ in graph.iter_edges())
+        return {
+            'files': files,
+            'failed_files': failed,
+            'nodes': sum(1 for _ in graph.iter_nodes()),
+            'edges': edges,
+            'seconds': seconds,
+            'files_per_second': files / seconds if seconds else None,
+            'edges_per_second': edges / seconds if seconds else None,
+            'peak_rss_kb': peak_rss_kb(),
+            'stages': stages,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(corpora, scale=1, lean=False):
+    """Runs each corpus in its own fresh process.
+
+    Returns:
+        (dict): Environment description and measurements by corpus.
+    """
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in corpora:
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(run_corpus, (name, scale, lean))
+    return {
+        'codegrapher': codegrapher.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'lean': lean,
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Compares the total time of each corpus with a baseline report.
+
+    Returns:
+        (list): `(corpus, ratio)` pairs for corpora slower than the baseline by more than `tolerance`.
+    """
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        reference = baseline.get('results', {}).get(name)
+        if not reference or not reference['seconds']:
+            continue
+        ratio = result['seconds'] / reference['seconds']
+        sys.stderr.write('{:<20} {:>8.3f}s {:>8.3f}s {:>7.2f}x\n'.format(name, reference['seconds'],
+                                                                       result['seconds'], ratio))
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpora', nargs='*', metavar='corpus',
+                        help='corpora to run, among {}, all by default'.format(', '.join(sorted(CORPORA))))
+    parser.add_argument('--scale', type=int, default=1, help='multiplies the size of the synthetic corpora')
+    parser.add_argument('--lean', action='store_true', help='drop the ASTs of files as soon as they are visited')
+    parser.add_argument('--output', help='file the JSON report is written to, standard output by default')
+    parser.add_argument('--baseline', help='JSON report to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown relative to the baseline reported as a regression, 0.2 by default')
+    arguments = parser.parse_args(argv)
+    unknown = set(arguments.corpora) - set(CORPORA)
+    if unknown:
+        parser.error('unknown corpora: {}'.format(', '.join(sorted(unknown))))
+
+    report = run(arguments.corpora or sorted(CORPORA), arguments.scale, arguments.lean)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), arguments.tolerance)
+        for name, ratio in regressions:
+            sys.stderr.write('regression: {} is {:.2f}x slower than the baseline\n'.format(name, ratio))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
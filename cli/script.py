@@ -1,58 +1,457 @@
+import asyncio
+import contextlib
 import os
-import re
+import subprocess
+from pprint import pformat
 
 import click
 
+from codegrapher.cache import DEFAULT_CACHE_DIR, ParseCache
+from codegrapher.discovery import find_files
+from codegrapher.dot import LayoutTimeoutError, run_layouts
+from codegrapher.export import EXPORT_FORMATS, Exporter
 from codegrapher.graph import FunctionGrapher
-from codegrapher.parser import FileObject
+from codegrapher.ignore import load_ignore_file
+from codegrapher.parallel import parse_files
+from codegrapher.profiling import Profiler
+from codegrapher.query import DIRECTIONS, GraphIndex
+from codegrapher.revisions import diff_revisions
+from codegrapher.server import GraphServer
+from codegrapher.store import MappedGraph, is_graph_file, save_graph, source_digest
+from codegrapher.watch import Project
 
 
-@click.command()
+def echo_file(file_object):
+    """Pretty prints the call tree of each class in a file, then that of its module level functions."""
+    click.echo('Classes in file {}:'.format(file_object.name))
+    for class_object in file_object.classes:
+        click.echo('=' * 80)
+        click.echo(class_object.name)
+        click.echo(class_object.pprint())
+        click.echo('')
+    if file_object.call_tree:
+        click.echo('Functions in file {}:'.format(file_object.name))
+        click.echo('=' * 80)
+        click.echo(pformat(file_object.call_tree))
+        click.echo('')
+
+
+def echo_cycles(graph):
+    """Prints the groups of recursive and mutually recursive functions of a graph."""
+    cycles = graph.cycles()
+    if not cycles:
+        click.echo('No cycles found')
+    for cycle in cycles:
+        click.echo('Cycle of {} function{}:'.format(len(cycle), 's' if len(cycle) > 1 else ''))
+        for node in cycle:
+            click.echo('    {}'.format(node if isinstance(node, str) else '.'.join(node)))
+
+
+def split_formats(output_format):
+    """Splits comma separated graphviz file types, as in `svg,png`."""
+    return [file_type.strip() for file_type in output_format.split(',') if file_type.strip()]
+
+
+def check_formats(ctx, param, value):
+    """Rejects --output-format values without any file type."""
+    if not split_formats(value):
+        raise click.BadParameter('give at least one file type, as in pdf or svg,png')
+    return value
+
+
+def emit_graph(graph, output, output_format, layout, focus=None, timeout=None, collapse_cycles=False, clusters=False,
+               max_nodes=None):
+    """Writes the DOT source of a graph to standard output, or renders it to a file in each of the comma separated
+    formats of `output_format`. If `focus` is given, as the keyword arguments of
+    :func:`codegrapher.graph.FunctionGrapher.subgraph`, only that part of the graph is emitted. With `collapse_cycles`,
+    each group of mutually recursive functions is drawn as a single node. `clusters` and `max_nodes` are set on the
+    emitted graph, see :class:`codegrapher.graph.FunctionGrapher`.
+    """
+    if focus:
+        try:
+            graph = graph.subgraph(**focus)
+        except KeyError as error:
+            raise click.ClickException('no function named {} in the graph'.format(error.args[0]))
+    if collapse_cycles:
+        graph = graph.condense()
+    graph.clusters = clusters
+    graph.max_nodes = max_nodes
+    if output == '-':
+        graph.write_dot(click.get_text_stream('stdout'))
+    else:
+        formats = split_formats(output_format)
+        graph.name = output
+        graph.format = formats[0]
+        try:
+            graph.render(layout=layout, formats=formats, timeout=timeout)
+        except LayoutTimeoutError as error:
+            raise click.ClickException(str(error))
+
+
+class DefaultGroup(click.Group):
+    """Group of commands running a default command when the first argument is not the name of a command, so that
+    ``codegrapher path/to/file.py`` keeps working next to ``codegrapher query ...``.
+    """
+    def __init__(self, *args, **kwargs):
+        self.default_command = kwargs.pop('default_command')
+        super(DefaultGroup, self).__init__(*args, **kwargs)
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args = [self.default_command] + list(args)
+        return super(DefaultGroup, self).parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup, default_command='graph')
+def cli():
+    """
+    Graphs the calls made in Python code.
+
+    \b
+    codegrapher [file_name]        graphs a file, see the graph command
+    codegrapher query [arguments]  queries a call graph
+    codegrapher diff REV1 REV2     compares the call graphs of two git revisions
+    codegrapher serve [code]       answers queries about code kept in memory
+    """
+
+
+@cli.command('graph')
 @click.argument('code', type=click.Path())
 @click.option('-r', '--recursive', default=False, is_flag=True,
               help='Treat code argument as a directory and parse all files in directory, recursively')
+@click.option('--exclude', 'excludes', multiple=True, metavar='PATTERN',
+              help='Skip files and directories matching this glob pattern with -r. May be given several times')
+@click.option('--no-gitignore', 'gitignore', default=True, flag_value=False,
+              help='Also parse files ignored by .gitignore files with -r')
+@click.option('--skip-build', default=False, is_flag=True,
+              help='Skip build and dist directories, at any depth, with -r')
 @click.option('--printed', default=False, is_flag=True, help='Pretty prints the call tree for each class in the file')
 @click.option('--ignore', default=False, is_flag=True, help='Use a .cg_ignore file to ignore functions in call tree')
 @click.option('--remove-builtins', default=False, is_flag=True, help='Removes builtin functions from call trees')
-@click.option('--output', help='Graphviz output file name')
-@click.option('--output-format', default='pdf', help='File type for graphviz output file')
-def cli(code, recursive, printed, ignore, remove_builtins, output, output_format):
+@click.option('--output', help='Graphviz output file name, or - to write the DOT source to standard output')
+@click.option('--output-format', default='pdf', callback=check_formats,
+              help='File type for graphviz output file. Several comma separated types, as in svg,png, are laid out '
+                   'concurrently')
+@click.option('--render-timeout', type=click.FloatRange(0, None),
+              help='Seconds after which a graphviz layout is killed and the run fails')
+@click.option('--no-layout', 'layout', default=True, flag_value=False,
+              help='Only write the DOT source of the graph, without laying it out with graphviz')
+@click.option('--focus', multiple=True, metavar='NAME',
+              help='Only output the functions around this one, as in package.module.Class.method. May be given '
+                   'several times')
+@click.option('--depth', default=1, type=click.IntRange(0, None),
+              help='Number of calls from a --focus function to the functions output, 1 by default as for query')
+@click.option('--direction', default='both', type=click.Choice(DIRECTIONS),
+              help='Output the functions called by --focus functions (callees), those calling them (callers) or both')
+@click.option('--clusters', default=False, is_flag=True,
+              help='Draw the functions of each module, and the methods of each class, together in a box')
+@click.option('--max-nodes', type=click.IntRange(1, None),
+              help='Largest number of nodes to draw. Over it, the largest classes, then modules, are drawn as single '
+                   'nodes, with edges labelled by the number of calls they stand for')
+@click.option('--cycles', 'report_cycles', default=False, is_flag=True,
+              help='List the groups of recursive and mutually recursive functions')
+@click.option('--collapse-cycles', default=False, is_flag=True,
+              help='Draw each group of mutually recursive functions as a single node, which speeds up layout')
+@click.option('--save-graph', 'save_path', type=click.Path(dir_okay=False),
+              help='Save the graph to this file in the codegrapher binary format, for fast loading and queries')
+@click.option('--export', type=click.Path(dir_okay=False, allow_dash=True),
+              help='Write the nodes and edges to this file, or to standard output with -, as each file is parsed')
+@click.option('--export-format', type=click.Choice(EXPORT_FORMATS),
+              help='Format of --export: JSON Lines, CSV edge list or GraphML. Guessed from the file extension by '
+                   'default')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(0, None),
+              help='Number of processes used to parse files. Use 0 for one process per CPU')
+@click.option('--cache', default=False, is_flag=True,
+              help='Reuse call data of files whose contents did not change since a previous run')
+@click.option('--cache-dir', default=DEFAULT_CACHE_DIR, type=click.Path(file_okay=False),
+              help='Directory used by --cache')
+@click.option('--cache-max-size', default=256, type=click.IntRange(0, None),
+              help='Size, in megabytes, above which the least recently used cache entries are evicted')
+@click.option('--watch', default=False, is_flag=True,
+              help='Keep running and update the output each time a file changes')
+@click.option('--watch-interval', default=1.0, type=click.FloatRange(0, None),
+              help='Seconds between two checks for changed files in --watch mode')
+@click.option('--profile', default=False, is_flag=True,
+              help='Print the time spent in each stage of the run, and the slowest files, to standard error')
+@click.option('--profile-top', default=10, type=click.IntRange(0, None),
+              help='Number of slow files listed by --profile')
+@click.option('--profile-memory', default=False, is_flag=True,
+              help='Also measure the peak memory of each stage with --profile. Slows the run down')
+@click.option('--profile-stats', type=click.Path(dir_okay=False),
+              help='Write a cProfile profile of the run to this file, to be read with pstats. Implies --profile')
+@click.option('--profile-trace', type=click.Path(dir_okay=False),
+              help='Write the stages of the run to this file as a Chrome trace. Implies --profile')
+def graph_command(code, recursive, excludes, gitignore, skip_build, printed, ignore, remove_builtins, output,
+                  output_format, render_timeout, layout, focus, depth, direction, clusters, max_nodes, report_cycles,
+                  collapse_cycles, save_path, export, export_format, jobs, cache, cache_dir, cache_max_size, watch,
+                  watch_interval, profile, profile_top, profile_memory, profile_stats, profile_trace):
     """
-    Parses a file.
+    Parses a file, printing or graphing its calls. This is the default command.
     codegrapher [file_name]
     """
-    file_list = []
-    if recursive:
-        for dirpath, dirnames, filenames in os.walk(code):
-            for filename in filenames:
-                if re.search(r'\.py$', filename):
-                    file_list.append(os.sep.join([dirpath, filename]))
-    else:
-        file_list.append(code)
-
-    graph = None
-    for file_name in file_list:
-        file_object = FileObject(file_name)
-        file_object.visit()
-        if remove_builtins:
-            file_object.remove_builtins()
-        if ignore:
-            file_object.add_ignore_file()
-            file_object.ignore_functions()
-        if printed:
-            click.echo('Classes in file {}:'.format(file_name))
-            for class_object in file_object.classes:
-                click.echo('=' * 80)
-                click.echo(class_object.name)
-                click.echo(class_object.pprint())
-                click.echo('')
-        if output:
-            try:
-                graph.add_file_to_graph(file_object)
-            except AttributeError:
-                graph = FunctionGrapher()
-                graph.add_file_to_graph(file_object)
+    if export and watch:
+        raise click.UsageError('--export cannot be used with --watch')
+    parse_cache = ParseCache(cache_dir, max_size=cache_max_size * 1024 * 1024) if cache else None
+    # the ignore file is loaded once and shared by all files, and ASTs are dropped as soon as files are visited
+    parse_options = dict(remove_builtins=remove_builtins, ignore=load_ignore_file() if ignore else False,
+                         cache=parse_cache, lean=True)
+    discovery_options = dict(excludes=excludes, gitignore=gitignore, skip_build=skip_build)
+    output_options = dict(output=output, output_format=output_format, layout=layout, timeout=render_timeout,
+                          focus=dict(focus=focus, depth=depth, direction=direction) if focus else None,
+                          collapse_cycles=collapse_cycles, clusters=clusters, max_nodes=max_nodes)
+    export_options = dict(output=export, format=export_format) if export else None
+    profiler = None
+    if profile or profile_stats or profile_trace:
+        profiler = Profiler(memory=profile_memory, cprofile=bool(profile_stats))
+        if jobs != 1:
+            click.echo('Files parsed by worker processes are not profiled, use --jobs 1 to profile them', err=True)
+
+    try:
+        with profiler if profiler else contextlib.nullcontext():
+            if watch:
+                watch_files(code, recursive, printed, output_options, save_path, jobs, watch_interval, parse_options,
+                            discovery_options, report_cycles)
+            else:
+                graph_files(code, recursive, printed, output_options, save_path, jobs, parse_options,
+                            discovery_options, export_options, report_cycles)
+    finally:
+        if parse_cache:
+            parse_cache.evict()
+        if profiler:
+            click.echo(profiler.report(profile_top), err=True)
+            if profile_stats:
+                profiler.dump_stats(profile_stats)
+            if profile_trace:
+                profiler.write_chrome_trace(profile_trace)
+
+
+def graph_files(code, recursive, printed, output_options, save_path, jobs, parse_options, discovery_options,
+                export_options=None, report_cycles=False):
+    """Parses files once, as they are found, printing and exporting their call trees, then renders and saves their
+    graph. Files are streamed into the graph, which only keeps their call data."""
+    sources = []
+
+    def parsed_files(exporter):
+        for file_object in parse_files(find_files(code, recursive, **discovery_options), jobs=jobs, **parse_options):
+            if printed:
+                echo_file(file_object)
+            if exporter:
+                exporter.add_file(file_object)
+            sources.append(file_object.name)
+            yield file_object
+
+    graphed = output_options['output'] or save_path or report_cycles
+    graph = FunctionGrapher()
+    with Exporter(**export_options) if export_options else contextlib.nullcontext() as exporter:
+        if graphed:
+            # calls between files are only linked once every file is known
+            graph.add_files_to_graph(parsed_files(exporter))
+        else:
+            for file_object in parsed_files(exporter):
+                pass
+    if not graphed:
+        return
+    if report_cycles:
+        echo_cycles(graph)
+    if output_options['output']:
+        emit_graph(graph, **output_options)
+    if save_path:
+        save_graph(graph, save_path, sources=sources)
+
+
+def watch_files(code, recursive, printed, output_options, save_path, jobs, interval, parse_options,
+                discovery_options, report_cycles=False):
+    """Like :func:`graph_files`, then updates the output each time files change, until interrupted."""
+    project = Project(code, recursive=recursive, jobs=jobs, **dict(parse_options, **discovery_options))
+    updates = project.watch(interval)
+    parsed, removed = project.refresh()
+    # digests of the files in the graph, only computed again for the files the project parsed or removed
+    digests = {}
+    try:
+        while True:
+            if printed:
+                for file_object in parsed:
+                    echo_file(file_object)
+            for file_name, error in project.errors.items():
+                click.echo('Could not parse {}: {}'.format(file_name, error), err=True)
+            if report_cycles:
+                echo_cycles(project.graph)
+            if output_options['output']:
+                emit_graph(project.graph, **output_options)
+            if save_path:
+                for file_name in removed:
+                    digests.pop(file_name, None)
+                digests.update((file_object.name, source_digest(file_object.name)) for file_object in parsed)
+                save_graph(project.graph, save_path, sources=digests)
+            parsed, removed = next(updates)
+    except KeyboardInterrupt:
+        pass
+
+
+def load_index(source, remove_builtins=False, ignore=False):
+    """Opens a graph saved with --save-graph, or parses a file or directory of code and indexes its graph."""
+    if is_graph_file(source):
+        return MappedGraph(source)
+    graph = FunctionGrapher()
+    file_names = find_files(source, recursive=os.path.isdir(source))
+    graph.add_files_to_graph(parse_files(file_names, remove_builtins=remove_builtins,
+                                         ignore=load_ignore_file() if ignore else False, lean=True))
+    return GraphIndex(graph)
+
+
+@cli.command()
+@click.argument('source', type=click.Path(exists=True))
+@click.argument('kind', type=click.Choice(['callers', 'callees', 'neighborhood', 'path', 'reachable', 'cycles']))
+@click.argument('names', nargs=-1)
+@click.option('--depth', default=1, type=click.IntRange(0, None), help='Number of calls to follow for neighborhood')
+@click.option('--direction', type=click.Choice(DIRECTIONS),
+              help='Follow calls (callees), follow them backwards (callers) or both. Defaults to both for neighborhood '
+                   'and to callees for path and reachable')
+@click.option('--ignore', default=False, is_flag=True, help='Use a .cg_ignore file to ignore functions in call tree')
+@click.option('--remove-builtins', default=False, is_flag=True, help='Removes builtin functions from call trees')
+def query(source, kind, names, depth, direction, ignore, remove_builtins):
+    """
+    Answers questions about a call graph, read from a file saved with --save-graph or built from a file or directory
+    of code. Functions are named as in the graph, as in package.module.Class.method.
+
+    \b
+    codegrapher query SOURCE callers NAME
+    codegrapher query SOURCE callees NAME
+    codegrapher query SOURCE neighborhood NAME [--depth N]
+    codegrapher query SOURCE path FROM TO
+    codegrapher query SOURCE reachable NAME
+    codegrapher query SOURCE cycles
+    """
+    arity = {'path': 2, 'cycles': 0}.get(kind, 1)
+    if len(names) != arity:
+        raise click.UsageError('{} takes {} function name{}'.format(kind, arity, '' if arity == 1 else 's'))
+    index = load_index(source, remove_builtins=remove_builtins, ignore=ignore)
+    try:
+        if kind == 'callers':
+            results = sorted(index.callers(names[0]))
+        elif kind == 'callees':
+            results = sorted(index.callees(names[0]))
+        elif kind == 'neighborhood':
+            distances = index.neighborhood(names[0], depth=depth, direction=direction or 'both')
+            results = ['{}\t{}'.format(distance, label)
+                       for label, distance in sorted(distances.items(), key=lambda item: (item[1], item[0]))]
+        elif kind == 'path':
+            results = index.shortest_path(names[0], names[1], direction=direction or 'callees')
+            if results is None:
+                raise click.ClickException('no call path from {} to {}'.format(*names))
+        elif kind == 'cycles':
+            echo_cycles(index)
+            results = []
+        else:
+            results = sorted(index.reachable(names[0], direction=direction or 'callees'))
+    except KeyError as error:
+        raise click.ClickException('no function named {} in the graph'.format(error.args[0]))
+    finally:
+        if isinstance(index, MappedGraph):
+            index.close()
+    for result in results:
+        click.echo(result)
+
+
+@cli.command()
+@click.argument('old_revision')
+@click.argument('new_revision')
+@click.argument('path', default='.')
+@click.option('--ignore', default=False, is_flag=True, help='Use a .cg_ignore file to ignore functions in call tree')
+@click.option('--remove-builtins', default=False, is_flag=True, help='Removes builtin functions from call trees')
+@click.option('--output', help='Graphviz output file name for a graph of the changes, or - to write its DOT source to '
+                               'standard output. Changes are listed as text otherwise')
+@click.option('--output-format', default='pdf', callback=check_formats,
+              help='Comma separated file types for graphviz output files')
+@click.option('--render-timeout', type=click.FloatRange(0, None),
+              help='Seconds after which a graphviz layout is killed and the run fails')
+@click.option('--no-layout', 'layout', default=True, flag_value=False,
+              help='Only write the DOT source of the graph, without laying it out with graphviz')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(0, None),
+              help='Number of processes used to parse files. Use 0 for one process per CPU')
+@click.option('--cache', default=False, is_flag=True,
+              help='Reuse call data of files whose contents did not change since a previous run')
+@click.option('--cache-dir', default=DEFAULT_CACHE_DIR, type=click.Path(file_okay=False),
+              help='Directory used by --cache')
+def diff(old_revision, new_revision, path, ignore, remove_builtins, output, output_format, render_timeout, layout,
+         jobs, cache, cache_dir):
+    """
+    Compares the call graphs of two revisions of a git repository, reading files straight from git. Lists the
+    functions and calls added (+) and removed (-), or graphs them in color with --output.
+
+    \b
+    codegrapher diff REV1 REV2 [path]
+    """
+    parse_cache = ParseCache(cache_dir) if cache else None
+    try:
+        changes = diff_revisions(old_revision, new_revision, path, jobs=jobs, remove_builtins=remove_builtins,
+                                 ignore=load_ignore_file() if ignore else False, cache=parse_cache)
+    except subprocess.CalledProcessError as error:
+        raise click.ClickException('could not read revisions {} and {} of {} from git: {}'.format(
+            old_revision, new_revision, path, (error.stderr or b'').decode('utf-8', 'replace').strip()))
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    finally:
+        if parse_cache:
+            parse_cache.evict()
     if output:
-        graph.name = output
-        graph.format = output_format
-        graph.render()
+        changes.write_dot(output)
+        if layout and output != '-':
+            try:
+                run_layouts(output, split_formats(output_format), timeout=render_timeout)
+            except LayoutTimeoutError as error:
+                raise click.ClickException(str(error))
+    else:
+        for line in changes.report():
+            click.echo(line)
+
+
+@cli.command()
+@click.argument('code', type=click.Path(exists=True))
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False),
+              help='Unix domain socket to listen on. Listens on a localhost TCP port otherwise')
+@click.option('--host', default='127.0.0.1', help='Address the TCP socket is bound to')
+@click.option('--port', default=0, type=click.IntRange(0, 65535),
+              help='TCP port to listen on, any free port by default')
+@click.option('--refresh-interval', default=1.0, type=click.FloatRange(0, None),
+              help='Seconds between two checks for changed files. Use 0 to only refresh on request')
+@click.option('--exclude', 'excludes', multiple=True, metavar='PATTERN',
+              help='Skip files and directories matching this glob pattern. May be given several times')
+@click.option('--no-gitignore', 'gitignore', default=True, flag_value=False,
+              help='Also parse files ignored by .gitignore files')
+@click.option('--skip-build', default=False, is_flag=True, help='Skip build and dist directories, at any depth')
+@click.option('--ignore', default=False, is_flag=True, help='Use a .cg_ignore file to ignore functions in call tree')
+@click.option('--remove-builtins', default=False, is_flag=True, help='Removes builtin functions from call trees')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(0, None),
+              help='Number of processes used to parse files. Use 0 for one process per CPU')
+@click.option('--cache', default=False, is_flag=True,
+              help='Reuse call data of files whose contents did not change since a previous run')
+@click.option('--cache-dir', default=DEFAULT_CACHE_DIR, type=click.Path(file_okay=False),
+              help='Directory used by --cache')
+def serve(code, socket_path, host, port, refresh_interval, excludes, gitignore, skip_build, ignore, remove_builtins,
+          jobs, cache, cache_dir):
+    """
+    Parses a file or directory once, then answers queries about its call graph over a local socket, refreshing
+    changed files, until interrupted. Clients send one JSON request per line, as in
+    {"query": "callers", "names": ["package.module.main"]}, and get one JSON answer per line.
+
+    \b
+    codegrapher serve CODE [--socket PATH | --port PORT]
+    """
+    project = Project(code, recursive=os.path.isdir(code), remove_builtins=remove_builtins,
+                      ignore=load_ignore_file() if ignore else False,
+                      cache=ParseCache(cache_dir) if cache else None, jobs=jobs, excludes=excludes,
+                      gitignore=gitignore, skip_build=skip_build, lean=True)
+    server = GraphServer(project, refresh_interval=refresh_interval or None)
+
+    def ready(listener):
+        address = socket_path or '{}:{}'.format(*listener.sockets[0].getsockname()[:2])
+        click.echo('Serving {} files on {}'.format(len(project.files), address), err=True)
+
+    try:
+        asyncio.run(server.serve_forever(path=socket_path, host=host, port=port, ready=ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,182 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import time
+
+import codegrapher
+from codegrapher import profiling
+from codegrapher.parser import FileObject
+
+
+DEFAULT_CACHE_DIR = '.codegrapher_cache'
+# bumped whenever the layout of file summaries changes, so entries written by older code are not reused
+CACHE_FORMAT = 6
+
+
+class ParseCache(object):
+    """ An on-disk cache of the call data extracted from source files.
+
+    Entries are keyed by a hash of the file contents together with the codegrapher and Python versions, so a cached
+    entry is only reused for identical source parsed by the same tooling. Entries hold the unfiltered call data of a
+    file with its namespace stripped, which lets files with identical contents share an entry and lets the builtin and
+    ignore filters change between runs.
+
+    Attributes:
+        directory (string): Directory where cache entries are stored.
+        max_size (int): Size, in bytes, above which :func:`ParseCache.evict` removes the least recently used entries.
+        max_age (int): Age, in seconds since last use, after which :func:`ParseCache.evict` removes an entry.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=256 * 1024 * 1024, max_age=30 * 24 * 60 * 60):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @staticmethod
+    def key(source):
+        """ Computes the cache key for some source code.
+
+        Arguments:
+            source (bytes): File contents.
+
+        Returns:
+            (string): Hex digest identifying `source` for the current codegrapher and Python versions.
+        """
+        digest = hashlib.sha256()
+        digest.update('codegrapher {} {} {}\0'.format(codegrapher.__version__, CACHE_FORMAT,
+                                                   sys.implementation.cache_tag).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """ Looks up a cache entry, marking it as recently used.
+
+        Arguments:
+            key (string): Key from :func:`ParseCache.key`.
+
+        Returns:
+            (dict): Namespace-free file summary, or `None` on a cache miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                summary = marshal.load(cache_file)
+            os.utime(path, None)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return summary
+
+    def put(self, key, summary):
+        """ Stores a cache entry. The entry is written to a temporary file first so concurrent readers, such as other
+        worker processes, never see a partial entry.
+
+        Arguments:
+            key (string): Key from :func:`ParseCache.key`.
+            summary (dict): Namespace-free file summary.
+        """
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                marshal.dump(summary, cache_file)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self, file_name, source):
+        """ Returns a visited, unfiltered :class:`codegrapher.parser.FileObject` for `file_name`, reusing the cached
+        call data when `source` has been seen before and parsing it (then filling the cache) otherwise.
+
+        Arguments:
+            file_name (string): Name of the file `source` was read from.
+            source (bytes): File contents.
+
+        Returns:
+            (:class:`codegrapher.parser.FileObject`)
+        """
+        with profiling.stage('cache', file_name):
+            key = self.key(source)
+            summary = self.get(key)
+        if summary is not None:
+            return FileObject.from_summary(self._add_namespace(summary, file_name))
+        file_object = FileObject(file_name, source=source)
+        file_object.visit()
+        self.put(key, self._strip_namespace(file_object.summary()))
+        return file_object
+
+    @staticmethod
+    def _strip_namespace(summary):
+        classes = []
+        for class_summary in summary['classes']:
+            class_summary = dict(class_summary)
+            class_summary['call_tree'] = dict((caller[1:], calls)
+                                              for caller, calls in class_summary['call_tree'].items())
+            classes.append(class_summary)
+        call_tree = dict((caller[1:], calls) for caller, calls in summary['call_tree'].items())
+        return {'classes': classes, 'call_tree': call_tree, 'functions': summary['functions'],
+                'nested_lines': summary['nested_lines']}
+
+    @staticmethod
+    def _add_namespace(summary, file_name):
+        relative_namespace = os.path.splitext(file_name)[0].replace(os.path.sep, '.')
+        classes = []
+        for class_summary in summary['classes']:
+            class_summary = dict(class_summary)
+            class_summary['call_tree'] = dict(((relative_namespace,) + caller, calls)
+                                              for caller, calls in class_summary['call_tree'].items())
+            classes.append(class_summary)
+        call_tree = dict(((relative_namespace,) + caller, calls) for caller, calls in summary['call_tree'].items())
+        return {'name': file_name, 'relative_namespace': relative_namespace, 'classes': classes,
+                'call_tree': call_tree, 'functions': summary['functions'], 'nested_lines': summary['nested_lines']}
+
+    def entries(self):
+        """ Lists the entries currently in the cache.
+
+        Returns:
+            (list): `(path, size, last_used)` tuples.
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, now=None):
+        """ Removes entries unused for longer than `max_age`, then the least recently used entries until the cache
+        holds at most `max_size` bytes.
+
+        Arguments:
+            now (float): Current time, defaults to :func:`time.time`.
+
+        Returns:
+            (int): Number of entries removed.
+        """
+        now = time.time() if now is None else now
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total_size = sum(entry[1] for entry in entries)
+        removed = 0
+        for path, size, last_used in entries:
+            if now - last_used <= self.max_age and total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+        return removed
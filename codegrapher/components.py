@@ -0,0 +1,69 @@
+def strongly_connected_components(nodes, neighbors):
+    """ Finds the strongly connected components of a directed graph with Tarjan's algorithm.
+
+    The depth-first search keeps its own stack of iterators rather than recursing, so graphs with very long call
+    chains do not hit the recursion limit. Every node and edge is visited once, so the search runs in linear time.
+
+    Arguments:
+        nodes (iterable): Nodes of the graph, as hashable values. Nodes only reachable through `neighbors` are found
+            too.
+        neighbors (callable): Returns the nodes a node has an edge to.
+
+    Returns:
+        (list): Components, as lists of nodes, in reverse topological order: a component only has edges to components
+        listed before it.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(neighbors(root)))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(neighbors(successor))))
+                    break
+                if successor in on_stack and index[successor] < lowlink[node]:
+                    lowlink[node] = index[successor]
+            else:
+                # every successor of the node is done
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    component = []
+                    member = None
+                    while member != node:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                    components.append(component)
+    return components
+
+
+def cyclic_components(nodes, neighbors):
+    """ Finds the groups of mutually recursive nodes of a directed graph: components of several nodes, and single nodes
+    with an edge to themselves.
+
+    Arguments:
+        nodes (iterable): Nodes of the graph, see :func:`strongly_connected_components`.
+        neighbors (callable): Returns the nodes a node has an edge to.
+
+    Returns:
+        (list): Components, as lists of nodes, in reverse topological order.
+    """
+    return [component for component in strongly_connected_components(nodes, neighbors)
+            if len(component) > 1 or component[0] in neighbors(component[0])]
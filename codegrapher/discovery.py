@@ -0,0 +1,224 @@
+import fnmatch
+import os
+import re
+
+from codegrapher import profiling
+
+
+# directories that never hold code worth graphing, pruned before they are descended into
+DEFAULT_EXCLUDES = (
+    '.git', '.hg', '.svn', '.tox', '.nox', '.eggs', '*.egg-info', '__pycache__', '.mypy_cache', '.pytest_cache',
+    '.ruff_cache', '.codegrapher_cache', 'node_modules', 'site-packages', '.venv', 'venv',
+)
+# output directories of packaging tools, only skipped on request as packages may use these names too
+BUILD_EXCLUDES = ('build', 'dist')
+
+
+def _translate_segment(segment):
+    # a path segment of a gitignore pattern, where wildcards never match `/`
+    parts = []
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        index += 1
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '\\' and index < len(segment):
+            parts.append(re.escape(segment[index]))
+            index += 1
+        elif char == '[':
+            end = index
+            if end < len(segment) and segment[end] in '!^':
+                end += 1
+            if end < len(segment) and segment[end] == ']':
+                end += 1
+            end = segment.find(']', end)
+            if end == -1:
+                parts.append(re.escape(char))
+                continue
+            members = segment[index:end].replace('\\', '\\\\')
+            if members[0] in '!^':
+                members = '^' + members[1:]
+            parts.append('[{}]'.format(members))
+            index = end + 1
+        else:
+            parts.append(re.escape(char))
+    return ''.join(parts)
+
+
+def translate_pattern(pattern):
+    """ Translates a gitignore pattern to a regular expression matching whole paths separated by `/`.
+
+    `*`, `?` and `[...]` match within a single path segment. A `**` segment matches any number of segments: `**/b`
+    matches `b` in any directory, `a/**/b` matches `a/b` and `a/x/y/b`, and `a/**` matches everything in `a`.
+
+    Arguments:
+        pattern (string): Pattern, without leading or trailing `/`.
+
+    Returns:
+        (string): Regular expression.
+    """
+    segments = pattern.split('/')
+    expression = ''
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == '**':
+            expression += '.*' if last else '(?:.*/)?'
+        else:
+            expression += _translate_segment(segment) + ('' if last else '/')
+    return expression + r'\Z'
+
+
+class GitIgnore(object):
+    """ Patterns of a single `.gitignore` file.
+
+    Supports the commonly used subset of the `gitignore <https://git-scm.com/docs/gitignore>`_ syntax: comments,
+    negation with `!`, directory-only patterns ending with `/`, patterns anchored to the directory of the file when
+    they contain a `/`, and `*`, `?`, `[...]` and `**` wildcards.
+
+    Attributes:
+        base (string): Directory containing the `.gitignore` file, relative to the root of the search and separated by
+            `/`. Empty for the root itself.
+        rules (list): `(regular expression, negated, directory only)` tuples, in file order.
+    """
+    def __init__(self, base, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            anchored = '/' in line
+            line = line.lstrip('/')
+            expression = translate_pattern(line)
+            if not anchored:
+                # unanchored patterns match a file or directory name at any depth
+                expression = '(?:.*/)?' + expression
+            self.rules.append((re.compile(expression), negated, directory_only))
+
+    @classmethod
+    def load(cls, directory, base=''):
+        """ Reads the `.gitignore` file of a directory.
+
+        Arguments:
+            directory (string): Directory to look in.
+            base (string): Path of `directory` relative to the root of the search, see :attr:`base`.
+
+        Returns:
+            (:class:`GitIgnore`): Patterns of the file, or `None` if there is no such file.
+        """
+        path = os.path.join(directory, '.gitignore')
+        try:
+            with open(path, 'r') as gitignore_file:
+                return cls(base, gitignore_file)
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def match(self, path, is_dir):
+        """ Checks a path against the patterns, the last matching pattern winning.
+
+        Arguments:
+            path (string): Path of a file or directory below :attr:`base`, relative to the root of the search and
+                separated by `/`.
+            is_dir (bool): Whether `path` is a directory.
+
+        Returns:
+            (bool): True if the path is ignored, False if it is explicitly included, `None` if no pattern matched.
+        """
+        relative_path = path[len(self.base) + 1:] if self.base else path
+        result = None
+        for expression, negated, directory_only in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if expression.match(relative_path):
+                result = not negated
+        return result
+
+
+def _is_ignored(path, is_dir, gitignores):
+    ignored = None
+    for gitignore in gitignores:
+        result = gitignore.match(path, is_dir)
+        if result is not None:
+            ignored = result
+    return bool(ignored)
+
+
+def iter_files(root, excludes=(), gitignore=True, skip_build=False):
+    """ Lazily finds the Python files below a directory.
+
+    Directories are read with :func:`os.scandir`, one at a time and in sorted order, and files are yielded as soon as
+    their directory is read. Excluded and ignored directories are pruned before being read, as are virtual
+    environments, which are recognized by their `pyvenv.cfg` file. Symbolic links to directories are not followed.
+
+    Arguments:
+        root (string): Directory to search.
+        excludes (iterable): Glob patterns of files and directories to skip, matched against their name and their
+            path relative to `root`. Added to :data:`DEFAULT_EXCLUDES`.
+        gitignore (bool): Also skip files and directories ignored by `.gitignore` files.
+        skip_build (bool): Also skip the `build` and `dist` directories of packaging tools, at any depth, see
+            :data:`BUILD_EXCLUDES`.
+
+    Yields:
+        (string): Paths of Python files, starting with `root`.
+    """
+    # all exclude patterns are checked at once, with a single regular expression
+    patterns = DEFAULT_EXCLUDES + (BUILD_EXCLUDES if skip_build else ()) + tuple(excludes)
+    excluded = re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns))
+    stack = [(root, '', ())]
+    while stack:
+        directory, relative_directory, gitignores = stack.pop()
+        with profiling.stage('walk'):
+            try:
+                with os.scandir(directory) as scanner:
+                    entries = sorted(scanner, key=lambda entry: entry.name)
+            except OSError:
+                continue
+        if directory != root and any(entry.name == 'pyvenv.cfg' for entry in entries):
+            continue
+        if gitignore and any(entry.name == '.gitignore' for entry in entries):
+            loaded = GitIgnore.load(directory, relative_directory)
+            if loaded is not None:
+                gitignores = gitignores + (loaded,)
+
+        subdirectories = []
+        for entry in entries:
+            is_dir = entry.is_dir()
+            if not is_dir and not entry.name.endswith('.py'):
+                continue
+            relative_path = '/'.join([relative_directory, entry.name]) if relative_directory else entry.name
+            if excluded.match(entry.name) or excluded.match(relative_path):
+                continue
+            if gitignores and _is_ignored(relative_path, is_dir, gitignores):
+                continue
+            if not is_dir:
+                yield entry.path
+            elif not entry.is_symlink():
+                subdirectories.append((entry.path, relative_path, gitignores))
+        stack.extend(reversed(subdirectories))
+
+
+def find_files(code, recursive=False, excludes=(), gitignore=True, skip_build=False):
+    """Lists the Python files to be parsed.
+
+    Args:
+        code (string): Path of a file, or of a directory if `recursive` is set.
+        recursive (bool): Treat `code` as a directory and find all Python files in it, recursively.
+        excludes (iterable): Glob patterns of files and directories to skip, see :func:`iter_files`.
+        gitignore (bool): Skip files and directories ignored by `.gitignore` files.
+        skip_build (bool): Skip `build` and `dist` directories, see :func:`iter_files`.
+    Returns:
+        (iterator): Paths of the files to parse, found lazily.
+    """
+    if not recursive:
+        return iter([code])
+    return iter_files(code, excludes=excludes, gitignore=gitignore, skip_build=skip_build)
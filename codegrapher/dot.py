@@ -0,0 +1,188 @@
+import errno
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LayoutTimeoutError(RuntimeError):
+    """ An exception raised when a Graphviz layout takes longer than allowed. The layout process is killed. """
+    pass
+
+
+def quote(label):
+    """ Quotes a string for use as a DOT identifier or attribute value.
+
+    Arguments:
+        label (string): String to quote.
+
+    Returns:
+        (string): Double quoted string with backslashes and double quotes escaped.
+    """
+    return '"{}"'.format(label.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def attributes(attrs):
+    """ Formats a dict of attributes as a DOT attribute list.
+
+    Arguments:
+        attrs (dict): Attribute names and values.
+
+    Returns:
+        (string): Attribute list such as ` [label="a" color=red]`, or an empty string if there are no attributes.
+    """
+    if not attrs:
+        return ''
+    return ' [{}]'.format(' '.join('{}={}'.format(key, quote(str(value))) for key, value in sorted(attrs.items())))
+
+
+class DotWriter(object):
+    """ Streams a directed graph in the `DOT <http://www.graphviz.org/doc/info/lang.html>`_ language to a file-like
+    object without building the graph in memory.
+
+    Each distinct node label is escaped once and given a short identifier, which is then used for every edge touching
+    that node. Nodes declared between :func:`DotWriter.begin_subgraph` and :func:`DotWriter.end_subgraph` belong to
+    that subgraph. Lines are buffered and written in chunks of `chunk_size` lines.
+
+    Attributes:
+        stream (file): Text stream the DOT source is written to.
+        chunk_size (int): Number of lines buffered before writing to the stream.
+    """
+    def __init__(self, stream, name=None, graph_attr=None, node_attr=None, edge_attr=None, chunk_size=4096):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._ids = {}
+        self._buffer = []
+        self._indent = '\t'
+        self._subgraphs = 0
+        self._write('digraph {}{{'.format(quote(name) + ' ' if name else ''))
+        for keyword, attrs in (('graph', graph_attr), ('node', node_attr), ('edge', edge_attr)):
+            if attrs:
+                self._write('\t{}{}'.format(keyword, attributes(attrs)))
+
+    def _write(self, line):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Writes buffered lines to the stream. """
+        if self._buffer:
+            self._buffer.append('')
+            self.stream.write('\n'.join(self._buffer))
+            self._buffer = []
+
+    def node(self, label, **attrs):
+        """ Declares a node, unless a node with the same label was already declared.
+
+        Arguments:
+            label (string): Node label.
+            **attrs: DOT attributes for the node, only used when the node is first declared.
+
+        Returns:
+            (string): Identifier of the node in the DOT source.
+        """
+        node_id = self._ids.get(label)
+        if node_id is None:
+            node_id = self._ids[label] = 'n{}'.format(len(self._ids))
+            attrs['label'] = label
+            self._write('{}{}{}'.format(self._indent, node_id, attributes(attrs)))
+        return node_id
+
+    def begin_subgraph(self, label=None, cluster=True, **attrs):
+        """ Starts a subgraph, which may be nested in another one.
+
+        Arguments:
+            label (string): Label drawn on the subgraph.
+            cluster (bool): Draw the nodes of the subgraph together, in a box, as a Graphviz cluster.
+            **attrs: DOT attributes for the subgraph.
+        """
+        self._subgraphs += 1
+        name = '{}{}'.format('cluster_' if cluster else 's', self._subgraphs)
+        self._write('{}subgraph {} {{'.format(self._indent, name))
+        self._indent += '\t'
+        if label is not None:
+            attrs['label'] = label
+        if attrs:
+            self._write('{}graph{}'.format(self._indent, attributes(attrs)))
+
+    def end_subgraph(self):
+        """ Ends the innermost subgraph. """
+        self._indent = self._indent[:-1]
+        self._write('{}}}'.format(self._indent))
+
+    def edge(self, tail, head, **attrs):
+        """ Adds an edge between two nodes, declaring the nodes if needed.
+
+        Arguments:
+            tail (string): Label of the node the edge starts from.
+            head (string): Label of the node the edge points to.
+            **attrs: DOT attributes for the edge.
+        """
+        self._write('{}{} -> {}{}'.format(self._indent, self.node(tail), self.node(head), attributes(attrs)))
+
+    def close(self):
+        """ Ends the graph and flushes the remaining lines. The stream itself is left open. """
+        self._write('}')
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def run_layout(filepath, format='pdf', engine='dot', timeout=None):
+    """ Lays out a DOT file with a `Graphviz <http://www.graphviz.org/>`_ executable.
+
+    Arguments:
+        filepath (string): Path of the DOT source file.
+        format (string): Output format, as in `pdf` or `png`.
+        engine (string): Graphviz layout executable.
+        timeout (float): Seconds after which the layout is killed, or `None` to wait for as long as it takes.
+
+    Returns:
+        (string): Path of the rendered file, `filepath` with the format appended as extension.
+
+    Raises:
+        RuntimeError: If the Graphviz executable cannot be found.
+        LayoutTimeoutError: If the layout took longer than `timeout`.
+        subprocess.CalledProcessError: If the layout failed.
+    """
+    cmd = [engine, '-T{}'.format(format), '-O', filepath]
+    try:
+        subprocess.run(cmd, check=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise LayoutTimeoutError('{} layout of {} did not finish within {} seconds'.format(format, filepath, timeout))
+    except OSError as error:
+        if error.errno == errno.ENOENT:
+            raise RuntimeError('failed to execute {!r}, make sure the Graphviz executables are on your system\'s '
+                               'path'.format(cmd))
+        raise
+    return '{}.{}'.format(filepath, format)
+
+
+def run_layouts(filepath, formats, engine='dot', timeout=None):
+    """ Lays out a DOT file in several formats at once, each in its own Graphviz process.
+
+    Every layout runs to completion, or to its timeout, even if another one fails.
+
+    Arguments:
+        filepath (string): Path of the DOT source file.
+        formats (list): Output formats, as in `['svg', 'png']`.
+        engine (string): Graphviz layout executable.
+        timeout (float): Seconds after which each layout is killed, or `None` to wait for as long as it takes.
+
+    Returns:
+        (list): Paths of the rendered files, in the order of `formats`.
+
+    Raises:
+        The first error raised by a layout, in the order of `formats`, see :func:`run_layout`.
+    """
+    if len(formats) == 1:
+        return [run_layout(filepath, format=formats[0], engine=engine, timeout=timeout)]
+    # the threads only wait on the Graphviz processes, which do the actual work in parallel
+    with ThreadPoolExecutor(max_workers=len(formats)) as executor:
+        futures = [executor.submit(run_layout, filepath, format=output_format, engine=engine, timeout=timeout)
+                   for output_format in formats]
+    return [future.result() for future in futures]
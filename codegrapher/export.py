@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+import os
+import sys
+from xml.sax.saxutils import escape, quoteattr
+
+from codegrapher import profiling
+from codegrapher.graph import FunctionGrapher
+
+
+EXPORT_FORMATS = ('jsonl', 'csv', 'graphml')
+_EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.graphml': 'graphml'}
+
+
+def export_format(path):
+    """ Guesses an export format from the extension of a file name.
+
+    Arguments:
+        path (string): Output file name.
+
+    Returns:
+        (string): One of :data:`EXPORT_FORMATS`, `jsonl` if the extension is not known.
+    """
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'jsonl')
+
+
+def _present(attrs):
+    return [(key, value) for key, value in sorted(attrs.items()) if value is not None]
+
+
+class JsonLinesWriter(object):
+    """ Streams a graph as `JSON Lines <https://jsonlines.org/>`_, one object per node or edge::
+
+        {"file": "pkg/module.py", "id": "pkg.module.main", "line": 3, "type": "node"}
+        {"file": "pkg/module.py", "line": 3, "source": "pkg.module.main", "target": "os.getcwd", "type": "edge"}
+
+    Attributes with a `None` value are left out.
+
+    Attributes:
+        stream (file): Text stream the records are written to.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def node(self, label, **attrs):
+        """ Writes a node.
+
+        Arguments:
+            label (string): Node label, as in `namespace.class.function_name`.
+            **attrs: Attributes of the node, as in `file` and `line`.
+        """
+        record = dict(_present(attrs), type='node', id=label)
+        self.stream.write(json.dumps(record, sort_keys=True) + '\n')
+
+    def edge(self, tail, head, **attrs):
+        """ Writes an edge.
+
+        Arguments:
+            tail (string): Label of the calling node.
+            head (string): Label of the called node.
+            **attrs: Attributes of the edge.
+        """
+        record = dict(_present(attrs), type='edge', source=tail, target=head)
+        self.stream.write(json.dumps(record, sort_keys=True) + '\n')
+
+    def close(self):
+        """ Does nothing, records are complete as soon as they are written. The stream itself is left open. """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class CsvWriter(JsonLinesWriter):
+    """ Streams a graph as a CSV edge list, with a `source,target,file,line` header. Nodes are only written through
+    the edges touching them.
+
+    Attributes:
+        stream (file): Text stream the rows are written to, opened with `newline=''`.
+    """
+    COLUMNS = ('source', 'target', 'file', 'line')
+
+    def __init__(self, stream):
+        super(CsvWriter, self).__init__(stream)
+        self._writer = csv.writer(stream)
+        self._writer.writerow(self.COLUMNS)
+
+    def node(self, label, **attrs):
+        """ Ignores nodes, which are not part of an edge list. """
+        pass
+
+    def edge(self, tail, head, **attrs):
+        """ Writes an edge as a row, see :func:`JsonLinesWriter.edge`. """
+        values = [attrs.get(key) for key in self.COLUMNS[2:]]
+        self._writer.writerow([tail, head] + ['' if value is None else value for value in values])
+
+
+class GraphMLWriter(JsonLinesWriter):
+    """ Streams a directed graph in `GraphML <http://graphml.graphdrawing.org/>`_, with `file` and `line` attributes.
+
+    Nodes are identified by their labels. GraphML requires every node at the end of an edge to be declared, so the
+    labels of the nodes written are remembered, and nodes only known through edges are declared, without attributes,
+    when the writer is closed. Edges themselves are not kept in memory.
+
+    Attributes:
+        stream (file): Text stream the document is written to.
+    """
+    KEYS = (('file', 'string'), ('line', 'int'))
+
+    def __init__(self, stream):
+        super(GraphMLWriter, self).__init__(stream)
+        self._declared = set()
+        self._referenced = set()
+        stream.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for name, attr_type in self.KEYS:
+            stream.write('  <key id={0} for="all" attr.name={0} attr.type="{1}"/>\n'.format(quoteattr(name),
+                                                                                          attr_type))
+        stream.write('  <graph edgedefault="directed">\n')
+
+    @staticmethod
+    def _data(attrs):
+        return ''.join('<data key={}>{}</data>'.format(quoteattr(key), escape(str(value)))
+                       for key, value in _present(attrs))
+
+    def node(self, label, **attrs):
+        """ Writes a node, unless a node with the same label was already written. """
+        if label in self._declared:
+            return
+        self._declared.add(label)
+        self._referenced.discard(label)
+        self.stream.write('    <node id={}>{}</node>\n'.format(quoteattr(label), self._data(attrs)))
+
+    def edge(self, tail, head, **attrs):
+        """ Writes an edge, see :func:`JsonLinesWriter.edge`. """
+        for label in (tail, head):
+            if label not in self._declared:
+                self._referenced.add(label)
+        self.stream.write('    <edge source={} target={}>{}</edge>\n'.format(quoteattr(tail), quoteattr(head),
+                                                                           self._data(attrs)))
+
+    def close(self):
+        """ Declares the nodes only known through edges and ends the document. The stream itself is left open. """
+        for label in sorted(self._referenced):
+            self.stream.write('    <node id={}/>\n'.format(quoteattr(label)))
+        self._declared.update(self._referenced)
+        self._referenced = set()
+        self.stream.write('  </graph>\n</graphml>\n')
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter, 'graphml': GraphMLWriter}
+
+
+def _definition_lines(file_object):
+    namespace = file_object.relative_namespace
+    lines = dict(((namespace, function_object.name), function_object.lineno)
+                 for function_object in file_object.functions)
+    for class_object in file_object.classes:
+        lines[(namespace, class_object.name)] = class_object.lineno
+        # an implicit constructor is drawn at the class
+        lines[(namespace, class_object.name, '__init__')] = class_object.lineno
+        for function_object in class_object.functions:
+            lines[(namespace, class_object.name, function_object.name)] = function_object.lineno
+    for caller, lineno in file_object.nested_lines.items():
+        lines[(namespace,) + caller] = lineno
+    return lines
+
+
+class Exporter(object):
+    """ Streams the nodes and edges of files to a file, one file at a time, as soon as each file is parsed::
+
+        with Exporter('graph.jsonl') as exporter:
+            for file_object in parse_files(file_names, lean=True):
+                exporter.add_file(file_object)
+
+    Neither files nor edges are kept once written, so exporting takes the same memory for any number of files, except
+    in GraphML, which remembers node labels, see :class:`GraphMLWriter`. Every function, class and method defined in a
+    file is written as a node with its `file` and `line`, and every call as an edge with the `file` and `line` of the
+    calling definition. Calls to other files cannot be linked to their definitions before every file is known, so
+    they are named by their import path, unless `symbols` already holds the definitions of the project.
+
+    Attributes:
+        format (string): One of :data:`EXPORT_FORMATS`.
+        symbols (:class:`codegrapher.symbols.SymbolIndex`): Definitions calls are resolved against, or `None`.
+        files (int): Number of files exported.
+    """
+    def __init__(self, output, format=None, symbols=None):
+        if format is None:
+            format = export_format(output) if isinstance(output, str) else 'jsonl'
+        if format not in WRITERS:
+            raise ValueError('format must be one of {}, not {!r}'.format(', '.join(EXPORT_FORMATS), format))
+        self.format = format
+        self.symbols = symbols
+        self.files = 0
+        self._file = None
+        self._stdout = None
+        if output == '-':
+            # standard output is written like output files, without newline translation, as CSV rows end in \r\n
+            sys.stdout.flush()
+            stream = self._stdout = io.TextIOWrapper(sys.stdout.buffer, encoding=sys.stdout.encoding, newline='')
+        elif hasattr(output, 'write'):
+            stream = output
+        else:
+            stream = self._file = open(output, 'w', encoding='utf-8', newline='')
+        self._writer = WRITERS[format](stream)
+
+    def add_file(self, file_object):
+        """ Writes the nodes and edges of a visited file.
+
+        Arguments:
+            file_object (:class:`codegrapher.parser.FileObject`): File to export.
+        """
+        with profiling.stage('export', file_object.name):
+            graph = FunctionGrapher(symbols=self.symbols)
+            graph.add_file_to_graph(file_object)
+            lines = _definition_lines(file_object)
+            namespace = file_object.relative_namespace
+            for node in sorted(graph.iter_nodes()):
+                if node and node[0] == namespace:
+                    self._writer.node('.'.join(node), file=file_object.name, line=lines.get(node))
+            for tail, head in sorted(graph.iter_edges()):
+                self._writer.edge('.'.join(tail), '.'.join(head), file=file_object.name, line=lines.get(tail))
+            self.files += 1
+
+    def _release(self):
+        if self._stdout is not None:
+            self._stdout.flush()
+            self._stdout.detach()
+            self._stdout = None
+        if self._file is not None:
+            self._file.close()
+
+    def close(self):
+        """ Ends the export, closing the output file if it was opened by the exporter. """
+        try:
+            self._writer.close()
+        finally:
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # a failed export is left unfinished, so that it cannot be mistaken for a complete document
+        if exc_type is None:
+            self.close()
+        else:
+            self._release()
+
+
+def export_files(file_objects, output, format=None, symbols=None):
+    """ Exports files as they are produced, see :class:`Exporter`.
+
+    Arguments:
+        file_objects (iterable): Visited :class:`codegrapher.parser.FileObject` objects, consumed lazily.
+        output (string or file): Path of the file to write, `-` for standard output, or a text file object.
+        format (string): One of :data:`EXPORT_FORMATS`, guessed from the extension of `output` by default.
+        symbols (:class:`codegrapher.symbols.SymbolIndex`): Definitions calls are resolved against, or `None`.
+
+    Returns:
+        (int): Number of files exported.
+    """
+    with Exporter(output, format=format, symbols=symbols) as exporter:
+        for file_object in file_objects:
+            exporter.add_file(file_object)
+    return exporter.files
@@ -1,5 +1,16 @@
+import sys
+import threading
+import weakref
+from collections import Counter, defaultdict
+
 from graphviz import Digraph
 
+from codegrapher import profiling
+from codegrapher.components import cyclic_components
+from codegrapher.dot import DotWriter, run_layouts
+from codegrapher.parser import FileObject
+from codegrapher.symbols import SymbolIndex, absolute_module
+
 
 class FilenameNotSpecifiedException(Exception):
     """ An exception raised when a file name is not specified in a :class:`FunctionGrapher` instance before calling
@@ -8,6 +19,55 @@ class FilenameNotSpecifiedException(Exception):
     pass
 
 
+class FrozenGraphError(Exception):
+    """ An exception raised when adding to, or removing from, a snapshot returned by :func:`FunctionGrapher.freeze`.
+    """
+    pass
+
+
+EDGE_SHIFT = 32
+EDGE_MASK = (1 << EDGE_SHIFT) - 1
+# number of functions named in the label of a collapsed cycle
+CYCLE_LABEL_SIZE = 3
+COLLAPSED_NODE_ATTR = {'shape': 'box'}
+
+
+def cluster_key(node, class_keys=()):
+    """ Finds the cluster a node is drawn in: its class for methods and classes, or its module.
+
+    Arguments:
+        node (tuple): Node tuple, as in :attr:`Node.tuple`.
+        class_keys (set): `(namespace, class name)` tuples of the classes with methods in the graph.
+
+    Returns:
+        (tuple): `(namespace, class name)` for the methods of a class, and the class itself if it is in `class_keys`,
+        `(namespace,)` for the other nodes of a module, or `()` for nodes outside of any module, as builtins.
+    """
+    if len(node) > 2:
+        return node[:2]
+    if node in class_keys:
+        return node
+    return node[:1] if len(node) == 2 else ()
+
+
+def node_tuple(input_node):
+    """ Normalizes the different representations of a node to the tuple stored in :attr:`Node.tuple`.
+
+    Arguments:
+        input_node (tuple, string or :class:`Node`): Node to normalize.
+
+    Returns:
+        (tuple)
+    """
+    if isinstance(input_node, Node):
+        return input_node.tuple
+    if isinstance(input_node, tuple):
+        if input_node[0] == '':
+            return input_node[1:]
+        return input_node
+    return (input_node,)
+
+
 class Node(object):
     """ A class to more easily handle manipulations needed to properly display nodes in a graph.
     Optimized to handle nodes that represent functions in a program.
@@ -17,14 +77,11 @@ class Node(object):
             string, this contains just the class and function names. If a string is provided to the constructor this
             is a tuple containing just the function name.
     """
+    __slots__ = ('tuple', '_hash')
+
     def __init__(self, input_node):
-        if isinstance(input_node, tuple):
-            if input_node[0] == '':
-                self.tuple = input_node[1:]
-            else:
-                self.tuple = input_node
-        else:
-            self.tuple = (input_node,)
+        self.tuple = node_tuple(input_node)
+        self._hash = hash(self.tuple)
 
     @property
     def represent(self):
@@ -42,7 +99,7 @@ class Node(object):
         return "<Node: {}>".format(self.tuple)
 
     def __hash__(self):
-        return hash('.'.join(self.tuple))
+        return self._hash
 
     def __eq__(self, other):
         return self.tuple == other.tuple
@@ -52,17 +109,89 @@ class FunctionGrapher(object):
     """ `FunctionGrapher` is a class for producing `graphviz <http://www.graphviz.org/>`_ graphs showing the call
     graph for sets of classes.
 
+    Each distinct node is interned once as a small integer id, and edges are stored as `(tail id << 32) | head id`
+    packed integers, so adding an edge never builds :class:`Node` objects or joins strings.
+
+    If `track_files` is set, the nodes and edges contributed by each file are remembered so that a file can later be
+    removed from, or replaced in, the graph at a cost proportional to the size of that file.
+
+    Calls are linked to the nodes of the functions and classes they refer to through `symbols`, so a function imported
+    from another file is drawn as a single node whichever file calls it. :func:`FunctionGrapher.add_files_to_graph`
+    registers all files before adding any, so calls between them are linked whatever their order.
+
+    A grapher can be shared between threads. Each file is first graphed into a buffer local to the calling thread, so
+    threads only hold the lock of the grapher while the buffer is merged. Reading the graph, as in iterating over it,
+    rendering it or indexing it, holds the lock too, so readers never see a file half added, but writers wait for
+    them. To read while files keep being added, take a snapshot with :func:`FunctionGrapher.freeze`: it shares the
+    node and edge sets of the graph, which writers copy before changing them as long as a snapshot is alive.
+
     Attributes:
         name (string): Name to be used when a graph is made.
-        nodes (set): Graphviz nodes to be graphed.
-        edges (set): Directional edges connecting one node to another.
+        nodes (frozenset): Graphviz nodes to be graphed, as :class:`Node` objects. Built on access, and read-only: use
+            :func:`FunctionGrapher.add_node` to add nodes.
+        edges (frozenset): Directional edges connecting one node to another, as pairs of :class:`Node` objects. Built
+            on access, and read-only: use :func:`FunctionGrapher.add_edge` to add edges.
         format (string): File format for graph. Default is `pdf`.
+        clusters (bool): Draw the nodes of each module, and of each class within it, together in a box when
+            rendering.
+        max_nodes (int): Largest number of nodes to draw, or `None` for no limit. Over the budget, the largest classes
+            and then the largest modules are drawn as single nodes, with edges weighted by the number of calls they
+            stand for, until the graph fits.
+        dot_file (:class:`graphviz.Digraph`): Holds the format, layout engine and graph, node and edge attributes
+            used when rendering.
+        symbols (:class:`codegrapher.symbols.SymbolIndex`): Definitions calls are resolved against, or `None` to only
+            link calls to definitions in the same file.
     """
-    def __init__(self):
+    def __init__(self, track_files=False, symbols=None):
         self.name = ''
         self.dot_file = Digraph()
-        self.nodes = set()
-        self.edges = set()
+        self.clusters = False
+        self.max_nodes = None
+        self.symbols = symbols
+        self._node_ids = {}
+        self._node_tuples = []
+        self._nodes = set()
+        self._edges = set()
+        self._contributions = {} if track_files else None
+        self._node_refs = Counter()
+        self._edge_refs = Counter()
+        self._lock = threading.RLock()
+        # node ids are shared with the buffers files are graphed into, so they have a lock of their own
+        self._intern_lock = threading.Lock()
+        # snapshots sharing the node and edge sets, which must be copied before being changed while any is alive
+        self._snapshots = weakref.WeakSet()
+        self._frozen = False
+
+    def _writable(self):
+        # to be called with the lock held
+        if self._frozen:
+            raise FrozenGraphError('graph snapshots cannot be changed')
+        if self._snapshots:
+            self._nodes = set(self._nodes)
+            self._edges = set(self._edges)
+            self._snapshots = weakref.WeakSet()
+
+    def freeze(self):
+        """ Takes a snapshot of the graph, which readers can query or render while writers keep adding files.
+
+        The node and edge sets are shared with the snapshot until the graph next changes, when the graph copies them,
+        so taking a snapshot only copies the tables of node ids.
+
+        Returns:
+            (:class:`FunctionGrapher`): Read-only copy of the graph, with its name, rendering settings and graphviz
+            attributes. Adding to it raises :class:`FrozenGraphError`.
+        """
+        with self._lock:
+            snapshot = self._empty_copy()
+            snapshot.symbols = self.symbols
+            with self._intern_lock:
+                snapshot._node_tuples = list(self._node_tuples)
+                snapshot._node_ids = dict(self._node_ids)
+            snapshot._nodes, snapshot._edges = self._nodes, self._edges
+            snapshot._frozen = True
+            if not self._frozen:
+                self._snapshots.add(snapshot)
+            return snapshot
 
     @property
     def format(self):
@@ -72,47 +201,222 @@ class FunctionGrapher(object):
     def format(self, value):
         self.dot_file.format = value
 
+    @property
+    def nodes(self):
+        with self._lock:
+            return frozenset(Node(self._node_tuples[node_id]) for node_id in self._nodes)
+
+    @property
+    def edges(self):
+        with self._lock:
+            node_tuples = self._node_tuples
+            return frozenset((Node(node_tuples[edge >> EDGE_SHIFT]), Node(node_tuples[edge & EDGE_MASK]))
+                             for edge in self._edges)
+
+    def intern(self, node):
+        """ Looks up the integer id of a node, assigning the next free id to nodes seen for the first time.
+
+        Arguments:
+            node (tuple, string or :class:`Node`): Node to intern.
+
+        Returns:
+            (int): Id of the node.
+        """
+        node = node_tuple(node)
+        node_id = self._node_ids.get(node)
+        if node_id is None:
+            with self._intern_lock:
+                node_id = self._node_ids.get(node)
+                if node_id is None:
+                    node_id = self._node_ids[node] = len(self._node_tuples)
+                    self._node_tuples.append(node)
+        return node_id
+
+    def add_node(self, node):
+        """ Adds a node to the graph.
+
+        Arguments:
+            node (tuple, string or :class:`Node`): Node to add.
+
+        Returns:
+            (int): Id of the node.
+        """
+        with self._lock:
+            self._writable()
+            return self._add_node(node)
+
+    def _add_node(self, node):
+        # to be called with the lock held, on a writable graph
+        node_id = self.intern(node)
+        self._nodes.add(node_id)
+        return node_id
+
+    def add_edge(self, tail, head):
+        """ Adds an edge to the graph. The nodes at either end are interned but not added as graph nodes.
+
+        Arguments:
+            tail (tuple, string or :class:`Node`): Node the edge starts from.
+            head (tuple, string or :class:`Node`): Node the edge points to.
+        """
+        with self._lock:
+            self._writable()
+            self._add_edge(tail, head)
+
+    def _add_edge(self, tail, head):
+        # to be called with the lock held, on a writable graph
+        self._edges.add(self.intern(tail) << EDGE_SHIFT | self.intern(head))
+
+    def iter_nodes(self):
+        """ Iterates over the nodes of the graph without building :class:`Node` objects.
+
+        Yields:
+            (tuple): Node tuples, as in :attr:`Node.tuple`.
+        """
+        with self._lock:
+            # only the ids are copied, so the lock is not held while the caller handles each node
+            node_ids = list(self._nodes)
+        node_tuples = self._node_tuples
+        for node_id in node_ids:
+            yield node_tuples[node_id]
+
+    def iter_edges(self):
+        """ Iterates over the edges of the graph without building :class:`Node` objects.
+
+        Yields:
+            (tuple): `(tail, head)` pairs of node tuples.
+        """
+        with self._lock:
+            edges = list(self._edges)
+        node_tuples = self._node_tuples
+        for edge in edges:
+            yield node_tuples[edge >> EDGE_SHIFT], node_tuples[edge & EDGE_MASK]
+
     def add_file_to_graph(self, file_object):
-        """ When given a :class:`codegrapher.parser.FileObject` object, this adds all classes to the current graph.
+        """ When given a :class:`codegrapher.parser.FileObject` object, this adds all classes and module level
+        functions to the current graph. Several threads may add files at once.
 
         Arguments:
             file_object (:class:`codegrapher.parser.FileObject`): Visitor objects to have all its classes added to the
               current graph.
         """
+        with profiling.stage('graph', file_object.name):
+            self._add_file_to_graph(file_object)
+
+    def add_files_to_graph(self, file_objects):
+        """ Adds several files to the graph, linking the calls made between them. Every file is registered in
+        `symbols`, which is created if needed, before any file is added.
+
+        `file_objects` is consumed once, as files are registered, so it can be a stream such as the output of
+        :func:`codegrapher.parallel.parse_files`. Until every file is registered, only the call data of each file is
+        kept, as in :func:`codegrapher.parser.FileObject.release`, not its AST.
+
+        Arguments:
+            file_objects (iterable): :class:`codegrapher.parser.FileObject` objects to add.
+        """
+        with self._lock:
+            # checked before registering files, as a snapshot shares the symbols of the live graph
+            if self._frozen:
+                raise FrozenGraphError('graph snapshots cannot be changed')
+            if self.symbols is None:
+                self.symbols = SymbolIndex()
+        pending = []
+        for file_object in file_objects:
+            self.symbols.add_file(file_object)
+            if file_object.node is not None:
+                file_object = FileObject.from_summary(file_object.summary())
+            pending.append(file_object)
+        for file_object in pending:
+            self.add_file_to_graph(file_object)
+
+    def _add_file_to_graph(self, file_object):
+        # the file is graphed without holding the lock, into a buffer sharing the node ids of the graph
+        buffer = FunctionGrapher(symbols=self.symbols)
+        buffer._node_ids, buffer._node_tuples = self._node_ids, self._node_tuples
+        buffer._intern_lock = self._intern_lock
+        buffer._add_file(file_object)
+        file_nodes, file_edges = buffer._nodes, buffer._edges
+        with self._lock:
+            self._writable()
+            if self._contributions is not None:
+                # a file added again replaces its previous contribution
+                self.remove_file_from_graph(file_object.name)
+                self._contributions[file_object.name] = (file_nodes, file_edges)
+                self._node_refs.update(file_nodes)
+                self._edge_refs.update(file_edges)
+            self._nodes.update(file_nodes)
+            self._edges.update(file_edges)
+
+    def _add_file(self, file_object):
         class_namespace = dict((cls.name, file_object.relative_namespace) for cls in file_object.classes)
-        for cls in file_object.classes:
-            self.add_dict_to_graph(class_namespace, cls.call_tree, file_object.relative_namespace)
+        function_names = set(fcn.name for fcn in file_object.functions)
+        # functions nested in other functions are callers named as in `outer.inner` or `Class.method.inner`
+        call_trees = [file_object.call_tree] + [cls.call_tree for cls in file_object.classes]
+        nested = dict(('.'.join(caller[1:]), caller) for call_tree in call_trees for caller in call_tree
+                      if len(caller) > 1 and '.' in caller[-1])
+        for call_tree in call_trees:
+            self.add_dict_to_graph(class_namespace, call_tree, file_object.relative_namespace, function_names, nested)
         self.add_classes_to_graph(file_object.classes, file_object.relative_namespace)
 
-    def add_dict_to_graph(self, class_names, dictionary, relative_namespace):
+    def remove_file_from_graph(self, file_name):
+        """ Removes the nodes and edges contributed by a file, unless other files contribute them too. Only available
+        when the graph was created with `track_files`.
+
+        Arguments:
+            file_name (string): Name of a :class:`codegrapher.parser.FileObject` previously added to the graph.
+
+        Returns:
+            (bool): True if the file was part of the graph.
+        """
+        with self._lock:
+            self._writable()
+            file_nodes, file_edges = self._contributions.pop(file_name, (None, None))
+            if file_nodes is None:
+                return False
+            for refs, items, contributed in ((self._node_refs, self._nodes, file_nodes),
+                                             (self._edge_refs, self._edges, file_edges)):
+                for item in contributed:
+                    refs[item] -= 1
+                    if not refs[item]:
+                        del refs[item]
+                        items.discard(item)
+            return True
+
+    def add_dict_to_graph(self, class_names, dictionary, relative_namespace, function_names=(), nested=None):
         """ Creates a list of nodes and edges to be rendered. Deduplicates input.
 
         Arguments:
             class_names (list): List of class names to be recognized by the graph as `class_name.__init__` nodes.
-            dictionary (dict): `ClassObject.call_tree` dict to be added to graph nodes and edges.
+            dictionary (dict): `ClassObject.call_tree` or `FileObject.call_tree` dict to be added to graph nodes and
+                edges.
             relative_namespace (string): Relative namespace for the current class, i.e. where the current class is
                 located relative to the root, in dotted path notation.
+            function_names (set): Names of the module level functions of the current file, whose calls are linked to
+                their `namespace.function_name` nodes.
+            nested (dict): Node tuples of the functions of the current file nested in other functions, by the
+                qualified name their calls are recorded under, as in `outer.inner`, see
+                :attr:`codegrapher.parser.CallVisitor.definitions`.
         """
-        # todo: better handle project hierarchy by looking at imports
-        # add nodes
-        for origin in dictionary:
-            self.nodes.add(Node(origin))
-            for destination in dictionary[origin]:
-                if destination[0] in class_names:
-                    destination = Node((relative_namespace, destination[0], '__init__'))
-                else:
-                    destination = Node(destination)
-                self.nodes.add(destination)
-
-        # add edges
-        for origin in dictionary:
-            for destination in dictionary[origin]:
-                # if destination is a class name, it is a constructor
-                if destination[0] in class_names:
-                    destination = (relative_namespace, destination[0], '__init__')
-                else:
-                    destination = destination
-                self.edges.add((Node(origin), Node(destination)))
+        symbols = self.symbols
+        with self._lock:
+            self._writable()
+            for origin, destinations in dictionary.items():
+                origin_id = self._add_node(origin)
+                for destination in destinations:
+                    # if destination is a class name, it is a constructor
+                    if destination[0] in class_names:
+                        destination = (relative_namespace, destination[0], '__init__')
+                    elif len(destination) == 1 and destination[0] in function_names:
+                        destination = (relative_namespace, destination[0])
+                    elif nested and len(destination) == 1 and destination[0] in nested:
+                        destination = nested[destination[0]]
+                    else:
+                        # calls to definitions in other files are linked through the imports of the current file
+                        resolved = symbols.resolve(destination, relative_namespace) if symbols is not None else None
+                        if resolved is not None:
+                            destination = resolved
+                        elif destination[0].startswith('.'):
+                            destination = (absolute_module(destination[0], relative_namespace),) + destination[1:]
+                    self._edges.add(origin_id << EDGE_SHIFT | self._add_node(destination))
 
     def add_classes_to_graph(self, classes, relative_namespace):
         """ Adds classes with constructors to the set.
@@ -122,47 +426,281 @@ class FunctionGrapher(object):
             classes (list): list of :class:`codegrapher.parser.ClassObject` items.
             relative_namespace (string): namespace of the current class.
         """
-        for cls in classes:
-            # If a class is here, add it as a node
-            self.nodes.add(Node((relative_namespace, cls.name)))
-
-            if not all((fcn.is_classmethod for fcn in cls.functions)):
-                # for case where there is at least one non-classmethod, assume implied (or explicit) __init__
-
-                # make a node between the class name and __init__
-                self.nodes.add(Node((relative_namespace, cls.name, '__init__')))
-                self.edges.add((Node((relative_namespace, cls.name)), Node((relative_namespace, cls.name, '__init__'))))
-                for fcn in cls.functions:
-                    # skip classmethods and case where init would refer back to itself
-                    if not fcn.is_classmethod and not fcn.name == '__init__':
-                        self.edges.add((Node((relative_namespace, cls.name, '__init__')),
-                                        Node((relative_namespace, cls.name, fcn.name))))
-                    elif fcn.is_classmethod:
-                        self.edges.add((Node((relative_namespace, cls.name)),
-                                        Node((relative_namespace, cls.name, fcn.name))))
+        with self._lock:
+            self._writable()
+            for cls in classes:
+                # If a class is here, add it as a node
+                class_node = (relative_namespace, cls.name)
+                self._add_node(class_node)
+
+                if not all((fcn.is_classmethod for fcn in cls.functions)):
+                    # for case where there is at least one non-classmethod, assume implied (or explicit) __init__
+
+                    # make a node between the class name and __init__
+                    init_node = (relative_namespace, cls.name, '__init__')
+                    self._add_node(init_node)
+                    self._add_edge(class_node, init_node)
+                    for fcn in cls.functions:
+                        # skip classmethods and case where init would refer back to itself
+                        if not fcn.is_classmethod and not fcn.name == '__init__':
+                            self._add_edge(init_node, (relative_namespace, cls.name, fcn.name))
+                        elif fcn.is_classmethod:
+                            self._add_edge(class_node, (relative_namespace, cls.name, fcn.name))
+
+                else:
+                    # for the case where there are only classmethods defined
+                    for fcn in cls.functions:
+                        self._add_edge(class_node, (relative_namespace, cls.name, fcn.name))
+
+    def subgraph(self, focus, depth=1, direction='both'):
+        """ Extracts the part of the graph around some functions, so that only that part is laid out.
+
+        Functions are selected with :func:`codegrapher.query.GraphQueries.neighborhood`, over an index of the graph.
+
+        Arguments:
+            focus (string or list): Dotted label of the function to focus on, or a list of such labels.
+            depth (int): Largest number of calls between a focused function and the functions kept, or `None` for no
+                limit.
+            direction (string): `callees` to keep the functions called by the focused ones, `callers` to keep those
+                calling them, or `both`.
+
+        Returns:
+            (:class:`FunctionGrapher`): New graph holding the functions kept and the edges between them, with the
+            name, format and graphviz attributes of the current graph.
+
+        Raises:
+            KeyError: If a focused function is not in the graph.
+            ValueError: If `direction` is not valid.
+        """
+        # imported here as the query module builds on the edge layout defined in this one
+        from codegrapher.query import GraphIndex
+
+        snapshot = self.freeze()
+        index = GraphIndex(snapshot)
+        selected = set()
+        for label in [focus] if isinstance(focus, str) else focus:
+            selected.update(index.neighborhood(label, depth=depth, direction=direction))
+
+        graph = self._empty_copy()
+        for node in snapshot.iter_nodes():
+            if '.'.join(node) in selected:
+                graph.add_node(node)
+        for tail, head in snapshot.iter_edges():
+            if '.'.join(tail) in selected and '.'.join(head) in selected:
+                graph.add_edge(tail, head)
+        return graph
+
+    def _empty_copy(self):
+        graph = FunctionGrapher()
+        graph.name = self.name
+        graph.clusters = self.clusters
+        graph.max_nodes = self.max_nodes
+        graph.dot_file = Digraph(format=self.dot_file.format, engine=self.dot_file.engine,
+                                 graph_attr=dict(self.dot_file.graph_attr), node_attr=dict(self.dot_file.node_attr),
+                                 edge_attr=dict(self.dot_file.edge_attr))
+        return graph
+
+    def _cyclic_components(self, edges):
+        adjacency = {}
+        for edge in edges:
+            adjacency.setdefault(edge >> EDGE_SHIFT, []).append(edge & EDGE_MASK)
+        return cyclic_components(sorted(adjacency), lambda node_id: adjacency.get(node_id, ()))
+
+    def cycles(self):
+        """ Finds the recursive and mutually recursive functions of the graph, with an iterative strongly connected
+        components search that runs in time linear in the size of the graph.
+
+        Returns:
+            (list): Groups of functions calling each other, directly or not, as sorted lists of node tuples. Largest
+            groups come first. A recursive function calling itself is a group on its own.
+        """
+        with profiling.stage('cycles'), self._lock:
+            node_tuples = self._node_tuples
+            cycles = [sorted(node_tuples[node_id] for node_id in component)
+                      for component in self._cyclic_components(self._edges)]
+            return sorted(cycles, key=lambda cycle: (-len(cycle), cycle))
+
+    def condense(self):
+        """ Collapses each group of mutually recursive functions into a single node, which shrinks the graph to lay out
+        without changing which functions reach which.
+
+        Returns:
+            (:class:`FunctionGrapher`): New graph where the functions of each group of several functions calling each
+            other are replaced by one node, labelled after the first functions of the group and their number, with the
+            name, format and graphviz attributes of the current graph. Edges within a group are dropped, except for
+            functions calling themselves.
+        """
+        with profiling.stage('cycles'), self._lock:
+            nodes, edges = self._nodes, self._edges
+            node_tuples = self._node_tuples
+            collapsed = {}
+            for component in self._cyclic_components(edges):
+                if len(component) < 2:
+                    continue
+                labels = sorted('.'.join(node_tuples[node_id]) for node_id in component)
+                label = ' | '.join(labels[:CYCLE_LABEL_SIZE])
+                if len(labels) > CYCLE_LABEL_SIZE:
+                    label += ' | ... ({} functions)'.format(len(labels))
+                for node_id in component:
+                    collapsed[node_id] = (label,)
+
+            graph = self._empty_copy()
+            for node_id in nodes:
+                graph.add_node(collapsed.get(node_id, node_tuples[node_id]))
+            for edge in edges:
+                tail, head = edge >> EDGE_SHIFT, edge & EDGE_MASK
+                tail_node, head_node = collapsed.get(tail), collapsed.get(head)
+                if tail_node is not None and tail_node == head_node:
+                    continue
+                graph.add_edge(tail_node or node_tuples[tail], head_node or node_tuples[head])
+            return graph
+
+    def write_dot(self, output):
+        """ Streams the DOT source of the current graph, without building it in memory first.
+
+        Arguments:
+            output (string or file): Path of the file to write, `-` for standard output, or a text file object.
+        """
+        if output == '-':
+            self._write_dot(sys.stdout)
+        elif hasattr(output, 'write'):
+            self._write_dot(output)
+        else:
+            with open(output, 'w', encoding='utf-8') as output_file:
+                self._write_dot(output_file)
+
+    def _write_dot(self, stream):
+        # the lock is held while writing, so render a snapshot from `freeze` not to hold up writers
+        with profiling.stage('write_dot'), self._lock:
+            with DotWriter(stream, graph_attr=self.dot_file.graph_attr, node_attr=self.dot_file.node_attr,
+                           edge_attr=self.dot_file.edge_attr) as writer:
+                nodes, edges = self._nodes, self._edges
+                if self.clusters or self.max_nodes is not None:
+                    self._write_aggregated(writer, nodes, edges)
+                    return
+                # labels are joined the first time their node is written, so interned nodes left out of the graph,
+                # as filtered calls, cost nothing
+                node_tuples = self._node_tuples
+                labels = {}
+
+                def label(node_id):
+                    text = labels.get(node_id)
+                    if text is None:
+                        text = labels[node_id] = '.'.join(node_tuples[node_id])
+                    return text
+
+                for node_id in nodes:
+                    writer.node(label(node_id))
+                for edge in edges:
+                    writer.edge(label(edge >> EDGE_SHIFT), label(edge & EDGE_MASK))
+
+    def aggregate(self):
+        """ Places the nodes of the graph in clusters and, over the `max_nodes` budget, collapses classes and modules.
+
+        Classes are collapsed first, largest first, then modules, until the number of distinct labels fits in the
+        budget. Nodes outside of any module, as builtins, are never collapsed, so the graph may stay over budget.
+
+        Returns:
+            (tuple): `placements`, a dict of `(label, cluster)` pairs by node id, where `cluster` is as returned by
+            :func:`cluster_key`, and `sizes`, a dict of the number of labels each collapsed node stands for, by label.
+        """
+        with self._lock:
+            return self._aggregate(self._nodes, self._edges)
 
+    def _aggregate(self, nodes, edges):
+        node_tuples = self._node_tuples
+        node_ids = set(nodes)
+        for edge in edges:
+            node_ids.add(edge >> EDGE_SHIFT)
+            node_ids.add(edge & EDGE_MASK)
+        class_keys = set(node_tuples[node_id][:2] for node_id in node_ids if len(node_tuples[node_id]) > 2)
+        placements = dict((node_id, ('.'.join(node_tuples[node_id]), cluster_key(node_tuples[node_id], class_keys)))
+                          for node_id in node_ids)
+        sizes = {}
+        count = len(set(label for label, cluster in placements.values()))
+        if self.max_nodes is None or count <= self.max_nodes:
+            return placements, sizes
+
+        # classes are collapsed into their module, then modules into the top level
+        for level in (2, 1):
+            groups = defaultdict(list)
+            for node_id, (label, cluster) in placements.items():
+                if len(cluster) >= level:
+                    groups[cluster[:level]].append(node_id)
+            ordered = []
+            for key, members in groups.items():
+                labels = set(placements[node_id][0] for node_id in members)
+                ordered.append((-len(labels), key, members, labels))
+            for negative_size, key, members, labels in sorted(ordered):
+                if count <= self.max_nodes:
+                    return placements, sizes
+                if len(labels) < 2:
+                    continue
+                size = sum(sizes.pop(label, 1) for label in labels)
+                label = '{} ({} nodes)'.format('.'.join(key), size)
+                sizes[label] = size
+                for node_id in members:
+                    placements[node_id] = (label, key[:level - 1])
+                count -= len(labels) - 1
+        return placements, sizes
+
+    def _write_aggregated(self, writer, nodes, edges):
+        placements, sizes = self._aggregate(nodes, edges)
+        clusters = defaultdict(set)
+        for label, cluster in placements.values():
+            clusters[cluster if self.clusters else ()].add(label)
+
+        def write_nodes(labels):
+            for label in sorted(labels):
+                writer.node(label, **(COLLAPSED_NODE_ATTR if label in sizes else {}))
+
+        write_nodes(clusters.pop((), ()))
+        for module in sorted(set(cluster[:1] for cluster in clusters)):
+            writer.begin_subgraph(label=module[0])
+            write_nodes(clusters.get(module, ()))
+            for cluster in sorted(cluster for cluster in clusters if len(cluster) > 1 and cluster[0] == module[0]):
+                writer.begin_subgraph(label='.'.join(cluster))
+                write_nodes(clusters[cluster])
+                writer.end_subgraph()
+            writer.end_subgraph()
+
+        weights = Counter()
+        for edge in edges:
+            tail, head = placements[edge >> EDGE_SHIFT][0], placements[edge & EDGE_MASK][0]
+            # calls within a collapsed class or module are not drawn
+            if tail != head or tail not in sizes:
+                weights[(tail, head)] += 1
+        for (tail, head), weight in sorted(weights.items()):
+            if weight > 1:
+                writer.edge(tail, head, weight=weight, label=weight)
             else:
-                # for the case where there are only classmethods defined
-                for fcn in cls.functions:
-                    self.edges.add((Node((relative_namespace, cls.name)),
-                                    Node((relative_namespace, cls.name, fcn.name))))
+                writer.edge(tail, head)
 
-    def render(self, name=None):
-        """ Renders the current graph. `Graphviz <http://www.graphviz.org/>`_ must be installed for the graph to be
-            rendered.
+    def render(self, name=None, layout=True, formats=None, timeout=None):
+        """ Renders the current graph. The DOT source is saved to a file named `name`, then laid out by
+            `Graphviz <http://www.graphviz.org/>`_ into `name.format`. Graphviz must be installed for the graph to be
+            laid out.
 
         Arguments:
             name (string): filename to override `self.name`.
+            layout (bool): If False, only the DOT source is saved, so it can be laid out later or elsewhere.
+            formats (list): Formats to lay the graph out in, instead of `self.format`. The DOT source is written once
+                and the layouts run concurrently.
+            timeout (float): Seconds after which a layout is killed, or `None` to wait for as long as it takes.
+
+        Returns:
+            (list): Paths of the laid out files.
 
         Raises:
             FilenameNotSpecifiedException: If `FunctionGrapher.name` is not specified.
+            codegrapher.dot.LayoutTimeoutError: If a layout takes longer than `timeout`.
         """
-        for node in self.nodes:
-            self.dot_file.node(node.represent)
-        for edge in self.edges:
-            self.dot_file.edge(edge[0].represent, edge[1].represent)
         if name is None:
             if not self.name:
                 raise FilenameNotSpecifiedException
             name = self.name
-        self.dot_file.render(name)
+        self.write_dot(name)
+        if not layout:
+            return []
+        with profiling.stage('layout'):
+            return run_layouts(name, formats or [self.format], engine=self.dot_file.engine, timeout=timeout)
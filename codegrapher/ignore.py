@@ -0,0 +1,131 @@
+import fnmatch
+import os
+import re
+
+
+IGNORE_FILE = '.cg_ignore'
+
+
+class IgnoreMatcher(object):
+    """ Decides which calls to ignore, from a list of patterns compiled once.
+
+    Patterns take the following forms:
+
+    * ``log_error``: a function name, matching calls to any function of that name.
+    * ``pkg.mod.Class.method``: a dotted name, matching calls whose fully qualified name is exactly that.
+    * ``test_*`` or ``requests.*``: a glob, matched against the function name if it has no dot, or against the fully
+      qualified name otherwise.
+    * ``re:pattern``: a regular expression, which must match the whole fully qualified name.
+
+    Plain names and dotted names are looked up in sets, and all globs and regular expressions are combined into a
+    single compiled regular expression. Results are memoized per call, so checking a call seen before costs a single
+    dict lookup.
+
+    Attributes:
+        patterns (tuple): Patterns the matcher was built from.
+    """
+    def __init__(self, patterns=()):
+        self.patterns = tuple(patterns)
+        self._names = set()
+        self._qualified_names = set()
+        name_expressions = []
+        qualified_expressions = []
+        for pattern in self.patterns:
+            if pattern.startswith('re:'):
+                qualified_expressions.append(pattern[3:])
+            elif any(character in pattern for character in '*?['):
+                target = qualified_expressions if '.' in pattern else name_expressions
+                target.append(fnmatch.translate(pattern))
+            elif '.' in pattern:
+                self._qualified_names.add(pattern)
+            else:
+                self._names.add(pattern)
+        self._name_expression = self._compile(name_expressions)
+        self._qualified_expression = self._compile(qualified_expressions)
+        self._needs_qualified_name = bool(self._qualified_names or self._qualified_expression)
+        self._results = {}
+
+    @staticmethod
+    def _compile(expressions):
+        if not expressions:
+            return None
+        return re.compile('|'.join('(?:{})'.format(expression) for expression in expressions))
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def __repr__(self):
+        return '<IgnoreMatcher: {} patterns>'.format(len(self.patterns))
+
+    def matches(self, call):
+        """ Checks whether a call should be ignored.
+
+        Arguments:
+            call (tuple): `(module, identifier)` or `(identifier,)` call, as in :attr:`ClassObject.call_tree`.
+
+        Returns:
+            (bool)
+        """
+        result = self._results.get(call)
+        if result is None:
+            result = self._results[call] = self._matches(call)
+        return result
+
+    def _matches(self, call):
+        name = call[-1]
+        if not isinstance(name, str):
+            return False
+        if name in self._names:
+            return True
+        if self._name_expression is not None and self._name_expression.fullmatch(name):
+            return True
+        if self._needs_qualified_name:
+            qualified_name = '.'.join(part for part in call if part)
+            if qualified_name in self._qualified_names:
+                return True
+            if self._qualified_expression is not None and self._qualified_expression.fullmatch(qualified_name):
+                return True
+        return False
+
+    @classmethod
+    def from_lines(cls, lines):
+        """ Builds a matcher from the lines of an ignore file. Blank lines and lines starting with `#` are skipped.
+
+        Arguments:
+            lines (iterable): Lines of the ignore file.
+
+        Returns:
+            (:class:`IgnoreMatcher`)
+        """
+        patterns = []
+        for line in lines:
+            line = line.strip()
+            if line and line[0] != '#':
+                patterns.append(line)
+        return cls(patterns)
+
+
+_loaded = {}
+
+
+def load_ignore_file(path=IGNORE_FILE):
+    """ Loads an ignore file into an :class:`IgnoreMatcher`. The file is only read and compiled again when it changes,
+    so calling this for every file of a run is cheap.
+
+    Arguments:
+        path (string): Path of the ignore file, `.cg_ignore` in the current directory by default.
+
+    Returns:
+        (:class:`IgnoreMatcher`): Matcher for the file, empty if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return IgnoreMatcher()
+    key = os.path.abspath(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    loaded = _loaded.get(key)
+    if loaded is None or loaded[0] != signature:
+        with open(path, 'r') as ignore_file:
+            loaded = _loaded[key] = (signature, IgnoreMatcher.from_lines(ignore_file))
+    return loaded[1]
@@ -0,0 +1,138 @@
+import collections
+import functools
+import itertools
+import multiprocessing
+import os
+
+from codegrapher.ignore import IgnoreMatcher, load_ignore_file
+from codegrapher.parser import FileObject
+
+
+def parse_file(file_name, remove_builtins=False, ignore=False, cache=None, source=None, lean=False):
+    """Parses a single file and applies the requested filters to it.
+
+    Args:
+        file_name (string): Path of the file to parse, or only its name if `source` is given.
+        remove_builtins (bool): Remove builtin functions from the call trees.
+        ignore (bool or :class:`codegrapher.ignore.IgnoreMatcher`): Remove functions listed in a `.cg_ignore` file, or
+            matched by the given matcher, from the call trees.
+        cache (:class:`codegrapher.cache.ParseCache`): Cache used to skip parsing files whose contents were seen before.
+        source (bytes or string): Contents of the file, parsed instead of reading `file_name`.
+        lean (bool): Drop the AST nodes of the file once it is visited, see
+            :func:`codegrapher.parser.FileObject.release`.
+    Returns:
+        (:class:`codegrapher.parser.FileObject`): Visited file object.
+    """
+    if cache is None:
+        file_object = FileObject(file_name, source=source)
+        file_object.visit()
+    else:
+        if source is None:
+            with open(file_name, 'rb') as input_file:
+                source = input_file.read()
+        elif isinstance(source, str):
+            source = source.encode('utf-8')
+        file_object = cache.load(file_name, source)
+    if remove_builtins:
+        file_object.remove_builtins()
+    if isinstance(ignore, IgnoreMatcher):
+        file_object.ignore = ignore
+        file_object.ignore_functions()
+    elif ignore:
+        file_object.add_ignore_file()
+        file_object.ignore_functions()
+    if lean:
+        file_object.release()
+    return file_object
+
+
+def _parse_item(item, remove_builtins=False, ignore=False, cache=None, skip_errors=False, lean=False):
+    if isinstance(item, tuple):
+        file_name, source = item
+    else:
+        file_name, source = item, None
+    try:
+        return parse_file(file_name, remove_builtins=remove_builtins, ignore=ignore, cache=cache, source=source,
+                          lean=lean)
+    except (SyntaxError, ValueError, OSError):
+        if not skip_errors:
+            raise
+        return None
+
+
+def _parse_summaries(items, **options):
+    """Worker side of :func:`parse_files`: only the compact summaries of files are sent back to the parent process."""
+    file_objects = (_parse_item(item, **options) for item in items)
+    return [file_object.summary() if file_object is not None else None for file_object in file_objects]
+
+
+def _chunks(items, size):
+    items = iter(items)
+    chunk = list(itertools.islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(items, size))
+
+
+def parse_files(file_names, jobs=1, remove_builtins=False, ignore=False, cache=None, chunksize=8, skip_errors=False,
+                symbols=None, lean=False):
+    """Parses a batch of files, optionally spreading the work over a pool of processes.
+
+    Files are given as paths, or as `(name, source)` pairs to parse contents that are not on disk, as in files read
+    from a git object store or an archive. Both can be mixed. Files are yielded in the same order as `file_names`,
+    whatever the number of jobs, so that graphs built from the results are identical to those of a serial run.
+
+    `file_names` is consumed lazily and results are yielded as soon as they are ready, with at most a few chunks of
+    files per worker in flight, so parsing itself only holds a bounded number of files at once. Memory use then
+    depends on what the consumer keeps: a consumer handling each file and dropping it, as an exporter, runs in
+    bounded memory, while one keeping every file grows with them. Files parsed in the current process without `lean`
+    keep their AST, which is as large as the code, so keep those one at a time or use `lean`. The ignore file is
+    loaded once for the whole batch.
+
+    Args:
+        file_names (iterable): Paths of the files to parse, or `(name, source)` pairs with `source` as bytes or string.
+        jobs (int): Number of worker processes. `1` parses in the current process, `0` or `None` uses one process per
+            CPU.
+        remove_builtins (bool): Remove builtin functions from the call trees.
+        ignore (bool or :class:`codegrapher.ignore.IgnoreMatcher`): Remove functions listed in a `.cg_ignore` file, or
+            matched by the given matcher, from the call trees.
+        cache (:class:`codegrapher.cache.ParseCache`): Cache used to skip parsing files whose contents were seen before.
+        chunksize (int): Number of files handed to a worker at a time.
+        skip_errors (bool): Skip files that cannot be read or parsed instead of raising.
+        symbols (:class:`codegrapher.symbols.SymbolIndex`): Index each file is registered in as it is yielded.
+        lean (bool): Drop the AST nodes of each file once it is visited, so that memory use grows with the call data
+            kept rather than with the size of the code. Objects parsed by worker processes never carry AST nodes.
+    Yields:
+        (:class:`codegrapher.parser.FileObject`): Visited file objects. Objects parsed by worker processes are rebuilt
+            with :func:`codegrapher.parser.FileObject.from_summary` and carry no AST nodes.
+    """
+    if ignore is True:
+        ignore = load_ignore_file()
+    options = dict(remove_builtins=remove_builtins, ignore=ignore, cache=cache, skip_errors=skip_errors, lean=lean)
+    if not jobs:
+        jobs = os.cpu_count() or 1
+    if jobs == 1:
+        file_objects = (_parse_item(item, **options) for item in file_names)
+    else:
+        file_objects = _parse_in_pool(file_names, jobs, chunksize, options)
+    for file_object in file_objects:
+        if file_object is None:
+            continue
+        if symbols is not None:
+            symbols.add_file(file_object)
+        yield file_object
+
+
+def _parse_in_pool(file_names, jobs, chunksize, options):
+    worker = functools.partial(_parse_summaries, **options)
+    pending = collections.deque()
+    with multiprocessing.Pool(jobs) as pool:
+        for chunk in _chunks(file_names, chunksize):
+            pending.append(pool.apply_async(worker, (chunk,)))
+            # keep every worker busy, with a bounded number of files waiting
+            if len(pending) > 2 * jobs:
+                for summary in pending.popleft().get():
+                    yield FileObject.from_summary(summary) if summary is not None else None
+        while pending:
+            for summary in pending.popleft().get():
+                yield FileObject.from_summary(summary) if summary is not None else None
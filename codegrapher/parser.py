@@ -1,8 +1,54 @@
 import ast
-import copy
 import os
+from collections import ChainMap
 from pprint import pformat
 
+from codegrapher import profiling
+from codegrapher.ignore import IgnoreMatcher, load_ignore_file
+
+
+# caller recorded for calls made at the top level of a module, as in tracebacks
+MODULE_CALLER = '<module>'
+
+
+def new_scope(symbols=None):
+    """Layers a new, empty scope on top of a symbol table without copying it.
+
+    Names added to the new scope shadow those of the enclosing scopes and are never written back to them, so inner
+    scopes such as functions can import names without affecting the module level.
+
+    Args:
+        symbols (dict): Symbol table of the enclosing scope, either a plain dict or a scope returned by this function.
+    Returns:
+        (:class:`collections.ChainMap`): Symbol table for the new scope.
+    """
+    if symbols is None:
+        return ChainMap()
+    if isinstance(symbols, ChainMap):
+        return symbols.new_child()
+    return ChainMap({}, symbols)
+
+
+def _local_definitions(statements):
+    """Lists the names of the functions and classes defined in a block, including within its compound statements,
+    but not within the bodies of the definitions themselves.
+
+    Args:
+        statements (list): :class:`ast.stmt` nodes of the block.
+    Returns:
+        (list): Names defined.
+    """
+    blocks = (ast.stmt, ast.excepthandler) + ((ast.match_case,) if hasattr(ast, 'match_case') else ())
+    names = []
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+            continue
+        stack.extend(reversed([child for child in ast.iter_child_nodes(node) if isinstance(child, blocks)]))
+    return names
+
 
 class FileObject:
     """Class for keeping track of files.
@@ -12,61 +58,162 @@ class FileObject:
         aliases (dict): dict of current modules with `alias: original_name`, `key:value pairs`.
         node (:mod:`ast.AST`): AST node for entire file.
         name (string): File name.
-        classes (list): :class:`ClassObject` items defined in the current file.
+        classes (list): :class:`ClassObject` items defined in the current file, including nested classes, which are
+            named after their enclosing scopes as in `Outer.Inner`.
+        functions (list): :class:`FunctionObject` items defined at the top level of the current file.
+        call_tree (dict): dict with `key:value` pairs `(namespace, function name): [(module, identifier), ...]` for
+            the functions defined outside of classes, nested functions being named as in `outer.inner`. Calls made at
+            the top level of the file are recorded under :data:`MODULE_CALLER`.
+        nested_lines (dict): Line numbers of the functions nested in other functions, which are not listed in
+            `functions`, by their caller key without the namespace, as in `('outer.inner',)` or
+            `('Class', 'method.inner')`.
         relative_namespace (string): The namespace for the current file,
             taken from the relative path of the current file
-        ignore (set): Functions to be ignored, as defined in a `.cg_ignore` text file.
+        ignore (set or :class:`codegrapher.ignore.IgnoreMatcher`): Functions to be ignored, as defined in a `.cg_ignore`
+            text file.
+
+    If `source` is given, it is parsed instead of the contents of `file_name`, which is then only used for naming.
     """
-    def __init__(self, file_name, modules=None, aliases=None):
-        self.modules = copy.deepcopy(modules) if modules else {}
-        self.aliases = copy.deepcopy(aliases) if aliases else {}
+    def __init__(self, file_name, modules=None, aliases=None, source=None):
+        self.modules = modules if modules is not None else {}
+        self.aliases = aliases if aliases is not None else {}
         self.name = file_name
         self.full_path = os.path.abspath(file_name)
-        with open(self.full_path, 'r') as input_file:
-            self.node = ast.parse(input_file.read(), filename=self.name)
+        if source is None:
+            with profiling.stage('read', file_name), open(self.full_path, 'r') as input_file:
+                source = input_file.read()
+        with profiling.stage('parse', file_name):
+            self.node = ast.parse(source, filename=self.name)
         self.classes = []
+        self.functions = []
+        self.call_tree = {}
+        self.nested_lines = {}
         self.relative_namespace = os.path.splitext(self.name)[0].replace(os.path.sep, '.')
         self.ignore = set()
 
     def visit(self):
         """Visits all the nodes within the current file AST node.
 
-        Updates `self.classes` for the current instance.
+        Updates `self.classes`, `self.functions` and `self.call_tree` for the current instance.
         """
-        file_visitor = FileVisitor(aliases=self.aliases, modules=self.modules)
-        file_visitor.visit(self.node)
-        self.modules = file_visitor.modules
-        self.aliases = file_visitor.aliases
-        self.classes = file_visitor.classes
-        self.namespace()
+        with profiling.stage('visit', self.name):
+            file_visitor = FileVisitor(aliases=self.aliases, modules=self.modules)
+            file_visitor.visit(self.node)
+            self.modules = file_visitor.modules
+            self.aliases = file_visitor.aliases
+            self.classes = file_visitor.classes
+            self.functions = file_visitor.functions
+            self.call_tree = file_visitor.call_tree
+            self.nested_lines = file_visitor.nested_lines
+            self.namespace()
+
+    def release(self):
+        """Drops the AST nodes and import tables of the file, its classes and its functions once they are visited,
+        keeping only the extracted call data: names, call trees, decorators, classmethod flags and line numbers.
+
+        An AST holds the whole source of its file, so releasing each file as soon as it is visited keeps memory
+        proportional to the size of the call graph rather than to the size of the code. Released objects are the same
+        as those rebuilt by :func:`FileObject.from_summary`.
+        """
+        self.node = None
+        self.modules = {}
+        self.aliases = {}
+        for definition in self.functions + self.classes:
+            definition.release()
+        for class_object in self.classes:
+            for function_object in class_object.functions:
+                function_object.release()
 
     def remove_builtins(self):
-        """Removes builtins from each class in a `FileObject` instance."""
-        for class_object in self.classes:
-            class_object.remove_builtins()
+        """Removes builtins from each class and from the module level call tree of a `FileObject` instance."""
+        with profiling.stage('filter', self.name):
+            self.call_tree = {caller: [call for call in call_list if not ClassObject.is_builtin(call[0])]
+                              for caller, call_list in self.call_tree.items()}
+            for class_object in self.classes:
+                class_object.remove_builtins()
 
     def add_ignore_file(self):
         """Use a file `.cg_ignore` to ignore a list of functions from the call graph
+
+        The file is loaded once and shared by every file object, see :func:`codegrapher.ignore.load_ignore_file`.
         """
-        if os.path.isfile('.cg_ignore'):
-            with open('.cg_ignore', 'r') as ignore_file:
-                for line in ignore_file:
-                    if line.strip() and line.strip()[0] != '#':
-                        self.ignore.add(line.strip())
+        matcher = load_ignore_file()
+        if self.ignore and not isinstance(self.ignore, IgnoreMatcher):
+            matcher = IgnoreMatcher(sorted(self.ignore) + list(matcher.patterns))
+        self.ignore = matcher
 
     def ignore_functions(self):
         """Ignore all functions in the current class which are present in the instance's `ignore` attribute.
         """
-        for class_object in self.classes:
-            class_object.ignore_functions(self.ignore)
+        with profiling.stage('filter', self.name):
+            if not isinstance(self.ignore, IgnoreMatcher):
+                self.ignore = IgnoreMatcher(self.ignore)
+            matches = self.ignore.matches
+            self.call_tree = {caller: [call for call in call_list if not matches(call)]
+                              for caller, call_list in self.call_tree.items()}
+            for class_object in self.classes:
+                class_object.ignore_functions(self.ignore)
 
     def namespace(self):
         """Programmatically change the name of items in the call tree so they have relative path information
         """
 
+        self.call_tree = dict(((self.relative_namespace,) + caller, call_list)
+                              for caller, call_list in self.call_tree.items())
         for class_object in self.classes:
             class_object.namespace(self.relative_namespace)
 
+    def summary(self):
+        """Compact description of the call data extracted from the current file.
+
+        The summary holds no AST nodes, only plain containers, so it is cheap to pickle and send between processes.
+
+        Returns:
+            (dict): Summary to be passed to :func:`FileObject.from_summary`.
+        """
+        return {
+            'name': self.name,
+            'relative_namespace': self.relative_namespace,
+            'classes': [class_object.summary() for class_object in self.classes],
+            'call_tree': self.call_tree,
+            'functions': [function_object.summary() for function_object in self.functions],
+            'nested_lines': self.nested_lines,
+        }
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Rebuilds a visited `FileObject` from the output of :func:`FileObject.summary` without reading or parsing
+        the file again. The rebuilt object has no AST nodes attached.
+
+        Args:
+            summary (dict): Summary produced by :func:`FileObject.summary`.
+        Returns:
+            (:class:`FileObject`)
+        """
+        file_object = cls.__new__(cls)
+        file_object.modules = {}
+        file_object.aliases = {}
+        file_object.name = summary['name']
+        file_object.full_path = os.path.abspath(file_object.name)
+        file_object.node = None
+        file_object.classes = [ClassObject.from_summary(class_summary) for class_summary in summary['classes']]
+        file_object.call_tree = summary['call_tree']
+        file_object.functions = _functions_from_summary(summary['functions'], file_object.call_tree)
+        file_object.nested_lines = summary['nested_lines']
+        file_object.relative_namespace = summary['relative_namespace']
+        file_object.ignore = set()
+        return file_object
+
+
+def _functions_from_summary(function_summaries, call_tree):
+    functions = [FunctionObject.from_summary(function_summary) for function_summary in function_summaries]
+    # function calls are not stored separately, recover them from the (possibly filtered) call tree
+    by_name = dict((function_object.name, function_object) for function_object in functions)
+    for caller, call_list in call_tree.items():
+        if caller[-1] in by_name:
+            by_name[caller[-1]].calls = call_list
+    return functions
+
 
 class ClassObject:
     """Class for keeping track of classes in code.
@@ -75,28 +222,42 @@ class ClassObject:
         modules (dict): dict of current modules with `alias: module_name`, `key:value pairs`.
         aliases (dict): dict of current modules with `alias: original_name`, `key:value pairs`.
         node (:mod:`ast.AST`): AST node for entire class.
-        name (string): Class name.
+        name (string): Class name, prefixed with the names of its enclosing classes and functions if it is nested.
+        lineno (int): Line number of the class definition.
         functions (list): :class:`FunctionObject` items defined in the current class.
-        call_tree (dict): dict with `key:value` pairs `(module, FunctionObject.name): (module, identifier)`.
+        call_tree (dict): dict with `key:value` pairs `(module, FunctionObject.name): (module, identifier)`. Functions
+            nested in methods are named as in `method.inner`, and calls made in the class body are recorded under
+            `(module,)`.
+        classes (list): :class:`ClassObject` items nested in the class, found by :func:`ClassObject.visit`. Classes
+            visited along with their file are listed in :attr:`FileObject.classes` instead.
 
     """
     def __init__(self, node=None, aliases=None, modules=None):
-        self.modules = copy.deepcopy(modules) if modules else {}
-        self.aliases = copy.deepcopy(aliases) if aliases else {}
+        self.modules = modules if modules is not None else {}
+        self.aliases = aliases if aliases is not None else {}
         self.node = node
         self.name = node.name if node else ''
+        self.lineno = node.lineno if node else None
         self.functions = []
         self.call_tree = {}
+        self.classes = []
 
     def visit(self):
         """Visits all the nodes within the current class AST node.
 
-        Updates `self.functions` and `self.call_tree` for the current instance.
+        Updates `self.functions`, `self.call_tree` and `self.classes` for the current instance.
         """
-        function_visitor = FunctionVisitor(aliases=self.aliases, modules=self.modules)
-        function_visitor.visit(self.node)
-        self.functions = function_visitor.functions
-        self.call_tree = dict(((self.name, k), v) for k, v in function_visitor.calls.items())
+        self.functions = []
+        self.call_tree = {}
+        class_visitor = FileVisitor(aliases=self.aliases, modules=self.modules)
+        class_visitor.visit_class(self)
+        self.classes = class_visitor.classes
+
+    def release(self):
+        """Drops the AST node and import tables of the class, see :func:`FileObject.release`."""
+        self.node = None
+        self.modules = {}
+        self.aliases = {}
 
     def remove_builtins(self):
         """For many classes, we may not want to include builtin functions in the graph.
@@ -109,17 +270,15 @@ class ClassObject:
         """Ignores all functions matching those specified in a pre-defined ignore set.
 
          Args:
-            ignore_set (set): Functions whose calls should be removed (ignored) in the class call tree.
+            ignore_set (set or :class:`codegrapher.ignore.IgnoreMatcher`): Functions whose calls should be removed
+                (ignored) in the class call tree. A set holds patterns as described in
+                :class:`codegrapher.ignore.IgnoreMatcher`.
         """
-        new_call_tree = {}
-        for caller, call_list in self.call_tree.items():
-            new_call_list = []
-            for call in call_list:
-                if call[-1] not in ignore_set:
-                    new_call_list.append(call)
-            new_call_tree[caller] = new_call_list
-
-        self.call_tree = new_call_tree
+        if not isinstance(ignore_set, IgnoreMatcher):
+            ignore_set = IgnoreMatcher(ignore_set)
+        matches = ignore_set.matches
+        self.call_tree = {caller: [call for call in call_list if not matches(call)]
+                          for caller, call_list in self.call_tree.items()}
 
     def namespace(self, relative_namespace):
         """Take the relative namespace for the class and prepend it to each item defined in the current class.
@@ -129,9 +288,38 @@ class ClassObject:
         """
         new_call_tree = {}
         for caller in self.call_tree:
-            new_call_tree[(relative_namespace, caller[0], caller[1])] = self.call_tree[caller]
+            new_call_tree[(relative_namespace,) + caller] = self.call_tree[caller]
         self.call_tree = new_call_tree
 
+    def summary(self):
+        """Compact description of the current class, see :func:`FileObject.summary`.
+
+        Returns:
+            (dict)
+        """
+        return {
+            'name': self.name,
+            'lineno': self.lineno,
+            'call_tree': self.call_tree,
+            'functions': [function_object.summary() for function_object in self.functions],
+        }
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Rebuilds a `ClassObject` from the output of :func:`ClassObject.summary`.
+
+        Args:
+            summary (dict): Summary produced by :func:`ClassObject.summary`.
+        Returns:
+            (:class:`ClassObject`)
+        """
+        class_object = cls()
+        class_object.name = summary['name']
+        class_object.lineno = summary['lineno']
+        class_object.call_tree = summary['call_tree']
+        class_object.functions = _functions_from_summary(summary['functions'], class_object.call_tree)
+        return class_object
+
     def pprint(self):
         """Pretty print formatter for class object.
 
@@ -163,6 +351,7 @@ class FunctionObject:
         aliases: dict of current modules with `alias: original_name`, `key:value pairs`.
         node (:mod:`ast.AST`): AST node for entire function.
         name (string): function name.
+        lineno (int): line number of the function definition.
         calls (list): `(module, identifier)` tuples describing items called within current node,
                       with identifiers decoded form current alias, and modules expanded to their full import paths.
         decorator_list (list): list of decorators, by name as a string, applied to the current function definition.
@@ -170,14 +359,50 @@ class FunctionObject:
 
     """
     def __init__(self, node=None, aliases=None, modules=None):
-        self.modules = copy.deepcopy(modules) if modules else {}
-        self.aliases = copy.deepcopy(aliases) if aliases else {}
+        self.modules = modules if modules is not None else {}
+        self.aliases = aliases if aliases is not None else {}
         self.node = node
         self.name = node.name if node else ''
+        self.lineno = node.lineno if node else None
         self.calls = []
         self.decorator_list = []
         self.is_classmethod = False
 
+    def summary(self):
+        """Compact description of the current function, see :func:`FileObject.summary`.
+
+        Returns:
+            (dict)
+        """
+        return {
+            'name': self.name,
+            'lineno': self.lineno,
+            'decorator_list': self.decorator_list,
+            'is_classmethod': self.is_classmethod,
+        }
+
+    def release(self):
+        """Drops the AST node and import tables of the function, see :func:`FileObject.release`."""
+        self.node = None
+        self.modules = {}
+        self.aliases = {}
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Rebuilds a `FunctionObject` from the output of :func:`FunctionObject.summary`.
+
+        Args:
+            summary (dict): Summary produced by :func:`FunctionObject.summary`.
+        Returns:
+            (:class:`FunctionObject`)
+        """
+        function_object = cls()
+        function_object.name = summary['name']
+        function_object.lineno = summary['lineno']
+        function_object.decorator_list = summary['decorator_list']
+        function_object.is_classmethod = summary['is_classmethod']
+        return function_object
+
     @classmethod
     def _extract_decorators(cls, node):
         """Pulls out strings for each item in a decorator list on a FunctionDef node
@@ -192,23 +417,26 @@ class FunctionObject:
             if isinstance(decorator, ast.Name):
                 decorator_list.append(decorator.id)
             elif isinstance(decorator, ast.Attribute):
-                # this catches things like attr.setter
-                decorator_list.append('.'.join([decorator.attr, decorator.value.id]))
+                # this catches things like attr.setter and pytest.mark.slow, named in source order
+                parts = []
+                while isinstance(decorator, ast.Attribute):
+                    parts.append(decorator.attr)
+                    decorator = decorator.value
+                if isinstance(decorator, ast.Name):
+                    parts.append(decorator.id)
+                    decorator_list.append('.'.join(reversed(parts)))
         return decorator_list
 
     def visit(self):
         """Visits all the nodes within the current function object's AST node.
 
-        Updates `self.calls`, `self.modules`, and `self.aliases` for the current instance.
+        Updates `self.calls`, `self.modules`, and `self.aliases` for the current instance. Calls made in nested
+        functions and classes are not included.
         """
-        visitor = CallVisitor(aliases=self.aliases, modules=self.modules)
-        visitor.visit(self.node)
         self.decorator_list = FunctionObject._extract_decorators(self.node)
         if 'classmethod' in self.decorator_list:
             self.is_classmethod = True
-        self.calls = visitor.calls
-        self.modules.update(visitor.modules)
-        self.aliases.update(visitor.aliases)
+        FileVisitor(aliases=self.aliases, modules=self.modules).visit_function(self)
 
 
 class CallInspector(ast.NodeVisitor):
@@ -218,7 +446,8 @@ class CallInspector(ast.NodeVisitor):
     ``object.attr(args)``
 
     Attributes:
-        module (string): Current module name on which the current call is made.
+        module (string): Current module name on which the current call is made, in dotted form for chained
+            attributes.
         identifier (string): Name of the function called.
     """
     def __init__(self):
@@ -230,23 +459,31 @@ class CallInspector(ast.NodeVisitor):
 
     def visit_Attribute(self, node):
         # todo: pull out item for the attr to determine whether node defines a classmethod
-        # currently does not handle multiple chaining of attr items
-        if hasattr(node.value, 'id'):
-            self.module = node.value.id
+        # for chained attributes, as in ``package.module.function(args)``, module is the dotted path of the object
+        parts = []
+        value = node.value
+        while isinstance(value, ast.Attribute):
+            parts.append(value.attr)
+            value = value.value
+        if isinstance(value, ast.Name):
+            parts.append(value.id)
+            self.module = '.'.join(reversed(parts))
         self.identifier = node.attr
 
 
 class ImportVisitor(ast.NodeVisitor):
     """For import related calls, store the source modules and aliases used.
-    Designed to be inherited by other classes that need to know about imports in their current scope.
+    Designed to be inherited by other classes that need to know about imports in their current scope. Each visitor
+    works in its own scope, layered on top of the tables it is given with :func:`new_scope`, so imports found by the
+    visitor shadow but never modify those of enclosing scopes.
 
     Attributes:
-        modules (dict): dict of current modules with `alias: module_name`, `key:value pairs`.
-        aliases (dict): dict of current modules with `alias: original_name`, `key:value pairs`.
+        modules (:class:`collections.ChainMap`): current modules with `alias: module_name`, `key:value pairs`.
+        aliases (:class:`collections.ChainMap`): current modules with `alias: original_name`, `key:value pairs`.
     """
     def __init__(self, aliases=None, modules=None):
-        self.modules = copy.deepcopy(modules) if modules else {}
-        self.aliases = copy.deepcopy(aliases) if aliases else {}
+        self.modules = new_scope(modules)
+        self.aliases = new_scope(aliases)
 
     def continue_parsing(self, node):
         super(ImportVisitor, self).generic_visit(node)
@@ -258,7 +495,9 @@ class ImportVisitor(ast.NodeVisitor):
             self.modules[asname] = None
 
     def visit_ImportFrom(self, node):
-        module = node.module
+        # relative imports keep one leading dot per level, as in `..utils`, and are resolved against the namespace of
+        # the file when graphing, see :func:`codegrapher.symbols.absolute_module`
+        module = '.' * (node.level or 0) + (node.module or '')
         for item in node.names:
             asname = item.asname if item.asname else item.name
             self.aliases[asname] = item.name
@@ -272,28 +511,72 @@ class CallVisitor(ImportVisitor):
         call_names (set): set of :class:`CallInspector.identifier` items within current AST node.
         calls (list): `(module, identifier)` items called within current AST node,
                       with identifiers decoded form current alias, and modules expanded to their full import paths.
+        definitions (:class:`collections.ChainMap`): Functions and classes defined in the enclosing function scopes,
+            as `name: qualified name` pairs. Calls to them are recorded under their qualified name, as in
+            `('outer.inner',)`, which is also the name they are recorded under as callers.
     """
     def __init__(self, **kwargs):
         super(CallVisitor, self).__init__(**kwargs)
         self.call_names = set()
         self.calls = []
+        self.definitions = ChainMap()
 
     def continue_parsing(self, node):
         super(CallVisitor, self).generic_visit(node)
 
     def visit_Call(self, node):
+        # Chained calls such as ``a(x).b(y).c(z)`` nest each call in the `func` of the next one. Unwind the chain
+        # iteratively so long builder-style chains do not recurse, then visit the arguments of every call in the chain
+        # and record the calls innermost first. Every `ast.Call` node is visited exactly once.
+        chain = [node]
+        func = node.func
+        while isinstance(func, (ast.Attribute, ast.Call)):
+            if isinstance(func, ast.Call):
+                chain.append(func)
+                func = func.func
+            else:
+                func = func.value
+        self.visit(func)
+
+        for call_node in reversed(chain):
+            # handles calls within function calls, including starred and keyword arguments
+            for arg in call_node.args:
+                self.visit(arg)
+            for keyword in call_node.keywords:
+                self.visit(keyword.value)
+            self.add_call(call_node)
+
+    def resolve_module(self, name):
+        """Expands a dotted name, as in ``module.submodule``, to its full import path using the current imports.
+
+        Args:
+            name (string): Dotted name on which a call is made.
+        Returns:
+            (string): Full import path of the name, or `None` if it does not start with an imported name.
+        """
+        parts = name.split('.')
+        for index in range(len(parts), 0, -1):
+            prefix = '.'.join(parts[:index])
+            if prefix in self.modules:
+                if self.modules[prefix] and self.modules[prefix].endswith('.'):
+                    # imported from a relative package, as in ``from .. import module``
+                    module = self.modules[prefix] + self.aliases[prefix]
+                elif self.modules[prefix]:
+                    module = '.'.join([self.modules[prefix], self.aliases[prefix]])
+                else:
+                    module = self.aliases[prefix]
+                return '.'.join([module] + parts[index:])
+        return None
+
+    def add_call(self, node):
+        """Records a single call.
+
+        Args:
+            node (:class:`ast.Call`): Call to be recorded.
+        """
         call_visitor = CallInspector()
         call_visitor.visit(node.func)
 
-        # handles calls within function calls
-        for arg in node.args:
-            self.continue_parsing(arg)
-            if isinstance(arg, ast.Call):
-                arg_visitor = CallVisitor(aliases=self.aliases, modules=self.modules)
-                arg_visitor.visit(arg)
-                self.call_names.update(arg_visitor.call_names)
-                self.calls.extend(arg_visitor.calls)
-
         self.call_names.add(call_visitor.identifier)
 
         # if names are aliased, pull out aliased name
@@ -302,76 +585,143 @@ class CallVisitor(ImportVisitor):
         else:
             identifier = call_visitor.identifier
 
-        if call_visitor.module in self.modules:
-            # module is imported and called by attr
-            if self.modules[call_visitor.module]:
-                module = '.'.join([self.modules[call_visitor.module], self.aliases[call_visitor.module]])
-            else:
-                module = self.aliases[call_visitor.module]
-        elif call_visitor.identifier in self.modules:
+        # module is imported and called by attr, possibly through submodules
+        module = self.resolve_module(call_visitor.module) if call_visitor.module else None
+        if not module and call_visitor.identifier in self.modules:
             # module is imported, but not called by attr
             module = self.modules[call_visitor.identifier]
-        else:
-            # no module specified
-            module = None
 
         if module:
             call = (module, identifier)
+        elif not call_visitor.module and call_visitor.identifier in self.definitions:
+            # a function or class nested in an enclosing function shadows the names of the module
+            call = (self.definitions[call_visitor.identifier],)
         else:
             call = (identifier,)
 
         self.calls.append(call)
 
 
-class FunctionVisitor(ImportVisitor):
-    """Function definitions are where the function is defined, and the call is where the ast for that function exists.
-
-    This only looks for items that are called within the scope of a function, and associates those items
-    with the function.
-
-    Attributes:
-        defined_functions (set): names of functions found by function visitor instance.
-        functions (list): :class:`FunctionObject` instances found by function visitor instance.
-        calls (dict): mapping from function names defined to calls within that function definition.
-    """
-    def __init__(self, **kwargs):
-        super(FunctionVisitor, self).__init__(**kwargs)
-        self.defined_functions = set()
-        self.functions = []
-        self.calls = {}
-
-    def continue_parsing(self, node):
-        super(FunctionVisitor, self).generic_visit(node)
-
-    def visit_FunctionDef(self, node):
-        self.defined_functions.add(node.name)
-        function_def = FunctionObject(node=node, aliases=self.aliases, modules=self.modules)
-        function_def.visit()
-        self.calls[function_def.name] = function_def.calls
-        self.functions.append(function_def)
-
-
-class FileVisitor(ImportVisitor):
+class FileVisitor(CallVisitor):
     """First visitor that should be called on the file level.
 
+    Records the calls made in every scope of the file in a single traversal of its AST. Functions and classes are
+    visited as they are found, with the calls, imports and aliases of the visitor swapped for those of the new scope,
+    and swapped back once the definition has been visited. Decorators, default values, annotations and base classes
+    are evaluated in the enclosing scope, so their calls are recorded there.
+
     Attributes:
-        classes (list): list of :class:`ClassObject` instances defined in the current file.
+        classes (list): list of :class:`ClassObject` instances defined in the current file, nested ones included.
+        functions (list): :class:`FunctionObject` instances defined at the top level of the current file.
+        call_tree (dict): dict with `key:value` pairs `(function name,): calls` for the functions defined outside of
+            classes, and for calls made at the top level of the module, under :data:`MODULE_CALLER`.
+        nested_lines (dict): Line numbers of the functions nested in other functions, see
+            :attr:`FileObject.nested_lines`.
+        calls (list): calls made in the scope being visited, at the top level of the module once visiting is done.
     """
     def __init__(self, **kwargs):
         super(FileVisitor, self).__init__(**kwargs)
         self.classes = []
+        self.functions = []
+        self.call_tree = {}
+        self.nested_lines = {}
+        # class whose body is being visited, if any, and qualified name prefix of the enclosing functions within it
+        self._owner = None
+        self._prefix = ''
 
     def continue_parsing(self, node):
         super(FileVisitor, self).generic_visit(node)
 
     def visit_Module(self, node):
         self.continue_parsing(node)
+        if self.calls:
+            self.call_tree[(MODULE_CALLER,)] = self.calls
 
     def visit_ClassDef(self, node):
-        # once a class is found, create a class object for it and traverse the ast with its visitor
+        for expression in node.decorator_list + node.bases + [keyword.value for keyword in node.keywords]:
+            self.visit(expression)
         new_class = ClassObject(node=node, aliases=self.aliases, modules=self.modules)
-        new_class.visit()
+        new_class.name = self._qualified_name(node.name)
         self.classes.append(new_class)
+        self.visit_class(new_class)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self.visit(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        new_function = FunctionObject(node=node, aliases=self.aliases, modules=self.modules)
+        new_function.name = self._prefix + node.name
+        new_function.decorator_list = FunctionObject._extract_decorators(node)
+        new_function.is_classmethod = 'classmethod' in new_function.decorator_list
+        self.visit_function(new_function)
+        # nested functions are recorded as callers, but only top level functions are methods of a class
+        if self._owner is None:
+            caller = (new_function.name,)
+            if not self._prefix:
+                self.functions.append(new_function)
+            self.call_tree[caller] = new_function.calls
+        else:
+            caller = (self._owner.name, new_function.name)
+            if not self._prefix:
+                self._owner.functions.append(new_function)
+            self._owner.call_tree[caller] = new_function.calls
+        if self._prefix:
+            self.nested_lines[caller] = node.lineno
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_class(self, class_object):
+        """Visits the body of a class in a new scope, filling its `functions` and `call_tree`.
+
+        Args:
+            class_object (:class:`ClassObject`): Class to visit.
+        """
+        enclosing = self._enter_scope(class_object, '')
+        for statement in class_object.node.body:
+            self.visit(statement)
+        class_object.modules = self.modules
+        class_object.aliases = self.aliases
+        if self.calls:
+            class_object.call_tree[(class_object.name,)] = self.calls
+        self._exit_scope(enclosing)
+
+    def visit_function(self, function_object):
+        """Visits the body of a function in a new scope, filling its `calls`.
+
+        Args:
+            function_object (:class:`FunctionObject`): Function to visit.
+        """
+        enclosing = self._enter_scope(self._owner, function_object.name + '.')
+        # names defined anywhere in a function are local to all of it, so calls made before a definition refer to it
+        for name in _local_definitions(function_object.node.body):
+            self.definitions[name] = self._qualified_name(name)
+        for statement in function_object.node.body:
+            self.visit(statement)
+        function_object.calls = self.calls
+        function_object.modules = self.modules
+        function_object.aliases = self.aliases
+        self._exit_scope(enclosing)
+
+    def _qualified_name(self, name):
+        # name of a definition in the scope being visited, as recorded in call trees and class names
+        if self._owner is not None:
+            return '.'.join([self._owner.name, self._prefix + name])
+        return self._prefix + name
+
+    def _enter_scope(self, owner, prefix):
+        enclosing = (self._owner, self._prefix, self.calls, self.modules, self.aliases, self.definitions)
+        self._owner = owner
+        self._prefix = prefix
+        self.calls = []
+        self.modules = new_scope(self.modules)
+        self.aliases = new_scope(self.aliases)
+        self.definitions = self.definitions.new_child()
+        return enclosing
+
+    def _exit_scope(self, enclosing):
+        self._owner, self._prefix, self.calls, self.modules, self.aliases, self.definitions = enclosing
 
     def remove_builtins(self):
         """Removes builtins from each class in a `FileVisitor` instance.
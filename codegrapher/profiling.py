@@ -0,0 +1,185 @@
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+_active = None
+_inactive = contextlib.nullcontext()
+
+
+def stage(name, file_name=None):
+    """Context manager timing a stage of the pipeline with the active :class:`Profiler`, if any.
+
+    This is the hook used throughout codegrapher. It does nothing unless a profiler has been activated, so it is cheap
+    enough to leave in hot paths.
+
+    Args:
+        name (string): Stage name, as in `parse` or `visit`.
+        file_name (string): File being processed, if the stage works on a single file.
+    Returns:
+        Context manager.
+    """
+    if _active is None:
+        return _inactive
+    return _active.stage(name, file_name)
+
+
+class Profiler(object):
+    """Records the wall time, number of calls and peak memory of each stage of a run, per stage and per file.
+
+    Use the profiler as a context manager to activate it, which makes :func:`stage` record into it::
+
+        with Profiler() as profiler:
+            file_object = FileObject('path/to/file.py')
+            file_object.visit()
+        print(profiler.report())
+
+    Stages running in worker processes, as with ``--jobs``, are not recorded. Stages may be recorded from several
+    threads at once.
+
+    Attributes:
+        stages (dict): `[calls, seconds, peak bytes]` lists by stage name. Peak bytes are the most memory a call to
+            the stage allocated at once, above the memory in use when it started, whatever it freed before returning.
+        files (dict): Seconds spent on each file, by file name. Stages of a file nested in another stage of the same
+            file, as `visit` within `parse_file`, are only counted once.
+        events (list): `(stage, file name, start, duration, thread id)` tuples, with times in seconds since the
+            profiler was created.
+        memory (bool): Whether peak bytes are measured, with :mod:`tracemalloc`. This slows the run down, and as
+            memory is traced for the whole process, stages running on several threads at once share their peaks.
+        profile (:class:`cProfile.Profile`): Function level profile of the run, if requested.
+    """
+    def __init__(self, memory=False, cprofile=False):
+        self.stages = {}
+        self.files = {}
+        self.events = []
+        self.memory = memory
+        self.profile = cProfile.Profile() if cprofile else None
+        self._origin = time.perf_counter()
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def stage(self, name, file_name=None):
+        """Context manager recording a stage, see :func:`codegrapher.profiling.stage`."""
+        # files with a stage running on this thread, whose time is counted by the outermost of their stages
+        open_files = self._local.__dict__.setdefault('files', set())
+        outermost = file_name is not None and file_name not in open_files
+        if outermost:
+            open_files.add(file_name)
+        if self.memory:
+            peaks = self._local.__dict__.setdefault('peaks', [])
+            current, peak = tracemalloc.get_traced_memory()
+            if peaks:
+                # the peak is reset for this stage, so the enclosing stage keeps the peak reached so far
+                peaks[-1][1] = max(peaks[-1][1], peak)
+            tracemalloc.reset_peak()
+            peaks.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = 0
+            if self.memory:
+                before, peak = peaks.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                allocated = peak - before
+                if peaks:
+                    peaks[-1][1] = max(peaks[-1][1], peak)
+            if outermost:
+                open_files.discard(file_name)
+            with self._lock:
+                record = self.stages.get(name)
+                if record is None:
+                    record = self.stages[name] = [0, 0.0, 0]
+                record[0] += 1
+                record[1] += seconds
+                record[2] = max(record[2], allocated)
+                if outermost:
+                    self.files[file_name] = self.files.get(file_name, 0.0) + seconds
+                self.events.append((name, file_name, start - self._origin, seconds, threading.get_ident()))
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError('another profiler is already active')
+        _active = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        if self.profile is not None:
+            self.profile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        _active = None
+
+    def slowest_files(self, count=10):
+        """Lists the files on which the most time was spent.
+
+        Args:
+            count (int): Number of files to list.
+        Returns:
+            (list): `(file name, seconds)` pairs, slowest first.
+        """
+        return sorted(self.files.items(), key=lambda item: (-item[1], item[0]))[:count]
+
+    def report(self, count=10):
+        """Formats the recorded stages and the slowest files as a text table.
+
+        Args:
+            count (int): Number of slow files to list.
+        Returns:
+            (string)
+        """
+        lines = ['{:<16} {:>10} {:>12} {:>14}'.format('stage', 'calls', 'seconds', 'peak bytes')]
+        for name, (calls, seconds, peak) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append('{:<16} {:>10} {:>12.4f} {:>14}'.format(name, calls, seconds, peak if self.memory else '-'))
+        slowest = self.slowest_files(count)
+        if slowest:
+            lines.append('')
+            lines.append('slowest files:')
+            for file_name, seconds in slowest:
+                lines.append('{:>10.4f}  {}'.format(seconds, file_name))
+        return '\n'.join(lines)
+
+    def dump_stats(self, path):
+        """Writes the function level profile in the :mod:`pstats` format.
+
+        Args:
+            path (string): Output file name.
+        Raises:
+            ValueError: If the profiler was not created with `cprofile`.
+        """
+        if self.profile is None:
+            raise ValueError('the profiler was created without cprofile')
+        self.profile.dump_stats(path)
+
+    def write_chrome_trace(self, path):
+        """Writes the recorded stages in the Chrome trace event format, to be opened with `chrome://tracing` or
+        `Perfetto <https://ui.perfetto.dev>`_.
+
+        Args:
+            path (string): Output file name.
+        """
+        pid = os.getpid()
+        events = []
+        for name, file_name, start, seconds, tid in self.events:
+            event = {'name': name, 'cat': 'codegrapher', 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': start * 1e6, 'dur': seconds * 1e6}
+            if file_name is not None:
+                event['args'] = {'file': file_name}
+            events.append(event)
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
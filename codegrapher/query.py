@@ -0,0 +1,266 @@
+import bisect
+from array import array
+
+from codegrapher import profiling
+from codegrapher.components import cyclic_components
+from codegrapher.graph import EDGE_MASK, EDGE_SHIFT
+
+
+DIRECTIONS = ('callees', 'callers', 'both')
+
+
+def build_csr(edges, node_count):
+    """ Builds compressed sparse row adjacency arrays.
+
+    Arguments:
+        edges (list): Sorted `(tail << 32) | head` packed edges.
+        node_count (int): Number of nodes.
+
+    Returns:
+        (tuple): `(offsets, targets)` arrays, the heads of the edges of node `i` being
+            `targets[offsets[i]:offsets[i + 1]]`.
+    """
+    # edges are sorted by tail, so the edges of a node start where the first edge of a larger tail would be inserted
+    offsets = array('Q', [bisect.bisect_left(edges, node << EDGE_SHIFT) for node in range(node_count + 1)])
+    targets = array('I', [edge & EDGE_MASK for edge in edges])
+    return offsets, targets
+
+
+class GraphQueries(object):
+    """ Queries over a graph whose nodes are numbered, shared by :class:`GraphIndex` and
+    :class:`codegrapher.store.MappedGraph`.
+
+    Subclasses provide `node_count`, :func:`label`, :func:`index`, :func:`callee_ids` and :func:`caller_ids`. Every
+    query is a breadth-first search over the adjacency arrays, so it runs in time proportional to the part of the graph
+    it visits rather than to the size of the graph. Nodes are named by their labels, as in
+    `namespace.class.function_name`, and a :class:`KeyError` is raised for labels not in the graph.
+    """
+    def _neighbors(self, direction):
+        if direction == 'callees':
+            return self.callee_ids
+        if direction == 'callers':
+            return self.caller_ids
+        if direction == 'both':
+            return lambda node: self.callee_ids(node) + self.caller_ids(node)
+        raise ValueError('direction must be one of {}, not {!r}'.format(', '.join(DIRECTIONS), direction))
+
+    def __contains__(self, label):
+        try:
+            self.index(label)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return self.node_count
+
+    def callees(self, label):
+        """ Lists the functions called by a function.
+
+        Arguments:
+            label (string): Label of the calling node.
+
+        Returns:
+            (list): Labels of the called nodes.
+        """
+        return [self.label(node) for node in self.callee_ids(self.index(label))]
+
+    def callers(self, label):
+        """ Lists the functions calling a function.
+
+        Arguments:
+            label (string): Label of the called node.
+
+        Returns:
+            (list): Labels of the calling nodes.
+        """
+        return [self.label(node) for node in self.caller_ids(self.index(label))]
+
+    def _distances(self, start, depth, direction):
+        neighbors = self._neighbors(direction)
+        distances = {start: 0}
+        frontier = [start]
+        distance = 0
+        while frontier and (depth is None or distance < depth):
+            distance += 1
+            next_frontier = []
+            for node in frontier:
+                for neighbor in neighbors(node):
+                    if neighbor not in distances:
+                        distances[neighbor] = distance
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return distances
+
+    def neighborhood(self, label, depth=1, direction='both'):
+        """ Finds the functions at most `depth` calls away from a function.
+
+        Arguments:
+            label (string): Label of the node to start from.
+            depth (int): Largest number of calls to follow, or `None` for no limit.
+            direction (string): `callees` to follow calls, `callers` to follow them backwards, or `both`.
+
+        Returns:
+            (dict): Distance, in calls, of each node found, by label. The starting node is at distance 0.
+        """
+        with profiling.stage('query'):
+            distances = self._distances(self.index(label), depth, direction)
+            return dict((self.label(node), distance) for node, distance in distances.items())
+
+    def reachable(self, label, direction='callees'):
+        """ Finds every function a function transitively calls, or, with `direction` set to `callers`, every function
+        that transitively calls it.
+
+        Arguments:
+            label (string): Label of the node to start from.
+            direction (string): `callees`, `callers` or `both`.
+
+        Returns:
+            (set): Labels of the nodes reached, without the starting node unless it is part of a cycle.
+        """
+        with profiling.stage('query'):
+            start = self.index(label)
+            distances = self._distances(start, None, direction)
+            # cycles are followed in a single direction, as following calls both ways always leads back to the start
+            cycle_direction = 'callers' if direction == 'callers' else 'callees'
+            directed = distances if direction == cycle_direction else self._distances(start, None, cycle_direction)
+            neighbors = self._neighbors(cycle_direction)
+            cyclic = any(start in neighbors(node) for node in directed)
+            del distances[start]
+            reached = set(self.label(node) for node in distances)
+            if cyclic:
+                reached.add(label)
+            return reached
+
+    def shortest_path(self, source, target, direction='callees'):
+        """ Finds a shortest chain of calls from one function to another.
+
+        Arguments:
+            source (string): Label of the node to start from.
+            target (string): Label of the node to reach.
+            direction (string): `callees` to follow calls, `callers` to follow them backwards, or `both`.
+
+        Returns:
+            (list): Labels of the nodes of the path, from `source` to `target`, or `None` if there is no such path.
+        """
+        with profiling.stage('query'):
+            start, end = self.index(source), self.index(target)
+            neighbors = self._neighbors(direction)
+            parents = {start: None}
+            frontier = [start]
+            while frontier and end not in parents:
+                next_frontier = []
+                for node in frontier:
+                    for neighbor in neighbors(node):
+                        if neighbor not in parents:
+                            parents[neighbor] = node
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+            if end not in parents:
+                return None
+            path = []
+            node = end
+            while node is not None:
+                path.append(self.label(node))
+                node = parents[node]
+            return path[::-1]
+
+    def cycles(self):
+        """ Finds the recursive and mutually recursive functions of the graph, see
+        :func:`codegrapher.graph.FunctionGrapher.cycles`.
+
+        Returns:
+            (list): Groups of functions calling each other, as sorted lists of labels, largest groups first.
+        """
+        with profiling.stage('cycles'):
+            cycles = [sorted(self.label(node) for node in component)
+                      for component in cyclic_components(range(self.node_count), self.callee_ids)]
+            return sorted(cycles, key=lambda cycle: (-len(cycle), cycle))
+
+    def iter_edges(self):
+        """ Iterates over the edges of the graph, ordered by tail then head.
+
+        Yields:
+            (tuple): `(tail label, head label)` pairs.
+        """
+        for tail in range(self.node_count):
+            tail_label = None
+            for head in self.callee_ids(tail):
+                if tail_label is None:
+                    tail_label = self.label(tail)
+                yield tail_label, self.label(head)
+
+
+class GraphIndex(GraphQueries):
+    """ Forward and reverse adjacency indexes over a :class:`codegrapher.graph.FunctionGrapher`, for fast queries::
+
+        index = GraphIndex(graph)
+        index.callers('package.module.Class.method')
+        index.shortest_path('package.module.main', 'package.module.Class.method')
+
+    Nodes are numbered in the order of the UTF-8 encoding of their labels, as in a saved graph, and nodes sharing a
+    label, which are drawn as a single node, are merged. The index is a snapshot: it does not follow later changes to
+    the graph, which other threads may keep adding files to while the index is built.
+
+    Attributes:
+        labels (list): Node labels, by node number.
+        node_count (int): Number of nodes.
+        edge_count (int): Number of edges.
+        forward_offsets (:class:`array.array`): Offsets of the callees of each node in `forward_targets`.
+        forward_targets (:class:`array.array`): Callees of the nodes, node after node.
+        reverse_offsets (:class:`array.array`): Offsets of the callers of each node in `reverse_targets`.
+        reverse_targets (:class:`array.array`): Callers of the nodes, node after node.
+    """
+    def __init__(self, graph):
+        with profiling.stage('index'):
+            encoded = dict((node, '.'.join(node).encode('utf-8')) for node in graph.iter_nodes())
+            edges = list(graph.iter_edges())
+            for edge in edges:
+                for node in edge:
+                    if node not in encoded:
+                        encoded[node] = '.'.join(node).encode('utf-8')
+            encoded_labels = sorted(set(encoded.values()))
+            self._numbers = dict((label.decode('utf-8'), number) for number, label in enumerate(encoded_labels))
+            self.labels = [label.decode('utf-8') for label in encoded_labels]
+            self.node_count = len(self.labels)
+
+            numbers = dict((label, number) for number, label in enumerate(encoded_labels))
+            renumbered = dict((node, numbers[label]) for node, label in encoded.items())
+            forward = sorted(set([renumbered[tail] << EDGE_SHIFT | renumbered[head] for tail, head in edges]))
+            reverse = sorted([(edge & EDGE_MASK) << EDGE_SHIFT | edge >> EDGE_SHIFT for edge in forward])
+            self.edge_count = len(forward)
+            self.forward_offsets, self.forward_targets = build_csr(forward, self.node_count)
+            self.reverse_offsets, self.reverse_targets = build_csr(reverse, self.node_count)
+
+    def label(self, node):
+        """ Looks up the label of a node.
+
+        Arguments:
+            node (int): Node number.
+
+        Returns:
+            (string): Label of the node, as in `namespace.class.function_name`.
+        """
+        return self.labels[node]
+
+    def index(self, label):
+        """ Looks up the number of a node from its label.
+
+        Arguments:
+            label (string): Label of the node.
+
+        Returns:
+            (int): Node number.
+
+        Raises:
+            KeyError: If no node has this label.
+        """
+        return self._numbers[label]
+
+    def callee_ids(self, node):
+        """ Lists the nodes called by a node, in increasing order."""
+        return self.forward_targets[self.forward_offsets[node]:self.forward_offsets[node + 1]].tolist()
+
+    def caller_ids(self, node):
+        """ Lists the nodes calling a node, in increasing order."""
+        return self.reverse_targets[self.reverse_offsets[node]:self.reverse_offsets[node + 1]].tolist()
@@ -0,0 +1,188 @@
+import subprocess
+import sys
+
+from codegrapher import profiling
+from codegrapher.dot import DotWriter
+from codegrapher.graph import FunctionGrapher
+from codegrapher.parallel import parse_files
+
+
+ADDED_COLOR = 'darkgreen'
+REMOVED_COLOR = 'red'
+
+
+def git_tree(revision, path='.'):
+    """ Lists the Python files of a revision, without checking it out.
+
+    Arguments:
+        revision (string): Any revision git understands, as in `HEAD~1`, a branch name or a commit hash.
+        path (string): Directory, or file, to list, relative to the current directory, which must be inside a git
+            working tree.
+
+    Returns:
+        (dict): Blob hashes of the Python files, by path relative to the current directory.
+
+    Raises:
+        subprocess.CalledProcessError: If the revision or the repository cannot be read, with git's message as its
+            `stderr`.
+    """
+    output = subprocess.run(['git', 'ls-tree', '-r', '-z', revision, '--', path], check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+    files = {}
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        info, file_name = entry.split(b'\t', 1)
+        mode, object_type, object_hash = info.split()
+        file_name = file_name.decode('utf-8', 'surrogateescape')
+        if object_type == b'blob' and file_name.endswith('.py'):
+            files[file_name] = object_hash.decode('ascii')
+    return files
+
+
+def read_blobs(items):
+    """ Reads file contents straight from the git object database, with a single `git cat-file --batch` process.
+
+    Arguments:
+        items (iterable): `(name, blob hash)` pairs.
+
+    Yields:
+        (tuple): `(name, contents)` pairs, with contents as bytes, in the order of `items`.
+
+    Raises:
+        ValueError: If a blob is missing from the object database.
+    """
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for name, object_hash in items:
+            with profiling.stage('read', name):
+                process.stdin.write(object_hash.encode('ascii') + b'\n')
+                process.stdin.flush()
+                header = process.stdout.readline().split()
+                if len(header) != 3:
+                    raise ValueError('cannot read blob {} of {}'.format(object_hash, name))
+                contents = process.stdout.read(int(header[2]))
+                process.stdout.read(1)
+            yield name, contents
+    finally:
+        process.stdin.close()
+        process.stdout.close()
+        process.wait()
+
+
+def _labels(graph):
+    nodes = set('.'.join(node) for node in graph.iter_nodes())
+    edges = set(('.'.join(tail), '.'.join(head)) for tail, head in graph.iter_edges())
+    for tail, head in edges:
+        nodes.add(tail)
+        nodes.add(head)
+    return nodes, edges
+
+
+class GraphDiff(object):
+    """ Differences between the call graphs of two revisions, by node label.
+
+    Attributes:
+        added_nodes (set): Labels of the nodes only in the new graph.
+        removed_nodes (set): Labels of the nodes only in the old graph.
+        added_edges (set): `(tail label, head label)` pairs of the edges only in the new graph.
+        removed_edges (set): `(tail label, head label)` pairs of the edges only in the old graph.
+        read_files (int): Number of file versions read from git to build both graphs.
+    """
+    def __init__(self, old_graph, new_graph, read_files=0):
+        old_nodes, old_edges = _labels(old_graph)
+        new_nodes, new_edges = _labels(new_graph)
+        self.added_nodes = new_nodes - old_nodes
+        self.removed_nodes = old_nodes - new_nodes
+        self.added_edges = new_edges - old_edges
+        self.removed_edges = old_edges - new_edges
+        self.read_files = read_files
+
+    def __bool__(self):
+        return bool(self.added_nodes or self.removed_nodes or self.added_edges or self.removed_edges)
+
+    def report(self):
+        """ Lists the differences as text, one per line, with `+` for additions and `-` for removals.
+
+        Returns:
+            (list): Lines of the report.
+        """
+        lines = []
+        for sign, nodes in (('-', self.removed_nodes), ('+', self.added_nodes)):
+            lines.extend('{} node {}'.format(sign, node) for node in sorted(nodes))
+        for sign, edges in (('-', self.removed_edges), ('+', self.added_edges)):
+            lines.extend('{} edge {} -> {}'.format(sign, tail, head) for tail, head in sorted(edges))
+        return lines
+
+    def write_dot(self, output):
+        """ Writes the changed edges, and the nodes at their ends, as a DOT graph. Added nodes and edges are drawn in
+        green, and removed ones in red.
+
+        Arguments:
+            output (string or file): Path of the file to write, `-` for standard output, or a text file object.
+        """
+        if output == '-':
+            self._write_dot(sys.stdout)
+        elif hasattr(output, 'write'):
+            self._write_dot(output)
+        else:
+            with open(output, 'w', encoding='utf-8') as output_file:
+                self._write_dot(output_file)
+
+    def _write_dot(self, stream):
+        with DotWriter(stream) as writer:
+            for nodes, color in ((self.added_nodes, ADDED_COLOR), (self.removed_nodes, REMOVED_COLOR)):
+                for node in sorted(nodes):
+                    writer.node(node, color=color, fontcolor=color)
+            for edges, color in ((self.added_edges, ADDED_COLOR), (self.removed_edges, REMOVED_COLOR)):
+                for tail, head in sorted(edges):
+                    writer.edge(tail, head, color=color)
+
+
+def _parse_revision(files, jobs, parse_options):
+    return parse_files(read_blobs(sorted(files.items())), jobs=jobs, skip_errors=True, lean=True, **parse_options)
+
+
+def diff_revisions(old_revision, new_revision, path='.', jobs=1, remove_builtins=False, ignore=False, cache=None):
+    """ Compares the call graphs of two revisions of a git repository, without checking them out.
+
+    Files are read from the git object database. Files whose blob is the same in both revisions are parsed once and
+    used in both graphs, so only changed files are parsed twice. With a `cache`, files seen in earlier runs are not
+    parsed at all. Files that cannot be parsed are left out of the graph of their revision.
+
+    Arguments:
+        old_revision (string): Revision to compare from.
+        new_revision (string): Revision to compare to.
+        path (string): Directory, or file, to graph, relative to the current directory.
+        jobs (int): Number of processes used to parse files, see :func:`codegrapher.parallel.parse_files`.
+        remove_builtins (bool): Remove builtin functions from the call trees.
+        ignore (bool or :class:`codegrapher.ignore.IgnoreMatcher`): Functions to ignore, see
+            :func:`codegrapher.parallel.parse_files`.
+        cache (:class:`codegrapher.cache.ParseCache`): Cache used to skip parsing files whose contents were seen before.
+
+    Returns:
+        (:class:`GraphDiff`)
+
+    Raises:
+        subprocess.CalledProcessError: If a revision cannot be listed, see :func:`git_tree`.
+        ValueError: If a file cannot be read, see :func:`read_blobs`.
+    """
+    old_files = git_tree(old_revision, path)
+    new_files = git_tree(new_revision, path)
+    parse_options = dict(remove_builtins=remove_builtins, ignore=ignore, cache=cache)
+
+    old_objects = dict((file_object.name, file_object)
+                       for file_object in _parse_revision(old_files, jobs, parse_options))
+    changed = dict((file_name, object_hash) for file_name, object_hash in new_files.items()
+                   if old_files.get(file_name) != object_hash)
+    new_objects = dict((file_name, old_objects[file_name]) for file_name in new_files
+                       if file_name not in changed and file_name in old_objects)
+    new_objects.update((file_object.name, file_object)
+                       for file_object in _parse_revision(changed, jobs, parse_options))
+
+    graphs = []
+    for file_objects in (old_objects, new_objects):
+        graph = FunctionGrapher()
+        graph.add_files_to_graph(file_objects[file_name] for file_name in sorted(file_objects))
+        graphs.append(graph)
+    return GraphDiff(graphs[0], graphs[1], read_files=len(old_files) + len(changed))
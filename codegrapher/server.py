@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+
+from codegrapher.query import DIRECTIONS, GraphIndex
+
+
+QUERIES = ('callers', 'callees', 'neighborhood', 'path', 'reachable', 'cycles', 'refresh', 'stats')
+_ARITY = {'path': 2, 'cycles': 0, 'refresh': 0, 'stats': 0}
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """ An exception raised for requests a :class:`GraphServer` cannot answer, reported back to the client. """
+    pass
+
+
+def _query(index, kind, names, depth, direction):
+    try:
+        if kind == 'callers':
+            return sorted(index.callers(names[0]))
+        if kind == 'callees':
+            return sorted(index.callees(names[0]))
+        if kind == 'neighborhood':
+            return index.neighborhood(names[0], depth=depth, direction=direction or 'both')
+        if kind == 'path':
+            return index.shortest_path(names[0], names[1], direction=direction or 'callees')
+        if kind == 'cycles':
+            return index.cycles()
+        return sorted(index.reachable(names[0], direction=direction or 'callees'))
+    except KeyError as error:
+        raise RequestError('no function named {} in the graph'.format(error.args[0]))
+
+
+class GraphServer(object):
+    """ Keeps the parsed files and call graph of a project in memory and answers queries about them over a local
+    socket, so that tools such as editors do not pay for starting a process and parsing the project on each question.
+
+    Clients send one JSON object per line and get one JSON object per line back, in the same order::
+
+        {"query": "callers", "names": ["package.module.main"]}
+        {"result": ["package.cli.run"]}
+
+    Queries are `callers`, `callees`, `neighborhood`, `path`, `reachable` and `cycles`, which take the same names and
+    options, `depth` and `direction`, as the `query` command, plus `refresh`, which parses the files changed since the
+    last refresh, and `stats`. Failed requests are answered with an `error` message instead of a `result`. An `id`
+    given in a request is copied into its answer.
+
+    Queries are answered from a :class:`codegrapher.query.GraphIndex` of a snapshot of the graph, which is never
+    changed, on worker threads, so a slow query does not hold up the others. Refreshes parse files on a worker thread
+    too, and run one at a time. Indexing takes longer than parsing a few files, so the next index is only built, then
+    swapped in, by the first query after a refresh changed the graph, rather than on every save of a file. Queries
+    keep being answered from the current index while a refresh that did not change the graph yet runs.
+
+    Attributes:
+        project (:class:`codegrapher.watch.Project`): Files and graph being served.
+        index (:class:`codegrapher.query.GraphIndex`): Index queries are answered from, or `None` before the first
+            query.
+        refresh_interval (float): Seconds between two automatic refreshes, or `None` to only refresh on request.
+    """
+    def __init__(self, project, refresh_interval=None):
+        self.project = project
+        self.index = None
+        self.refresh_interval = refresh_interval
+        self._refresh_lock = None
+        self._server = None
+        self._poller = None
+        # set when the graph changed since the index was built
+        self._stale = True
+
+    def _refresh(self):
+        parsed, removed = self.project.refresh()
+        if parsed or removed:
+            self._stale = True
+        return parsed, removed
+
+    def _reindex(self):
+        if self._stale:
+            self._stale = False
+            self.index = GraphIndex(self.project.graph.freeze())
+        return self.index
+
+    def _lock(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    async def current_index(self):
+        """ Indexes the graph if it changed since it was last indexed, on a worker thread.
+
+        Returns:
+            (:class:`codegrapher.query.GraphIndex`): Index of the current graph.
+        """
+        if not self._stale:
+            return self.index
+        async with self._lock():
+            return await asyncio.get_running_loop().run_in_executor(None, self._reindex)
+
+    async def refresh(self):
+        """ Parses the files changed since the last refresh, on a worker thread, and indexes the new graph.
+
+        Returns:
+            (dict): Names of the files `parsed` and `removed`, and of the files that could not be parsed, as `errors`.
+        """
+        async with self._lock():
+            parsed, removed = await asyncio.get_running_loop().run_in_executor(None, self._refresh)
+        return {
+            'parsed': sorted(file_object.name for file_object in parsed),
+            'removed': sorted(removed),
+            'errors': sorted(self.project.errors),
+        }
+
+    async def answer(self, request):
+        """ Answers a request.
+
+        Arguments:
+            request (dict): Decoded request, with a `query` and, depending on the query, `names`, `depth` and
+                `direction`.
+
+        Returns:
+            (object): Result of the query, as a JSON serializable value.
+
+        Raises:
+            RequestError: If the request is not valid or names a function that is not in the graph.
+        """
+        kind = request.get('query')
+        if kind not in QUERIES:
+            raise RequestError('query must be one of {}, not {!r}'.format(', '.join(QUERIES), kind))
+        names = request.get('names', [])
+        arity = _ARITY.get(kind, 1)
+        if not isinstance(names, list) or len(names) != arity:
+            raise RequestError('{} takes {} function name{}'.format(kind, arity, '' if arity == 1 else 's'))
+        direction = request.get('direction')
+        if direction is not None and direction not in DIRECTIONS:
+            raise RequestError('direction must be one of {}, not {!r}'.format(', '.join(DIRECTIONS), direction))
+        depth = request.get('depth', 1)
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 0):
+            raise RequestError('depth must be a non-negative integer or null, not {!r}'.format(depth))
+
+        if kind == 'refresh':
+            return await self.refresh()
+        # the index is swapped as a whole, so a query only ever sees one version of the graph
+        index = await self.current_index()
+        if kind == 'stats':
+            return {'files': len(self.project.files), 'nodes': index.node_count, 'edges': index.edge_count}
+        # searches over a large graph take a while, and the index is never changed, so they run on worker threads
+        return await asyncio.get_running_loop().run_in_executor(None, _query, index, kind, names, depth,
+                                                                 direction)
+
+    async def _answer_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'error': 'requests must be JSON objects, one per line'}
+        if not isinstance(request, dict):
+            return {'error': 'requests must be JSON objects, one per line'}
+        response = {'id': request['id']} if 'id' in request else {}
+        try:
+            response['result'] = await self.answer(request)
+        except RequestError as error:
+            response['error'] = str(error)
+        except Exception as error:
+            # a bug or a failed refresh must not leave the client without an answer, nor take the server down
+            logger.exception('could not answer %r', request)
+            response['error'] = 'internal error: {}: {}'.format(type(error).__name__, error)
+        return response
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self._answer_line(line)
+                writer.write(json.dumps(response, sort_keys=True).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                # files that changed are found again by the next refresh, which may succeed
+                logger.exception('could not refresh %s', self.project.code)
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """ Parses and indexes the project, then starts listening for clients.
+
+        Arguments:
+            path (string): Path of a Unix domain socket to listen on. A TCP socket is used instead if not given.
+            host (string): Address the TCP socket is bound to, the local host by default.
+            port (int): Port of the TCP socket, any free port by default.
+
+        Returns:
+            (:class:`asyncio.AbstractServer`): Server listening for clients, see its `sockets` for the address.
+        """
+        await self.refresh()
+        await self.current_index()
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        if self.refresh_interval is not None:
+            self._poller = asyncio.ensure_future(self._poll())
+        return self._server
+
+    async def close(self):
+        """ Stops listening and refreshing. """
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self, path=None, host='127.0.0.1', port=0, ready=None):
+        """ Starts the server, see :func:`GraphServer.start`, and answers clients until cancelled.
+
+        Arguments:
+            ready (callable): Called with the started server, as in to report its address, once clients can connect.
+        """
+        server = await self.start(path=path, host=host, port=port)
+        try:
+            if ready is not None:
+                ready(server)
+            await server.serve_forever()
+        finally:
+            await self.close()
@@ -0,0 +1,306 @@
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from codegrapher import profiling
+from codegrapher.query import GraphIndex, GraphQueries
+
+
+MAGIC = b'CGGRAPH\0'
+FORMAT_VERSION = 1
+SECTIONS = ('string_offsets', 'strings', 'forward_offsets', 'forward_targets', 'reverse_offsets', 'reverse_targets',
+            'sources')
+# magic, format version, node count, edge count, then an `(offset, length)` pair per section, all little-endian
+HEADER = struct.Struct('<8sIIQ' + 'QQ' * len(SECTIONS))
+_SOURCE = struct.Struct('<I')
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+def source_digest(file_name):
+    """ Hashes the contents of a source file.
+
+    Arguments:
+        file_name (string): Path of the file.
+
+    Returns:
+        (string): SHA-256 hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_graph_file(path):
+    """ Checks whether a file was written by :func:`save_graph`, from its first bytes.
+
+    Arguments:
+        path (string): Path of the file.
+
+    Returns:
+        (bool)
+    """
+    try:
+        with open(path, 'rb') as input_file:
+            return input_file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def save_graph(graph, path, sources=()):
+    """ Saves a graph in the codegrapher binary format, to be opened with :class:`MappedGraph`.
+
+    The file holds a header, followed by sections aligned on 8 bytes:
+
+    * a string table of the node labels, as in `namespace.class.function_name`, sorted by their UTF-8 encoding. Node
+      `i` is the `i`-th label. Offsets of the labels come first, as `count + 1` unsigned 64 bit integers, then the
+      encoded labels themselves.
+    * forward and reverse adjacency arrays in compressed sparse row form: for each direction, `count + 1` unsigned 64
+      bit offsets into an array of unsigned 32 bit node numbers, so the callees of node `i` are
+      `forward_targets[forward_offsets[i]:forward_offsets[i + 1]]`, sorted.
+    * the files the graph was built from, each as an unsigned 32 bit length, the UTF-8 encoded path and its SHA-256
+      digest.
+
+    Nodes that share a label, which are drawn as a single node when rendering, are merged. The file is written to a
+    temporary file first, so readers never see a partial graph.
+
+    Arguments:
+        graph (:class:`codegrapher.graph.FunctionGrapher` or :class:`codegrapher.query.GraphIndex`): Graph to save.
+        path (string): Output file name.
+        sources (iterable or dict): Paths of the files the graph was built from, which are hashed, or a dict of
+            `path: SHA-256 hex digest` pairs.
+    """
+    with profiling.stage('save_graph'):
+        index = graph if isinstance(graph, GraphIndex) else GraphIndex(graph)
+        labels = [label.encode('utf-8') for label in index.labels]
+
+        if not isinstance(sources, dict):
+            sources = dict((file_name, source_digest(file_name)) for file_name in sources)
+        source_records = []
+        for file_name, digest in sorted(sources.items()):
+            file_name = file_name.encode('utf-8')
+            source_records.append(_SOURCE.pack(len(file_name)) + file_name + bytes.fromhex(digest))
+
+        sections = [
+            _little_endian(array('Q', itertools.accumulate(itertools.chain([0], map(len, labels))))),
+            b''.join(labels),
+            _little_endian(index.forward_offsets),
+            _little_endian(index.forward_targets),
+            _little_endian(index.reverse_offsets),
+            _little_endian(index.reverse_targets),
+            b''.join(source_records),
+        ]
+        table = []
+        offset = HEADER.size
+        for section in sections:
+            offset += -offset % 8
+            table.extend((offset, len(section)))
+            offset += len(section)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, index.node_count, index.edge_count, *table)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as output_file:
+                output_file.write(header)
+                for (offset, _), section in zip(zip(table[::2], table[1::2]), sections):
+                    output_file.write(b'\0' * (offset - output_file.tell()))
+                    output_file.write(section)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class MappedGraph(GraphQueries):
+    """ A graph saved by :func:`save_graph`, memory-mapped rather than read.
+
+    Opening a graph only reads its header, whatever its size. Labels and adjacency arrays are read from the mapping
+    as they are used, so queries touch only the pages holding the nodes they visit. Nodes are numbered in the order of
+    their labels, which lets :func:`MappedGraph.index` find a label by binary search. All the queries of
+    :class:`codegrapher.query.GraphQueries` are available.
+
+    Use the graph as a context manager, or call :func:`MappedGraph.close`, to release the mapping::
+
+        with MappedGraph('project.cgraph') as graph:
+            print(graph.callers('pkg.module.Class.method'))
+
+    Attributes:
+        path (string): Path of the graph file.
+        version (int): Format version of the file.
+        node_count (int): Number of nodes.
+        edge_count (int): Number of edges.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as input_file:
+            try:
+                self._mmap = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError('{} is not a codegrapher graph'.format(path))
+        self._views = []
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        if len(self._mmap) < HEADER.size:
+            raise ValueError('{} is not a codegrapher graph'.format(self.path))
+        fields = HEADER.unpack_from(self._mmap)
+        magic, self.version, self.node_count, self.edge_count = fields[:4]
+        if magic != MAGIC:
+            raise ValueError('{} is not a codegrapher graph'.format(self.path))
+        if self.version != FORMAT_VERSION:
+            raise ValueError('{} uses graph format {}, expected {}'.format(self.path, self.version, FORMAT_VERSION))
+        sections = dict(zip(SECTIONS, zip(fields[4::2], fields[5::2])))
+        for offset, length in sections.values():
+            if offset + length > len(self._mmap):
+                raise ValueError('{} is truncated'.format(self.path))
+        self._string_offsets = self._array(sections['string_offsets'], 'Q')
+        self._strings_start = sections['strings'][0]
+        self._forward_offsets = self._array(sections['forward_offsets'], 'Q')
+        self._forward_targets = self._array(sections['forward_targets'], 'I')
+        self._reverse_offsets = self._array(sections['reverse_offsets'], 'Q')
+        self._reverse_targets = self._array(sections['reverse_targets'], 'I')
+        self._sources_section = sections['sources']
+        self._sources = None
+
+    def _array(self, section, typecode):
+        offset, length = section
+        if sys.byteorder != 'little':
+            values = array(typecode, self._mmap[offset:offset + length])
+            values.byteswap()
+            return values
+        view = memoryview(self._mmap)[offset:offset + length].cast(typecode)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        """Releases the mapping. The graph can no longer be used afterwards."""
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _encoded_label(self, node):
+        start = self._strings_start
+        return self._mmap[start + self._string_offsets[node]:start + self._string_offsets[node + 1]]
+
+    def _find(self, label):
+        key = label.encode('utf-8')
+        low, high = 0, self.node_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded_label(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.node_count and self._encoded_label(low) == key:
+            return low
+        return None
+
+    def label(self, node):
+        """ Looks up the label of a node.
+
+        Arguments:
+            node (int): Node number.
+
+        Returns:
+            (string): Label of the node, as in `namespace.class.function_name`.
+        """
+        if not 0 <= node < self.node_count:
+            raise IndexError(node)
+        return self._encoded_label(node).decode('utf-8')
+
+    def index(self, label):
+        """ Looks up the number of a node from its label.
+
+        Arguments:
+            label (string): Label of the node, as in `namespace.class.function_name`.
+
+        Returns:
+            (int): Node number.
+
+        Raises:
+            KeyError: If no node has this label.
+        """
+        node = self._find(label)
+        if node is None:
+            raise KeyError(label)
+        return node
+
+    def callee_ids(self, node):
+        """ Lists the nodes called by a node.
+
+        Arguments:
+            node (int): Node number.
+
+        Returns:
+            (list): Node numbers, in increasing order.
+        """
+        return self._forward_targets[self._forward_offsets[node]:self._forward_offsets[node + 1]].tolist()
+
+    def caller_ids(self, node):
+        """ Lists the nodes calling a node.
+
+        Arguments:
+            node (int): Node number.
+
+        Returns:
+            (list): Node numbers, in increasing order.
+        """
+        return self._reverse_targets[self._reverse_offsets[node]:self._reverse_offsets[node + 1]].tolist()
+
+    @property
+    def sources(self):
+        """dict: SHA-256 hex digests of the files the graph was built from, by path."""
+        if self._sources is None:
+            offset, length = self._sources_section
+            end = offset + length
+            sources = {}
+            while offset < end:
+                size, = _SOURCE.unpack_from(self._mmap, offset)
+                offset += _SOURCE.size
+                file_name = self._mmap[offset:offset + size].decode('utf-8')
+                offset += size
+                sources[file_name] = self._mmap[offset:offset + _DIGEST_SIZE].hex()
+                offset += _DIGEST_SIZE
+            self._sources = sources
+        return self._sources
+
+    def stale_sources(self):
+        """ Lists the files the graph was built from that changed or disappeared since.
+
+        Returns:
+            (list): Paths of the changed and missing files.
+        """
+        stale = []
+        for file_name, digest in sorted(self.sources.items()):
+            try:
+                if source_digest(file_name) != digest:
+                    stale.append(file_name)
+            except OSError:
+                stale.append(file_name)
+        return stale
@@ -0,0 +1,190 @@
+import threading
+
+
+def absolute_module(module, relative_namespace):
+    """ Converts a module imported relatively, as in ``from ..utils import helper``, to the dotted path it stands for.
+
+    Arguments:
+        module (string): Module of a call, with one leading dot per level for relative imports, as in `..utils`.
+        relative_namespace (string): Namespace of the file making the call, as in
+            :attr:`codegrapher.parser.FileObject.relative_namespace`.
+
+    Returns:
+        (string): Dotted path of the module, unchanged if it is not relative. Levels going above the root of the
+        namespace are dropped.
+    """
+    if not module or module[0] != '.':
+        return module
+    name = module.lstrip('.')
+    level = len(module) - len(name)
+    # the package of a module is its namespace without the module name, which also holds for `package.__init__`
+    package = relative_namespace.split('.')[:-1]
+    package = package[:max(len(package) - level + 1, 0)]
+    return '.'.join(package + [name] if name else package)
+
+
+def call_name(call, relative_namespace):
+    """ Builds the qualified name a call is looked up under, see :func:`SymbolIndex.resolve`.
+
+    Arguments:
+        call (tuple): `(module, identifier)` or `(identifier,)` call.
+        relative_namespace (string): Namespace of the file making the call.
+
+    Returns:
+        (string): Qualified name, as in `package.module.function`.
+    """
+    if len(call) == 1:
+        # an unqualified call refers to a name defined or imported in the same file
+        return '.'.join([relative_namespace, call[0]])
+    return '.'.join([absolute_module(call[0], relative_namespace), call[1]])
+
+
+def referenced_names(file_object):
+    """ Lists the qualified names the calls of a file are looked up under, so that the files to link again when the
+    definitions registered under some names change can be found.
+
+    Arguments:
+        file_object (:class:`codegrapher.parser.FileObject`): Visited file.
+
+    Returns:
+        (set): Qualified names, see :func:`call_name`.
+    """
+    namespace = file_object.relative_namespace
+    names = set()
+    for call_tree in [file_object.call_tree] + [class_object.call_tree for class_object in file_object.classes]:
+        for calls in call_tree.values():
+            names.update(call_name(call, namespace) for call in calls)
+    return names
+
+
+def _module_paths(relative_namespace):
+    parts = relative_namespace.split('.')
+    paths = [parts]
+    if parts[-1] == '__init__' and len(parts) > 1:
+        # `package/__init__.py` defines names imported from `package`
+        paths.append(parts[:-1])
+    return paths
+
+
+class SymbolIndex(object):
+    """ Project-wide index of the functions and classes defined in a set of files, used to link calls made in one file
+    to the graph nodes of definitions in another.
+
+    Definitions are registered under their fully qualified name, as in `package.module.Class.method`, built from the
+    namespace of their file. The namespace is taken from file paths, which may start with directories that are not
+    part of import paths, as in `src/package/module.py`, so definitions are also registered under every suffix of their
+    namespace, as in `package.module.Class.method` and `module.Class.method`. A suffix shared by definitions from
+    several files is ambiguous and is not used. Resolving a call is a couple of dict lookups.
+
+    Files may be registered from several threads while others resolve calls: registering takes a lock, and the sets of
+    `suffixes` are replaced rather than changed, so lookups never see a set being updated.
+
+    Attributes:
+        names (dict): Node tuples of definitions, by fully qualified name.
+        suffixes (dict): Frozen sets of node tuples of definitions, by qualified name suffix.
+    """
+    def __init__(self):
+        self.names = {}
+        self.suffixes = {}
+        self._files = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_file(self, file_object):
+        """ Registers the module level functions, classes and methods of a visited file, replacing those registered
+        for a previous version of the file.
+
+        Arguments:
+            file_object (:class:`codegrapher.parser.FileObject`): File to register.
+
+        Returns:
+            (set): Qualified names and suffixes whose definitions may have changed, those of the previous version of
+            the file and those of the new one.
+        """
+        namespace = file_object.relative_namespace
+        definitions = []
+        for function_object in file_object.functions:
+            definitions.append(((function_object.name,), (namespace, function_object.name)))
+        for class_object in file_object.classes:
+            # calling a class calls its constructor
+            definitions.append(((class_object.name,), (namespace, class_object.name, '__init__')))
+            for function_object in class_object.functions:
+                definitions.append(((class_object.name, function_object.name),
+                                    (namespace, class_object.name, function_object.name)))
+
+        with self._lock:
+            changed = self.remove_file(file_object.name)
+            registered = []
+            for module_path in _module_paths(namespace):
+                for local_name, node in definitions:
+                    self.names['.'.join(module_path + list(local_name))] = node
+                    for start in range(1, len(module_path)):
+                        name = '.'.join(module_path[start:] + list(local_name))
+                        self.suffixes[name] = self.suffixes.get(name, frozenset()) | {node}
+                        changed.add(name)
+                    changed.add('.'.join(module_path + list(local_name)))
+                    registered.append((module_path, local_name, node))
+            self._files[file_object.name] = registered
+            return changed
+
+    def remove_file(self, file_name):
+        """ Forgets the definitions registered for a file.
+
+        Arguments:
+            file_name (string): Name of a :class:`codegrapher.parser.FileObject` previously registered.
+
+        Returns:
+            (set): Qualified names and suffixes whose definitions changed.
+        """
+        changed = set()
+        with self._lock:
+            for module_path, local_name, node in self._files.pop(file_name, ()):
+                name = '.'.join(module_path + list(local_name))
+                changed.add(name)
+                if self.names.get(name) == node:
+                    del self.names[name]
+                for start in range(1, len(module_path)):
+                    name = '.'.join(module_path[start:] + list(local_name))
+                    changed.add(name)
+                    nodes = self.suffixes.get(name)
+                    if nodes is not None:
+                        nodes = nodes - {node}
+                        if nodes:
+                            self.suffixes[name] = nodes
+                        else:
+                            del self.suffixes[name]
+        return changed
+
+    def lookup(self, name):
+        """ Finds the definition with a qualified name.
+
+        Arguments:
+            name (string): Fully qualified name, or unambiguous suffix of one, as in `module.Class.method`.
+
+        Returns:
+            (tuple): Node tuple of the definition, or `None` if there is no single definition with that name.
+        """
+        node = self.names.get(name)
+        if node is None:
+            nodes = self.suffixes.get(name)
+            if nodes is not None and len(nodes) == 1:
+                node = next(iter(nodes))
+        return node
+
+    def resolve(self, call, relative_namespace):
+        """ Finds the definition a call refers to.
+
+        Arguments:
+            call (tuple): `(module, identifier)` or `(identifier,)` call, as in
+                :attr:`codegrapher.parser.FunctionObject.calls`.
+            relative_namespace (string): Namespace of the file making the call.
+
+        Returns:
+            (tuple): Node tuple of the definition, or `None` if the call does not refer to a known definition.
+        """
+        if len(call) == 1:
+            # an unqualified call refers to a name defined or imported in the same file
+            return self.names.get(call_name(call, relative_namespace))
+        return self.lookup(call_name(call, relative_namespace))
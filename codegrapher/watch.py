@@ -0,0 +1,138 @@
+import os
+import time
+from collections import defaultdict
+
+from codegrapher.discovery import find_files
+from codegrapher.graph import FunctionGrapher
+from codegrapher.parallel import parse_file, parse_files
+from codegrapher.symbols import SymbolIndex, referenced_names
+
+
+class Project(object):
+    """Parsed files and call graph of a file or directory, kept up to date incrementally.
+
+    Changes are found by polling the modification time and size of each file. Only new and modified files are parsed
+    again, and only their contributions to the graph are replaced, so the cost of an update depends on the size of the
+    changed files rather than on the size of the project. Files calling definitions that were added, changed or
+    removed are linked again, without being parsed, so the graph stays the same as that of a fresh run.
+
+    Attributes:
+        code (string): Path of the file or directory being watched.
+        recursive (bool): Treat `code` as a directory and watch all Python files in it, recursively.
+        excludes (tuple): Glob patterns of files and directories not to watch, see
+            :func:`codegrapher.discovery.iter_files`.
+        gitignore (bool): Do not watch files ignored by `.gitignore` files.
+        skip_build (bool): Do not watch `build` and `dist` directories, see :func:`codegrapher.discovery.iter_files`.
+        lean (bool): Drop the AST nodes of files once they are parsed, see
+            :func:`codegrapher.parser.FileObject.release`.
+        files (dict): :class:`codegrapher.parser.FileObject` instances by file name.
+        errors (dict): Exceptions raised while parsing files that could not be updated, by file name.
+        graph (:class:`codegrapher.graph.FunctionGrapher`): Call graph of all files, with calls linked to the
+            definitions of other files.
+    """
+    def __init__(self, code, recursive=False, remove_builtins=False, ignore=False, cache=None, jobs=1, excludes=(),
+                 gitignore=True, lean=False, skip_build=False):
+        self.code = code
+        self.recursive = recursive
+        self.excludes = tuple(excludes)
+        self.gitignore = gitignore
+        self.skip_build = skip_build
+        self.files = {}
+        self.errors = {}
+        self.graph = FunctionGrapher(track_files=True, symbols=SymbolIndex())
+        self._parse_options = dict(remove_builtins=remove_builtins, ignore=ignore, cache=cache, lean=lean)
+        self._jobs = jobs
+        self._signatures = {}
+        # names of files by the qualified names their calls are looked up under
+        self._referrers = defaultdict(set)
+
+    def _scan(self):
+        signatures = {}
+        for file_name in find_files(self.code, self.recursive, excludes=self.excludes, gitignore=self.gitignore,
+                                    skip_build=self.skip_build):
+            try:
+                stat = os.stat(file_name)
+            except OSError:
+                continue
+            signatures[file_name] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def refresh(self):
+        """Parses new and modified files, and drops deleted files, since the last refresh. The first refresh parses
+        every file.
+
+        Returns:
+            (tuple): List of the :class:`codegrapher.parser.FileObject` instances that were parsed, and list of the
+                names of the files that were removed.
+        """
+        signatures = self._scan()
+        changed = [file_name for file_name, signature in signatures.items()
+                   if self._signatures.get(file_name) != signature]
+        removed = [file_name for file_name in self._signatures if file_name not in signatures]
+
+        symbols = self.graph.symbols
+        changed_names = set()
+        for file_name in removed:
+            self.graph.remove_file_from_graph(file_name)
+            changed_names.update(symbols.remove_file(file_name))
+            self._forget_references(file_name)
+            self.errors.pop(file_name, None)
+
+        parsed = []
+        if len(changed) > 1 and self._jobs != 1:
+            # only spin up worker processes for large batches, such as the first refresh
+            parsed = list(parse_files(changed, jobs=self._jobs, skip_errors=True, **self._parse_options))
+            # files skipped by the workers are parsed again here, to find out why
+            names = set(file_object.name for file_object in parsed)
+            changed = [file_name for file_name in changed if file_name not in names]
+        for file_name in changed:
+            try:
+                parsed.append(parse_file(file_name, **self._parse_options))
+            except (SyntaxError, ValueError, OSError) as error:
+                # files are often invalid while being edited, keep their last good state until they change again
+                self.errors[file_name] = error
+        # register all new definitions first, so calls between files parsed together are linked
+        for file_object in parsed:
+            changed_names.update(symbols.add_file(file_object))
+        # files whose calls may now be linked to other definitions are added again from their call data
+        parsed_names = set(file_object.name for file_object in parsed)
+        relinked = set()
+        for name in changed_names:
+            relinked.update(self._referrers.get(name, ()))
+        relinked = [self.files[file_name] for file_name in sorted(relinked - parsed_names)]
+        for file_object in parsed:
+            self._forget_references(file_object.name)
+            self.files[file_object.name] = file_object
+            for name in referenced_names(file_object):
+                self._referrers[name].add(file_object.name)
+            self.errors.pop(file_object.name, None)
+        for file_object in parsed + relinked:
+            self.graph.add_file_to_graph(file_object)
+        # only recorded once the changes are applied, so a refresh that fails is retried in full by the next one
+        self._signatures = signatures
+        return parsed, removed
+
+    def _forget_references(self, file_name):
+        file_object = self.files.pop(file_name, None)
+        if file_object is None:
+            return
+        for name in referenced_names(file_object):
+            referrers = self._referrers.get(name)
+            if referrers is not None:
+                referrers.discard(file_name)
+                if not referrers:
+                    del self._referrers[name]
+
+    def watch(self, interval=1.0):
+        """Polls files for changes, forever.
+
+        Args:
+            interval (float): Seconds to wait between two polls.
+        Yields:
+            (tuple): Output of :func:`Project.refresh`, each time at least one file changed.
+        """
+        while True:
+            time.sleep(interval)
+            parsed, removed = self.refresh()
+            if parsed or removed:
+                yield parsed, removed
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+
+def _write_source(file_name, code, mtime):
+    with open(file_name, 'w') as f:
+        f.write(code)
+    os.utime(file_name, (mtime, mtime))
+
+
+@pytest.fixture
+def write_source():
+    """Writes a source file with the given modification time, so that changes are noticed however fast the test runs.
+    """
+    return _write_source
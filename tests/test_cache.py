@@ -0,0 +1,76 @@
+import os
+
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.cache import ParseCache
+from codegrapher.parser import FileObject
+
+
+def get_code():
+    return b'''
+from copy import deepcopy as dc
+
+class StringCopier(object):
+    def __init__(self):
+        self.copied_strings = set()
+
+    def copy(self):
+        return dc('this')
+'''
+
+
+def test_cache_hit_skips_parsing(monkeypatch):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        cache = ParseCache('cache')
+        first = cache.load('code.py', get_code())
+        assert len(cache.entries()) == 1
+
+        def fail_parse(*args, **kwargs):
+            raise AssertionError('cached file was parsed again')
+
+        monkeypatch.setattr(FileObject, '__init__', fail_parse)
+        second = cache.load(os.path.join('pkg', 'copy.py'), get_code())
+        assert second.relative_namespace == 'pkg.copy'
+        assert second.classes[0].call_tree == {
+            ('pkg.copy', 'StringCopier', '__init__'): [('set',)],
+            ('pkg.copy', 'StringCopier', 'copy'): [('copy', 'deepcopy')],
+        }
+        assert [f.name for f in second.classes[0].functions] == [f.name for f in first.classes[0].functions]
+
+
+def test_cache_key_depends_on_contents():
+    assert ParseCache.key(get_code()) == ParseCache.key(get_code())
+    assert ParseCache.key(get_code()) != ParseCache.key(get_code() + b'\n')
+
+
+def test_cache_eviction():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        cache = ParseCache('cache', max_age=100)
+        for index in range(4):
+            cache.put(ParseCache.key(str(index).encode()), {'classes': []})
+        paths = sorted(cache.entries(), key=lambda entry: entry[0])
+        for age, (path, size, last_used) in enumerate(paths):
+            os.utime(path, (1000 + age, 1000 + age))
+        entry_size = paths[0][1]
+
+        cache.max_size = 2 * entry_size
+        assert cache.evict(now=1050) == 2
+        assert sorted(entry[0] for entry in cache.entries()) == [path for path, _, _ in paths[2:]]
+
+        assert cache.evict(now=1102.5) == 1
+        assert [entry[0] for entry in cache.entries()] == [paths[3][0]]
+
+
+def test_cli_cache():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'wb') as f:
+            f.write(get_code())
+        first = runner.invoke(cli, ['code.py', '--printed', '--remove-builtins', '--cache', '--cache-dir', 'cache'])
+        second = runner.invoke(cli, ['code.py', '--printed', '--remove-builtins', '--cache', '--cache-dir', 'cache'])
+        assert first.exit_code == 0
+        assert second.output == first.output
+        assert len(ParseCache('cache').entries()) == 1
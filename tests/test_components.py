@@ -0,0 +1,83 @@
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.components import cyclic_components, strongly_connected_components
+from codegrapher.graph import FunctionGrapher
+from codegrapher.query import GraphIndex
+
+
+def get_graph():
+    graph = FunctionGrapher()
+    graph.name = 'calls'
+    for tail, head in [('main', 'parse'), ('parse', 'expr'), ('expr', 'term'), ('term', 'expr'), ('term', 'atom'),
+                       ('atom', 'expr'), ('main', 'walk'), ('walk', 'walk'), ('walk', 'log')]:
+        graph.add_edge(('code', tail), ('code', head))
+    graph.add_node(('code', 'main'))
+    return graph
+
+
+def test_strongly_connected_components():
+    edges = {1: [2], 2: [3], 3: [1, 4], 4: [5], 5: [4], 6: [6], 7: [1]}
+
+    def neighbors(node):
+        return edges.get(node, [])
+
+    components = strongly_connected_components(sorted(edges), neighbors)
+    assert sorted(sorted(component) for component in components) == [[1, 2, 3], [4, 5], [6], [7]]
+    # components come in reverse topological order
+    assert components.index([5, 4]) < components.index([3, 2, 1]) < components.index([7])
+    assert sorted(sorted(component) for component in cyclic_components(sorted(edges), neighbors)) == [
+        [1, 2, 3], [4, 5], [6]]
+
+    # a long chain closing on itself does not hit the recursion limit
+    size = 100000
+
+    def chain(node):
+        return [(node + 1) % size]
+
+    assert [len(component) for component in strongly_connected_components(range(size), chain)] == [size]
+
+
+def test_graph_cycles_and_condense():
+    graph = get_graph()
+    assert graph.cycles() == [[('code', 'atom'), ('code', 'expr'), ('code', 'term')], [('code', 'walk')]]
+    assert GraphIndex(graph).cycles() == [['code.atom', 'code.expr', 'code.term'], ['code.walk']]
+
+    condensed = graph.condense()
+    assert condensed.name == 'calls'
+    labels = set('.'.join(tail) + ' -> ' + '.'.join(head) for tail, head in condensed.iter_edges())
+    assert labels == {'code.main -> code.parse', 'code.parse -> code.atom | code.expr | code.term',
+                      'code.main -> code.walk', 'code.walk -> code.walk', 'code.walk -> code.log'}
+    assert condensed.cycles() == [[('code', 'walk')]]
+
+
+def test_cli_cycles():
+    code = '''
+def main():
+    parse()
+
+def parse():
+    expr()
+
+def expr():
+    term()
+
+def term():
+    expr()
+'''
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(code)
+        result = runner.invoke(cli, ['code.py', '--cycles'])
+        assert result.exit_code == 0
+        assert result.output == 'Cycle of 2 functions:\n    code.expr\n    code.term\n'
+
+        result = runner.invoke(cli, ['code.py', '--collapse-cycles', '--output', '-'])
+        assert result.exit_code == 0
+        assert 'label="code.expr | code.term"' in result.output
+        assert 'label="code.term"' not in result.output
+
+        result = runner.invoke(cli, ['query', 'code.py', 'cycles'])
+        assert result.exit_code == 0
+        assert result.output == 'Cycle of 2 functions:\n    code.expr\n    code.term\n'
@@ -0,0 +1,86 @@
+import os
+import re
+
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.discovery import find_files, translate_pattern
+
+
+def touch(*parts):
+    path = os.path.join(*parts)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write('')
+
+
+def test_find_files_prunes_directories():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for parts in (('src', 'b.py'), ('src', 'a.py'), ('src', 'notes.txt'), ('src', 'pkg', 'c.py'),
+                      ('src', '.git', 'hooks.py'), ('src', 'node_modules', 'x.py'), ('src', 'env', 'pyvenv.cfg'),
+                      ('src', 'env', 'lib.py'), ('src', 'generated', 'd.py'), ('src', 'pkg', 'e_pb2.py'),
+                      ('src', 'pkg', 'keep_pb2.py'), ('src', 'pkg', 'sub', 'f.py'), ('src', 'pkg', 'sub', 'g.py'),
+                      ('src', 'pkg', 'tests', 'test_h.py')):
+            touch(*parts)
+        with open(os.path.join('src', '.gitignore'), 'w') as f:
+            f.write('# generated code\ngenerated/\n*_pb2.py\n!keep_pb2.py\n')
+        with open(os.path.join('src', 'pkg', '.gitignore'), 'w') as f:
+            f.write('/sub/g.py\n')
+
+        files = find_files('src', recursive=True, excludes=['tests'])
+        assert not isinstance(files, list)
+        assert list(files) == [os.path.join('src', *parts) for parts in (
+            ('a.py',), ('b.py',), ('pkg', 'c.py'), ('pkg', 'keep_pb2.py'), ('pkg', 'sub', 'f.py'))]
+
+        assert len(list(find_files('src', recursive=True, gitignore=False))) == 9
+        assert list(find_files(os.path.join('src', 'a.py'))) == [os.path.join('src', 'a.py')]
+
+
+def test_gitignore_patterns():
+    def matches(pattern, path):
+        return re.match(translate_pattern(pattern), path) is not None
+
+    assert matches('a/**/b', 'a/b') and matches('a/**/b', 'a/x/b') and matches('a/**/b', 'a/x/y/b')
+    assert not matches('a/**/b', 'a/xb') and not matches('a/**/b', 'c/a/b')
+    assert matches('**/b', 'b') and matches('**/b', 'x/y/b') and matches('a/**', 'a/x/y')
+    assert matches('dir/*.py', 'dir/a.py') and not matches('dir/*.py', 'dir/sub/a.py')
+    assert matches('.*', '.env') and not matches('.*', 'x/.env') and not matches('?.py', 'a/b.py')
+    assert matches('[!a]b', 'cb') and not matches('[!a]b', 'ab') and matches(r'\*', '*')
+
+
+def test_nested_gitignore_patterns():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for parts in (('src', 'a', 'b.py'), ('src', 'a', 'x', 'y', 'b.py'), ('src', 'a', 'x', 'c.py'),
+                      ('src', 'dir', 'd.py'), ('src', 'dir', 'sub', 'e.py')):
+            touch(*parts)
+        with open(os.path.join('src', '.gitignore'), 'w') as f:
+            f.write('a/**/b.py\ndir/*.py\n')
+
+        assert list(find_files('src', recursive=True)) == [os.path.join('src', *parts) for parts in (
+            ('a', 'x', 'c.py'), ('dir', 'sub', 'e.py'))]
+
+
+def test_skip_build():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for parts in (('src', 'a.py'), ('src', 'build', 'b.py'), ('src', 'pkg', 'dist', 'c.py')):
+            touch(*parts)
+
+        assert len(list(find_files('src', recursive=True))) == 3
+        assert list(find_files('src', recursive=True, skip_build=True)) == [os.path.join('src', 'a.py')]
+        result = runner.invoke(cli, ['-r', 'src', '--printed', '--skip-build'])
+        assert result.exit_code == 0
+        assert result.output == 'Classes in file {}:\n'.format(os.path.join('src', 'a.py'))
+
+
+def test_cli_exclude():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        touch('src', 'a.py')
+        touch('src', 'migrations', 'm.py')
+        result = runner.invoke(cli, ['-r', 'src', '--printed', '--exclude', 'migrations'])
+        assert result.exit_code == 0
+        assert result.output == 'Classes in file {}:\n'.format(os.path.join('src', 'a.py'))
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.export import Exporter, export_files, export_format
+from codegrapher.parser import FileObject
+
+
+CODE = '''import os
+
+class Copier(object):
+    def copy(self):
+        return self.clone()
+
+    def clone(self):
+        return os.getcwd()
+
+def main():
+    Copier().copy()
+'''
+
+
+def get_file_object():
+    file_object = FileObject('pkg/copier.py', source=CODE)
+    file_object.visit()
+    return file_object
+
+
+def test_export_jsonl():
+    output = io.StringIO()
+    assert export_files([get_file_object()], output) == 1
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    nodes = dict((record['id'], record) for record in records if record['type'] == 'node')
+    edges = [(record['source'], record['target'], record['line']) for record in records if record['type'] == 'edge']
+    assert nodes['pkg.copier.main'] == {'type': 'node', 'id': 'pkg.copier.main', 'file': 'pkg/copier.py', 'line': 10}
+    assert nodes['pkg.copier.Copier.clone']['line'] == 7
+    assert nodes['pkg.copier.Copier.__init__']['line'] == 3
+    assert 'os.getcwd' not in nodes
+    assert ('pkg.copier.main', 'pkg.copier.Copier.__init__', 10) in edges
+    assert ('pkg.copier.Copier.clone', 'os.getcwd', 7) in edges
+    assert all(record['file'] == 'pkg/copier.py' for record in records)
+
+
+def test_export_nested_functions():
+    file_object = FileObject('pkg/nested.py', source='''class Copier(object):
+    def copy(self):
+        def clone():
+            return deepcopy(self)
+        return clone()
+
+def main():
+    def run():
+        pass
+    run()
+''')
+    file_object.visit()
+    output = io.StringIO()
+    # line numbers are kept in summaries, as for files parsed by worker processes or lean
+    export_files([FileObject.from_summary(file_object.summary())], output)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    lines = dict((record['id'], record.get('line')) for record in records if record['type'] == 'node')
+    assert lines['pkg.nested.Copier.copy.clone'] == 3
+    assert lines['pkg.nested.main.run'] == 8
+    edges = [(record['source'], record['target'], record['line']) for record in records if record['type'] == 'edge']
+    assert ('pkg.nested.Copier.copy.clone', 'deepcopy', 3) in edges
+
+
+def test_export_csv_and_graphml():
+    output = io.StringIO(newline='')
+    export_files([get_file_object()], output, format='csv')
+    rows = list(csv.reader(io.StringIO(output.getvalue())))
+    assert rows[0] == ['source', 'target', 'file', 'line']
+    assert ['pkg.copier.Copier.clone', 'os.getcwd', 'pkg/copier.py', '7'] in rows
+
+    output = io.StringIO()
+    with Exporter(output, format='graphml') as exporter:
+        exporter.add_file(get_file_object())
+    namespace = '{http://graphml.graphdrawing.org/xmlns}'
+    graph = ElementTree.fromstring(output.getvalue()).find(namespace + 'graph')
+    node_ids = [node.get('id') for node in graph.iter(namespace + 'node')]
+    assert len(node_ids) == len(set(node_ids))
+    # nodes only known through edges are declared too
+    assert 'os.getcwd' in node_ids
+    for edge in graph.iter(namespace + 'edge'):
+        assert edge.get('source') in node_ids and edge.get('target') in node_ids
+
+    assert export_format('graph.graphml') == 'graphml'
+    assert export_format('graph.CSV') == 'csv'
+    assert export_format('graph.out') == 'jsonl'
+
+
+def test_failed_export_is_not_finished():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with pytest.raises(RuntimeError):
+            with Exporter('graph.graphml') as exporter:
+                exporter.add_file(get_file_object())
+                raise RuntimeError('parsing failed')
+        assert exporter._file.closed
+        with open('graph.graphml') as f:
+            assert '</graphml>' not in f.read()
+
+
+def test_cli_export():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        with open(os.path.join('pkg', 'copier.py'), 'w') as f:
+            f.write(CODE)
+        result = runner.invoke(cli, ['-r', 'pkg', '--export', 'graph.csv'])
+        assert result.exit_code == 0
+        with open('graph.csv', newline='') as f:
+            rows = list(csv.reader(f))
+        assert ['pkg.copier.main', 'pkg.copier.Copier.__init__', os.path.join('pkg', 'copier.py'), '10'] in rows
+
+        result = runner.invoke(cli, ['pkg/copier.py', '--export', '-', '--export-format', 'jsonl'])
+        assert result.exit_code == 0
+        assert json.loads(result.output.splitlines()[0])['file'] == 'pkg/copier.py'
+
+        # rows written to standard output end like rows written to files
+        result = runner.invoke(cli, ['-r', 'pkg', '--export', '-', '--export-format', 'csv'])
+        assert result.exit_code == 0
+        with open('graph.csv', 'rb') as f:
+            assert result.stdout_bytes == f.read()
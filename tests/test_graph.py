@@ -1,8 +1,16 @@
+import io
 import os
+import sys
+import threading
+import time
 
+import pytest
 from click.testing import CliRunner
 
 from cli.script import cli
+from codegrapher.dot import DotWriter, LayoutTimeoutError
+from codegrapher.graph import FrozenGraphError, FunctionGrapher, Node
+from codegrapher.parser import FileObject
 
 
 def get_graph_code():
@@ -44,3 +52,389 @@ def test_file_extension():
 
         runner.invoke(cli, ['code.py', '--output', 'code_output', '--output-format', 'png'])
         assert 'code_output' in os.listdir(os.path.curdir)
+
+
+def test_no_layout():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(get_graph_code())
+
+        result = runner.invoke(cli, ['code.py', '--output', 'code_output.gv', '--no-layout'])
+        assert result.exit_code == 0
+        assert sorted(os.listdir(os.path.curdir)) == ['code.py', 'code_output.gv']
+        with open('code_output.gv') as f:
+            source = f.read()
+        assert source.startswith('digraph {')
+        assert 'label="code.StringCopier.__init__"' in source
+
+        result = runner.invoke(cli, ['code.py', '--output', 'code_output.gv', '--output-format', ' , '])
+        assert result.exit_code == 2
+        assert 'give at least one file type' in result.output
+
+
+def test_dot_to_stdout():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(get_graph_code())
+
+        result = runner.invoke(cli, ['code.py', '--output', '-'])
+        assert result.exit_code == 0
+        assert result.output.startswith('digraph {')
+        assert result.output.count('label="code.StringCopier.copy"') == 1
+        assert sorted(os.listdir(os.path.curdir)) == ['code.py']
+
+
+def test_dot_writer_interns_labels():
+    lines = []
+
+    class Stream(object):
+        def write(self, chunk):
+            lines.extend(chunk.splitlines())
+
+    with DotWriter(Stream(), chunk_size=2) as writer:
+        writer.edge('a', 'say "b"')
+        writer.edge('a', 'c')
+        writer.edge('say "b"', 'a', color='red')
+    assert lines == [
+        'digraph {',
+        '\tn0 [label="a"]',
+        '\tn1 [label="say \\"b\\""]',
+        '\tn0 -> n1',
+        '\tn2 [label="c"]',
+        '\tn0 -> n2',
+        '\tn1 -> n0 [color="red"]',
+        '}',
+    ]
+
+
+def test_node_interning():
+    graph = FunctionGrapher()
+    graph.add_dict_to_graph(['StringCopier'], {
+        ('code', 'DoSomething', 'something'): [('StringCopier',), ('copy',), ('copy',)],
+        ('code', 'DoSomething', 'other'): [('copy',)],
+    }, 'code')
+    constructor = ('code', 'StringCopier', '__init__')
+    assert graph.intern(constructor) == graph.intern(Node(constructor))
+    assert graph.intern('copy') == graph.intern(('', 'copy'))
+    assert len(graph.nodes) == 4
+    assert graph.edges == {
+        (Node(('code', 'DoSomething', 'something')), Node(('code', 'StringCopier', '__init__'))),
+        (Node(('code', 'DoSomething', 'something')), Node('copy')),
+        (Node(('code', 'DoSomething', 'other')), Node('copy')),
+    }
+    assert set(graph.iter_edges()) == set((tail.tuple, head.tuple) for tail, head in graph.edges)
+
+    # interned nodes that are not part of the graph are not written
+    graph.intern(('code', 'filtered'))
+    output = io.StringIO()
+    graph.write_dot(output)
+    assert 'code.DoSomething.other' in output.getvalue()
+    assert 'code.filtered' not in output.getvalue()
+
+
+def test_module_level_functions_graph():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write('''
+def helper():
+    return StringCopier()
+
+def main():
+    helper()
+
+class StringCopier(object):
+    def copy(self):
+        return helper()
+''')
+
+        result = runner.invoke(cli, ['code.py', '--output', '-'])
+        assert result.exit_code == 0
+        assert result.output.count('label="code.helper"') == 1
+        assert 'label="code.main"' in result.output
+        assert 'label="helper"' not in result.output
+        assert 'label="code.StringCopier.__init__"' in result.output
+
+
+def test_nested_functions_graph():
+    file_object = FileObject('pkg/code.py', source='''
+class B(object):
+    def go(self):
+        def inner():
+            return helper()
+        return inner()
+
+def outer():
+    result = later()
+    def later():
+        class Helper(object):
+            def run(self):
+                return later()
+        return Helper()
+    return result
+
+def helper():
+    pass
+''')
+    file_object.visit()
+    graph = FunctionGrapher()
+    graph.add_file_to_graph(file_object)
+    edges = set(graph.iter_edges())
+    assert (('pkg.code', 'B', 'go'), ('pkg.code', 'B', 'go.inner')) in edges
+    assert (('pkg.code', 'B', 'go.inner'), ('pkg.code', 'helper')) in edges
+    assert (('pkg.code', 'outer'), ('pkg.code', 'outer.later')) in edges
+    assert (('pkg.code', 'outer.later'), ('pkg.code', 'outer.later.Helper', '__init__')) in edges
+    assert (('pkg.code', 'outer.later.Helper', 'run'), ('pkg.code', 'outer.later')) in edges
+    # no node stands for a nested function without its enclosing scopes
+    assert not set(graph.iter_nodes()) & {('inner',), ('later',), ('Helper',)}
+
+
+def test_subgraph():
+    graph = FunctionGrapher()
+    graph.format = 'svg'
+    for tail, head in [('main', 'load'), ('main', 'run'), ('run', 'step'), ('step', 'log'), ('other', 'log')]:
+        graph.add_edge(('code', tail), ('code', head))
+        graph.add_node(('code', tail))
+
+    callees = graph.subgraph('code.run', depth=1, direction='callees')
+    assert set(callees.iter_edges()) == {(('code', 'run'), ('code', 'step'))}
+    assert callees.format == 'svg'
+
+    both = graph.subgraph(['code.run', 'code.other'], depth=1)
+    assert set(both.iter_edges()) == {(('code', 'main'), ('code', 'run')), (('code', 'run'), ('code', 'step')),
+                                      (('code', 'other'), ('code', 'log')), (('code', 'step'), ('code', 'log'))}
+    assert sorted(both.iter_nodes()) == [('code', 'main'), ('code', 'other'), ('code', 'run'), ('code', 'step')]
+
+    everything = graph.subgraph('code.log', depth=None, direction='callers')
+    assert len(list(everything.iter_edges())) == 4
+    assert len(list(graph.iter_edges())) == 5
+
+
+def test_focus_cli():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(get_graph_code())
+
+        result = runner.invoke(cli, ['code.py', '--output', '-', '--focus', 'code.StringCopier.copy', '--depth', '1',
+                                     '--direction', 'callees'])
+        assert result.exit_code == 0
+        assert 'label="code.StringCopier.copy"' in result.output
+        assert 'label="copy.deepcopy"' in result.output
+        assert 'DoSomething' not in result.output
+
+        result = runner.invoke(cli, ['code.py', '--output', '-', '--focus', 'code.missing'])
+        assert result.exit_code == 1
+        assert 'no function named code.missing' in result.output
+
+
+def get_modules_graph():
+    graph = FunctionGrapher()
+    for tail, head in [(('a', 'Reader', 'read'), ('a', 'Reader', 'parse')),
+                       (('a', 'Reader', 'parse'), ('b', 'tokenize')), (('a', 'Reader', 'read'), ('b', 'tokenize')),
+                       (('a', 'main'), ('a', 'Reader', 'read')), (('b', 'tokenize'), ('len',))]:
+        graph.add_edge(tail, head)
+    graph.add_node(('a', 'Reader'))
+    return graph
+
+
+def test_clusters():
+    graph = get_modules_graph()
+    graph.clusters = True
+    placements, sizes = graph.aggregate()
+    clusters = dict(placements.values())
+    assert clusters == {'a.Reader.read': ('a', 'Reader'), 'a.Reader.parse': ('a', 'Reader'),
+                        'a.Reader': ('a', 'Reader'), 'a.main': ('a',), 'b.tokenize': ('b',), 'len': ()}
+    assert sizes == {}
+
+    lines = [line.strip() for line in graph_source(graph).splitlines()]
+    assert lines[:3] == ['digraph {', 'n0 [label="len"]', 'subgraph cluster_1 {']
+    start = lines.index('graph [label="a.Reader"]')
+    assert lines[start + 1:start + 5] == ['n2 [label="a.Reader"]', 'n3 [label="a.Reader.parse"]',
+                                          'n4 [label="a.Reader.read"]', '}']
+
+
+def test_max_nodes():
+    graph = get_modules_graph()
+    graph.max_nodes = 5
+    placements, sizes = graph.aggregate()
+    assert sizes == {'a.Reader (3 nodes)': 3}
+    assert len(set(label for label, cluster in placements.values())) == 4
+    source = graph_source(graph)
+    assert 'label="a.Reader (3 nodes)" shape="box"' in source
+    # the two calls from the class to b.tokenize are drawn as one weighted edge
+    assert source.count(' [label="2" weight="2"]') == 1
+
+    graph.max_nodes = 2
+    placements, sizes = graph.aggregate()
+    assert sizes == {'a (4 nodes)': 4}
+    assert set(label for label, cluster in placements.values()) == {'a (4 nodes)', 'b.tokenize', 'len'}
+
+
+def get_file_objects(count):
+    file_objects = []
+    for number in range(count):
+        file_object = FileObject('pkg/module{}.py'.format(number), source='''
+from pkg.module{0} import helper as previous
+
+class Worker(object):
+    def run(self):
+        return helper()
+
+def helper():
+    previous()
+    Worker().run()
+'''.format((number + 1) % count))
+        file_object.visit()
+        file_objects.append(file_object)
+    return file_objects
+
+
+def test_concurrent_add_and_freeze():
+    file_objects = get_file_objects(40)
+    serial = FunctionGrapher()
+    serial.add_files_to_graph(file_objects)
+    file_edge_sets = []
+    for file_object in file_objects:
+        file_graph = FunctionGrapher(symbols=serial.symbols)
+        file_graph.add_file_to_graph(file_object)
+        namespace = file_object.relative_namespace
+        file_edge_sets.append(set(edge for edge in file_graph.iter_edges() if edge[0][0] == namespace))
+
+    for track_files in (False, True):
+        graph = FunctionGrapher(track_files=track_files, symbols=serial.symbols)
+        snapshots = []
+
+        def add(file_objects):
+            for file_object in file_objects:
+                graph.add_file_to_graph(file_object)
+                snapshots.append(graph.freeze())
+
+        threads = [threading.Thread(target=add, args=(file_objects[start::4],)) for start in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert set(graph.iter_nodes()) == set(serial.iter_nodes())
+        assert set(graph.iter_edges()) == set(serial.iter_edges())
+        # snapshots taken along the way hold whole files only
+        for snapshot in snapshots:
+            edges = set(snapshot.iter_edges())
+            assert all(file_edges <= edges or not file_edges & edges for file_edges in file_edge_sets)
+
+    snapshot = graph.freeze()
+    graph.remove_file_from_graph('pkg/module0.py')
+    assert ('pkg.module0', 'Worker') in set(snapshot.iter_nodes())
+    assert ('pkg.module0', 'Worker') not in set(graph.iter_nodes())
+    with pytest.raises(FrozenGraphError):
+        snapshot.add_node(('pkg', 'extra'))
+    with pytest.raises(FrozenGraphError):
+        snapshot.add_file_to_graph(file_objects[0])
+    extra = FileObject('pkg/extra.py', source='def extra_helper():\n    pass\n')
+    extra.visit()
+    with pytest.raises(FrozenGraphError):
+        snapshot.add_files_to_graph([extra])
+    # the symbols shared with the live graph are left alone
+    assert graph.symbols.lookup('pkg.extra.extra_helper') is None
+
+
+def test_reads_do_not_copy_the_graph():
+    graph = FunctionGrapher()
+    graph.add_edge(('code', 'main'), ('code', 'helper'))
+    nodes, edges = graph._nodes, graph._edges
+    list(graph.iter_edges())
+    graph.write_dot(io.StringIO())
+    graph.add_edge(('code', 'main'), ('code', 'other'))
+    # without a snapshot, changes are made in place whatever was read before
+    assert graph._nodes is nodes and graph._edges is edges
+
+    snapshot = graph.freeze()
+    graph.add_edge(('code', 'other'), ('code', 'helper'))
+    assert graph._edges is not edges
+    assert len(list(snapshot.iter_edges())) == 2
+    edges = graph._edges
+    del snapshot
+    graph.add_edge(('code', 'helper'), ('code', 'log'))
+    assert graph._edges is edges
+
+
+def test_concurrent_add_and_read():
+    file_objects = get_file_objects(40)
+    graph = FunctionGrapher()
+    done = threading.Event()
+    errors = []
+
+    def read():
+        while not done.is_set():
+            try:
+                list(graph.iter_edges())
+                graph.write_dot(io.StringIO())
+                graph.cycles()
+            except Exception as error:
+                errors.append(error)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for file_object in file_objects:
+            graph.add_file_to_graph(file_object)
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
+
+
+def graph_source(graph):
+    output = io.StringIO()
+    graph.write_dot(output)
+    return output.getvalue()
+
+
+def write_fake_engine(monkeypatch, delay, wait_for=0):
+    # stands in for the graphviz `dot` executable: writes `<file>.<format>` for `-T<format> -O <file>`, after `delay`
+    # seconds. With `wait_for`, it first waits, for up to 10 seconds, until that many layouts have started, and writes
+    # whether they all did into the output file
+    os.mkdir('bin')
+    path = os.path.join('bin', 'dot')
+    monkeypatch.setenv('PATH', os.path.abspath('bin') + os.pathsep + os.environ.get('PATH', ''))
+    with open(path, 'w') as f:
+        f.write('#!{}\n'.format(sys.executable))
+        f.write('import glob, sys, time\n')
+        f.write('open("started." + sys.argv[1][2:], "w").close()\n')
+        f.write('deadline = time.time() + 10\n')
+        f.write('while len(glob.glob("started.*")) < {} and time.time() < deadline:\n'.format(wait_for))
+        f.write('    time.sleep(0.01)\n')
+        f.write('time.sleep({})\n'.format(delay))
+        f.write('with open(sys.argv[3] + "." + sys.argv[1][2:], "w") as output:\n')
+        f.write('    output.write(str(len(glob.glob("started.*")) >= {}))\n'.format(wait_for))
+    os.chmod(path, 0o755)
+
+
+def test_render_several_formats(monkeypatch):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_fake_engine(monkeypatch, 0, wait_for=3)
+        graph = FunctionGrapher()
+        graph.add_edge('a', 'b')
+
+        paths = graph.render('code_output', formats=['svg', 'png', 'pdf'])
+        assert paths == ['code_output.svg', 'code_output.png', 'code_output.pdf']
+        # each layout saw the others start before it finished, so they ran at the same time
+        for path in paths:
+            with open(path) as f:
+                assert f.read() == 'True'
+
+
+def test_render_timeout(monkeypatch):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_fake_engine(monkeypatch, 30)
+        graph = FunctionGrapher()
+        graph.add_edge('a', 'b')
+
+        start = time.time()
+        with pytest.raises(LayoutTimeoutError):
+            graph.render('code_output', formats=['svg', 'png'], timeout=0.2)
+        assert time.time() - start < 5
@@ -0,0 +1,57 @@
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.ignore import IgnoreMatcher, load_ignore_file
+
+
+def test_ignore_patterns():
+    matcher = IgnoreMatcher(['add', 'pkg.mod.Class.method', 'requests.*', 'test_*', r're:os\.path\.(join|split)'])
+    assert matcher.matches(('add',))
+    assert matcher.matches(('copy', 'add'))
+    assert matcher.matches(('pkg.mod.Class', 'method'))
+    assert not matcher.matches(('pkg.mod.Other', 'method'))
+    assert not matcher.matches(('method',))
+    assert matcher.matches(('requests', 'get'))
+    assert matcher.matches(('requests.sessions', 'Session'))
+    assert not matcher.matches(('requests_mock', 'get'))
+    assert matcher.matches(('test_parser',))
+    assert matcher.matches(('unittest', 'test_case'))
+    assert matcher.matches(('os.path', 'join'))
+    assert not matcher.matches(('os.path', 'exists'))
+    assert not IgnoreMatcher()
+
+
+def test_load_ignore_file_once():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert not load_ignore_file()
+        with open('.cg_ignore', 'w') as f:
+            f.write('# comment\n\nlower\n  upper  \n')
+        matcher = load_ignore_file()
+        assert matcher.patterns == ('lower', 'upper')
+        assert load_ignore_file() is matcher
+
+
+def test_cli_ignore_glob():
+    code = '''
+class StringCopier(object):
+    def copy(self, string):
+        log_error(string.lower())
+        return string.upper()
+'''
+    code_result = '''Classes in file code.py:
+================================================================================
+StringCopier
+{('code', 'StringCopier', 'copy'): [('upper',)]}
+
+'''
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(code)
+        with open('.cg_ignore', 'w') as f:
+            f.write('log_*\nlower\n')
+
+        result = runner.invoke(cli, ['code.py', '--printed', '--ignore'])
+        assert result.exit_code == 0
+        assert result.output == code_result
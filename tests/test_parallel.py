@@ -0,0 +1,128 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.graph import FunctionGrapher
+from codegrapher.parallel import parse_files
+from codegrapher.parser import FileObject
+from codegrapher.symbols import SymbolIndex
+
+
+def get_package_code():
+    return {
+        'copier.py': '''
+from copy import deepcopy as dc
+
+class StringCopier(object):
+    def __init__(self):
+        self.copied_strings = set()
+
+    def copy(self):
+        string1 = 'this'
+        string2 = dc(string1)
+        return string2
+
+    @classmethod
+    def build(cls):
+        return cls()
+''',
+        'user.py': '''
+class DoSomething(object):
+    def something(self):
+        copier = StringCopier()
+        copied_string = copier.copy()
+''',
+    }
+
+
+def write_package(directory):
+    os.mkdir(directory)
+    for file_name, code in get_package_code().items():
+        with open(os.path.join(directory, file_name), 'w') as f:
+            f.write(code)
+
+
+def test_summary_round_trip():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_package('pkg')
+        file_object = FileObject(os.path.join('pkg', 'copier.py'))
+        file_object.visit()
+        rebuilt = FileObject.from_summary(file_object.summary())
+        assert rebuilt.node is None
+        assert rebuilt.relative_namespace == 'pkg.copier'
+        assert [c.call_tree for c in rebuilt.classes] == [c.call_tree for c in file_object.classes]
+        assert [f.is_classmethod for f in rebuilt.classes[0].functions] == [False, False, True]
+        assert rebuilt.classes[0].functions[1].calls == [('copy', 'deepcopy')]
+        assert [f.lineno for f in rebuilt.classes[0].functions] == [5, 8, 14]
+
+
+def test_parallel_graph_matches_serial():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_package('pkg')
+        file_names = sorted(os.path.join('pkg', f) for f in get_package_code())
+        graphs = []
+        for jobs in (1, 2):
+            graph = FunctionGrapher()
+            for file_object in parse_files(file_names, jobs=jobs, remove_builtins=True):
+                graph.add_file_to_graph(file_object)
+            graphs.append(graph)
+        assert graphs[0].nodes == graphs[1].nodes
+        assert graphs[0].edges == graphs[1].edges
+
+
+def test_lean_parsing():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_package('pkg')
+        file_names = sorted(os.path.join('pkg', f) for f in get_package_code())
+        graphs = []
+        for lean in (False, True):
+            file_objects = list(parse_files(file_names, lean=lean))
+            graph = FunctionGrapher()
+            graph.add_files_to_graph(file_objects)
+            graphs.append(graph)
+        assert file_objects[0].node is None
+        class_object = file_objects[0].classes[0]
+        assert class_object.node is None
+        assert class_object.lineno == 4
+        assert [(f.name, f.lineno, f.node) for f in class_object.functions] == [
+            ('__init__', 5, None), ('copy', 8, None), ('build', 14, None)]
+        assert class_object.functions[2].decorator_list == ['classmethod']
+        assert graphs[0].nodes == graphs[1].nodes
+        assert graphs[0].edges == graphs[1].edges
+
+
+def test_cli_jobs_printed():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_package('pkg')
+        serial = runner.invoke(cli, ['-r', 'pkg', '--printed'])
+        parallel = runner.invoke(cli, ['-r', 'pkg', '--printed', '--jobs', '2'])
+        assert serial.exit_code == 0
+        assert parallel.exit_code == 0
+        assert parallel.output == serial.output
+
+
+def test_parse_sources_in_batch():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_package('pkg')
+        items = [os.path.join('pkg', 'copier.py'),
+                 ('pkg/user.py', get_package_code()['user.py'].encode('utf-8')),
+                 ('pkg/broken.py', b'def broken(:\n'),
+                 ('pkg/text.py', 'def text():\n    return str(1)\n')]
+        for jobs in (1, 2):
+            symbols = SymbolIndex()
+            file_objects = list(parse_files(iter(items), jobs=jobs, chunksize=1, skip_errors=True, symbols=symbols,
+                                            remove_builtins=True))
+            assert [file_object.name for file_object in file_objects] == ['pkg/copier.py', 'pkg/user.py',
+                                                                          'pkg/text.py']
+            assert file_objects[2].call_tree == {('pkg.text', 'text'): []}
+            assert symbols.lookup('pkg.copier.StringCopier.copy') == ('pkg.copier', 'StringCopier', 'copy')
+
+        with pytest.raises(SyntaxError):
+            list(parse_files(items))
@@ -7,6 +7,7 @@ from click.testing import CliRunner
 
 from codegrapher.parser import (
     ClassObject,
+    FileObject,
     FileVisitor
 )
 
@@ -58,6 +59,28 @@ class StringCopier(object):
     assert string_class_object.aliases['dc'] == 'deepcopy'
 
 
+def test_function_import_shadows_module_import():
+    code = '''
+from copy import deepcopy as dc
+
+class StringCopier(object):
+    def copy(self):
+        from shallow import copy as dc
+        return dc('this')
+
+    def deep_copy(self):
+        return dc('this')
+'''
+    parsed_code = ast.parse(code, filename='code.py')
+    visitor = FileVisitor()
+    visitor.visit(parsed_code)
+    string_class_object = visitor.classes[0]
+    assert string_class_object.call_tree[('StringCopier', 'copy')] == [('shallow', 'copy')]
+    assert string_class_object.call_tree[('StringCopier', 'deep_copy')] == [('copy', 'deepcopy')]
+    assert visitor.modules['dc'] == 'copy'
+    assert visitor.aliases['dc'] == 'deepcopy'
+
+
 def test_import_module_call_alias_only():
     code = '''
 import collections as coll
@@ -259,6 +282,120 @@ class DoSomething(object):
     assert ('upper',) in something_class.call_tree[('DoSomething', 'something')]
 
 
+def test_nested_calls_recorded_once():
+    code = '''
+class Nested(object):
+    def nest(self):
+        f(g(h(i(x))))
+
+    def keywords(self, items):
+        sorted(items, key=make_key(), *extra(), **options())
+'''
+    parsed_code = ast.parse(code, filename='code.py')
+    visitor = FileVisitor()
+    visitor.visit(parsed_code)
+    nested_class = visitor.classes[0]
+    assert nested_class.call_tree[('Nested', 'nest')] == [('i',), ('h',), ('g',), ('f',)]
+    assert sorted(nested_class.call_tree[('Nested', 'keywords')]) == [
+        ('extra',), ('make_key',), ('options',), ('sorted',)]
+
+
+def test_chained_calls():
+    code = '''
+import os
+
+class Builder(object):
+    def build(self):
+        Query().where(clause()).order_by(os.path.join('a', 'b')).all()
+'''
+    parsed_code = ast.parse(code, filename='code.py')
+    visitor = FileVisitor()
+    visitor.visit(parsed_code)
+    builder_class = visitor.classes[0]
+    assert builder_class.call_tree[('Builder', 'build')] == [
+        ('Query',), ('clause',), ('where',), ('os.path', 'join'), ('order_by',), ('all',)]
+
+
+def test_module_level_functions():
+    code = '''
+import os
+
+def helper(path):
+    return os.path.join(path, 'x')
+
+def main():
+    helper(os.getcwd())
+
+main()
+'''
+    parsed_code = ast.parse(code, filename='code.py')
+    visitor = FileVisitor()
+    visitor.visit(parsed_code)
+    assert [function.name for function in visitor.functions] == ['helper', 'main']
+    assert visitor.call_tree[('helper',)] == [('os.path', 'join')]
+    assert visitor.call_tree[('main',)] == [('os', 'getcwd'), ('helper',)]
+    assert visitor.call_tree[('<module>',)] == [('main',)]
+
+
+def test_nested_scopes():
+    code = '''
+@register(name())
+def outer(value=default()):
+    from copy import deepcopy
+    def inner():
+        deepcopy(value)
+    return inner()
+
+class Outer(object):
+    registry = make_registry()
+
+    class Inner(object):
+        def method(self):
+            def closure():
+                self.run()
+            closure()
+'''
+    parsed_code = ast.parse(code, filename='code.py')
+    visitor = FileVisitor()
+    visitor.visit(parsed_code)
+    assert [function.name for function in visitor.functions] == ['outer']
+    assert visitor.call_tree[('<module>',)] == [('name',), ('register',), ('default',)]
+    assert visitor.call_tree[('outer',)] == [('outer.inner',)]
+    assert visitor.call_tree[('outer.inner',)] == [('copy', 'deepcopy')]
+
+    outer_class, inner_class = sorted(visitor.classes, key=lambda cls: cls.name)
+    assert outer_class.name == 'Outer'
+    assert outer_class.call_tree == {('Outer',): [('make_registry',)]}
+    assert inner_class.name == 'Outer.Inner'
+    assert [function.name for function in inner_class.functions] == ['method']
+    assert inner_class.call_tree[('Outer.Inner', 'method')] == [('Outer.Inner.method.closure',)]
+    assert inner_class.call_tree[('Outer.Inner', 'method.closure')] == [('run',)]
+
+
+def test_dotted_decorators():
+    code = '''
+import pytest
+
+@pytest.mark.slow
+def test_slow():
+    run()
+
+class Value(object):
+    @property
+    def value(self):
+        return 1
+
+    @value.setter
+    def value(self, value):
+        store(value)
+'''
+    file_object = FileObject('code.py', source=code)
+    file_object.visit()
+    assert file_object.functions[0].decorator_list == ['pytest.mark.slow']
+    assert [function.decorator_list for function in file_object.classes[0].functions] == [['property'],
+                                                                                          ['value.setter']]
+
+
 def test_multiple_files():
     code = '''
 from copy import deepcopy as dc
@@ -339,6 +476,24 @@ StringCopier
         assert result.output == code_result
 
 
+def test_class_object_keeps_nested_classes():
+    code = '''
+class Outer(object):
+    def run(self):
+        helper()
+
+    class Inner(object):
+        def step(self):
+            other()
+'''
+    class_object = ClassObject(node=ast.parse(code).body[0])
+    class_object.visit()
+    assert [function_object.name for function_object in class_object.functions] == ['run']
+    assert class_object.call_tree == {('Outer', 'run'): [('helper',)]}
+    assert [nested.name for nested in class_object.classes] == ['Outer.Inner']
+    assert class_object.classes[0].call_tree == {('Outer.Inner', 'step'): [('other',)]}
+
+
 def test_is_builtin():
     assert ClassObject.is_builtin('set') is True
 
@@ -0,0 +1,110 @@
+import json
+import threading
+
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher import profiling
+from codegrapher.graph import FunctionGrapher
+from codegrapher.parser import FileObject
+from codegrapher.profiling import Profiler
+
+
+def get_code():
+    return '''
+from copy import deepcopy as dc
+
+class StringCopier(object):
+    def copy(self):
+        return dc('this')
+'''
+
+
+def test_profiler_records_stages():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(get_code())
+
+        with Profiler(memory=True) as profiler:
+            file_object = FileObject('code.py')
+            file_object.visit()
+            file_object.remove_builtins()
+            FunctionGrapher().add_file_to_graph(file_object)
+        assert profiling.stage('parse') is profiling.stage('visit')
+        assert sorted(profiler.stages) == ['filter', 'graph', 'parse', 'read', 'visit']
+        assert all(calls == 1 for calls, seconds, peak in profiler.stages.values())
+        assert profiler.stages['parse'][2] > 0
+        assert [file_name for file_name, seconds in profiler.slowest_files()] == ['code.py']
+
+        profiler.write_chrome_trace('trace.json')
+        with open('trace.json') as f:
+            events = json.load(f)['traceEvents']
+        assert [event['name'] for event in events] == ['read', 'parse', 'visit', 'filter', 'graph']
+        assert events[0]['args'] == {'file': 'code.py'}
+
+
+def test_profiler_counts_nested_stages_once():
+    with Profiler() as profiler:
+        with profiling.stage('parse', 'code.py'):
+            with profiling.stage('read', 'code.py'):
+                pass
+            with profiling.stage('visit', 'code.py'):
+                pass
+        with profiling.stage('graph', 'code.py'):
+            pass
+    assert profiler.files['code.py'] == profiler.stages['parse'][1] + profiler.stages['graph'][1]
+
+
+def test_profiler_measures_peak_memory():
+    with Profiler(memory=True) as profiler:
+        with profiling.stage('outer'):
+            freed = [bytes(1000) for number in range(1000)]
+            del freed
+            with profiling.stage('inner'):
+                pass
+    # memory freed by a stage does not hide what it allocated, and nested stages do not reset the enclosing peak
+    assert profiler.stages['outer'][2] >= 1000000
+    assert 0 <= profiler.stages['inner'][2] < 1000000
+
+
+def test_profiler_records_stages_from_threads():
+    # threads wait for each other, as the ids of finished threads are reused
+    barrier = threading.Barrier(4)
+
+    def record(thread):
+        for number in range(500):
+            with profiling.stage('graph', 'file{}_{}.py'.format(thread, number)):
+                pass
+        barrier.wait()
+
+    with Profiler() as profiler:
+        threads = [threading.Thread(target=record, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert profiler.stages['graph'][0] == 2000
+    assert len(profiler.files) == len(profiler.events) == 2000
+    assert len(set(event[4] for event in profiler.events)) == 4
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        profiler.write_chrome_trace('trace.json')
+        with open('trace.json') as f:
+            events = json.load(f)['traceEvents']
+        assert set(event['tid'] for event in events) == set(event[4] for event in profiler.events)
+
+
+def test_cli_profile():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write(get_code())
+
+        result = runner.invoke(cli, ['code.py', '--output', 'out.gv', '--no-layout', '--profile-stats', 'run.pstats'])
+        assert result.exit_code == 0
+        assert 'write_dot' in result.output
+        assert 'slowest files:' in result.output
+        with open('run.pstats', 'rb') as f:
+            assert f.read()
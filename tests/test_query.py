@@ -0,0 +1,86 @@
+import pytest
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.graph import FunctionGrapher
+from codegrapher.query import GraphIndex
+from codegrapher.store import MappedGraph, save_graph
+
+
+def get_graph():
+    graph = FunctionGrapher()
+    for tail, head in [('main', 'load'), ('main', 'run'), ('run', 'step'), ('step', 'run'), ('step', 'log'),
+                       ('load', 'log'), ('other', 'log')]:
+        graph.add_edge(('code', tail), ('code', head))
+    return graph
+
+
+def test_graph_index():
+    index = GraphIndex(get_graph())
+    assert index.node_count == 6
+    assert index.edge_count == 7
+    assert index.callees('code.main') == ['code.load', 'code.run']
+    assert index.callers('code.log') == ['code.load', 'code.other', 'code.step']
+    assert index.neighborhood('code.run', depth=1) == {'code.run': 0, 'code.step': 1, 'code.main': 1}
+    assert index.neighborhood('code.main', depth=2, direction='callees') == {
+        'code.main': 0, 'code.load': 1, 'code.run': 1, 'code.log': 2, 'code.step': 2}
+    assert index.reachable('code.main') == {'code.load', 'code.run', 'code.step', 'code.log'}
+    assert index.reachable('code.run') == {'code.run', 'code.step', 'code.log'}
+    assert index.reachable('code.log', direction='callers') == {'code.load', 'code.other', 'code.step',
+                                                               'code.run', 'code.main'}
+    assert index.reachable('code.log', direction='both') == {'code.load', 'code.other', 'code.step', 'code.run',
+                                                            'code.main'}
+    assert index.reachable('code.run', direction='both') == {'code.run', 'code.step', 'code.log', 'code.main',
+                                                            'code.load', 'code.other'}
+    recursive = FunctionGrapher()
+    recursive.add_edge(('code', 'walk'), ('code', 'walk'))
+    assert GraphIndex(recursive).reachable('code.walk', direction='both') == {'code.walk'}
+    assert index.shortest_path('code.main', 'code.log') == ['code.main', 'code.load', 'code.log']
+    assert index.shortest_path('code.log', 'code.main') is None
+    assert index.shortest_path('code.log', 'code.main', direction='callers') == [
+        'code.log', 'code.load', 'code.main']
+    with pytest.raises(KeyError):
+        index.callers('code.missing')
+    with pytest.raises(ValueError):
+        index.neighborhood('code.main', direction='sideways')
+
+
+def test_mapped_graph_queries():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        index = GraphIndex(get_graph())
+        save_graph(index, 'code.cgraph')
+        with MappedGraph('code.cgraph') as graph:
+            assert list(graph.iter_edges()) == list(index.iter_edges())
+            assert graph.reachable('code.main') == index.reachable('code.main')
+            assert graph.shortest_path('code.main', 'code.log') == index.shortest_path('code.main', 'code.log')
+
+
+def test_cli_query():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write('''
+def helper():
+    pass
+
+def run():
+    helper()
+
+def main():
+    run()
+''')
+        result = runner.invoke(cli, ['query', 'code.py', 'callers', 'code.helper'])
+        assert result.exit_code == 0
+        assert result.output == 'code.run\n'
+
+        result = runner.invoke(cli, ['code.py', '--save-graph', 'code.cgraph'])
+        assert result.exit_code == 0
+        result = runner.invoke(cli, ['query', 'code.cgraph', 'path', 'code.main', 'code.helper'])
+        assert result.output == 'code.main\ncode.run\ncode.helper\n'
+        result = runner.invoke(cli, ['query', 'code.cgraph', 'neighborhood', 'code.run'])
+        assert result.output == '0\tcode.run\n1\tcode.helper\n1\tcode.main\n'
+
+        result = runner.invoke(cli, ['query', 'code.cgraph', 'callees', 'code.missing'])
+        assert result.exit_code == 1
+        assert 'no function named code.missing' in result.output
@@ -0,0 +1,93 @@
+import subprocess
+
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher import revisions
+from codegrapher.revisions import diff_revisions, git_tree
+
+
+def git(*arguments):
+    subprocess.run(('git', '-c', 'user.name=test', '-c', 'user.email=test@example.com') + arguments, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def commit(files):
+    for file_name, source in files.items():
+        with open(file_name, 'w') as output_file:
+            output_file.write(source)
+    git('add', '.')
+    git('commit', '-q', '-m', 'revision')
+
+
+def make_repository():
+    git('init', '-q')
+    commit({
+        'main.py': 'def main():\n    load()\n    run()\n',
+        'helpers.py': 'def helper():\n    print()\n',
+        'notes.txt': 'not python\n',
+    })
+    commit({
+        'main.py': 'def main():\n    load()\n    save()\n\ndef save():\n    write()\n',
+    })
+
+
+def test_git_tree():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        make_repository()
+        files = git_tree('HEAD')
+        assert sorted(files) == ['helpers.py', 'main.py']
+        assert files['helpers.py'] == git_tree('HEAD~1')['helpers.py']
+        assert files['main.py'] != git_tree('HEAD~1')['main.py']
+
+
+def test_diff_revisions():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        make_repository()
+        changes = diff_revisions('HEAD~1', 'HEAD')
+        assert changes.added_nodes == {'main.save', 'write'}
+        assert changes.removed_nodes == {'run'}
+        assert changes.added_edges == {('main.main', 'main.save'), ('main.save', 'write')}
+        assert changes.removed_edges == {('main.main', 'run')}
+        # helpers.py is the same blob in both revisions and is only parsed once
+        assert changes.read_files == 3
+        assert not diff_revisions('HEAD', 'HEAD')
+
+
+def test_diff_command():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        make_repository()
+        result = runner.invoke(cli, ['diff', 'HEAD~1', 'HEAD'])
+        assert result.exit_code == 0
+        assert result.output.splitlines() == [
+            '- node run',
+            '+ node main.save',
+            '+ node write',
+            '- edge main.main -> run',
+            '+ edge main.main -> main.save',
+            '+ edge main.save -> write',
+        ]
+
+        result = runner.invoke(cli, ['diff', 'HEAD~1', 'HEAD', '--output', '-'])
+        assert result.exit_code == 0
+        assert 'color="red" fontcolor="red" label="run"' in result.output
+        assert 'color="darkgreen" fontcolor="darkgreen" label="main.save"' in result.output
+        assert 'label="main.main"' in result.output
+
+        result = runner.invoke(cli, ['diff', 'HEAD~1', 'no-such-revision'])
+        assert result.exit_code != 0
+        assert 'could not read revisions' in result.output
+        assert 'no-such-revision' in result.output.split(': ', 1)[1]
+
+
+def test_diff_command_missing_blob(monkeypatch):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        make_repository()
+        monkeypatch.setattr(revisions, 'git_tree', lambda revision, path='.': {'main.py': '0' * 40})
+        result = runner.invoke(cli, ['diff', 'HEAD~1', 'HEAD'])
+        assert result.exit_code == 1
+        assert result.output == 'Error: cannot read blob {} of main.py\n'.format('0' * 40)
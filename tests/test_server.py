@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+
+from click.testing import CliRunner
+
+from codegrapher.server import GraphServer
+from codegrapher.watch import Project
+
+
+async def ask(address, *requests):
+    reader, writer = await asyncio.open_connection(*address)
+    answers = []
+    for request in requests:
+        writer.write((request if isinstance(request, str) else json.dumps(request)).encode('utf-8') + b'\n')
+        await writer.drain()
+        answers.append(json.loads(await reader.readline()))
+    writer.close()
+    return answers
+
+
+async def run_server(write_source):
+    server = GraphServer(Project('pkg', recursive=True))
+    listener = await server.start()
+    address = listener.sockets[0].getsockname()[:2]
+    try:
+        first, second = await asyncio.gather(
+            ask(address, {'id': 7, 'query': 'callers', 'names': ['pkg.b.helper']},
+                {'query': 'path', 'names': ['pkg.a.main', 'pkg.b.helper']},
+                {'query': 'callers', 'names': ['pkg.a.missing']}, 'not json', {'query': 'drop'}),
+            ask(address, {'query': 'stats'}, {'query': 'neighborhood', 'names': ['pkg.a.main'], 'depth': None}))
+
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n\ndef extra():\n    helper()\n', 2000)
+        third = await ask(address, {'query': 'refresh'}, {'query': 'callers', 'names': ['pkg.b.helper']})
+    finally:
+        await server.close()
+    return first, second, third
+
+
+def test_graph_server(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), 'from pkg.b import helper\n\ndef main():\n    helper()\n', 1000)
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n', 1000)
+        first, second, third = asyncio.run(run_server(write_source))
+
+        assert first[0] == {'id': 7, 'result': ['pkg.a.main']}
+        assert first[1] == {'result': ['pkg.a.main', 'pkg.b.helper']}
+        assert first[2] == {'error': 'no function named pkg.a.missing in the graph'}
+        assert 'error' in first[3] and 'error' in first[4]
+        assert second[0] == {'result': {'files': 2, 'nodes': 2, 'edges': 1}}
+        assert second[1] == {'result': {'pkg.a.main': 0, 'pkg.b.helper': 1}}
+
+        assert third[0] == {'result': {'parsed': [os.path.join('pkg', 'b.py')], 'removed': [], 'errors': []}}
+        assert third[1] == {'result': ['pkg.a.main', 'pkg.b.extra']}
+
+
+async def poll_server(write_source):
+    server = GraphServer(Project('pkg', recursive=True, jobs=2), refresh_interval=0.05)
+    listener = await server.start()
+    address = listener.sockets[0].getsockname()[:2]
+    try:
+        write_source(os.path.join('pkg', 'a.py'), 'def main(:\n', 2000)
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n\ndef extra():\n    helper()\n', 2000)
+        for attempt in range(100):
+            await asyncio.sleep(0.05)
+            if os.path.join('pkg', 'a.py') in server.project.errors:
+                break
+        polled = await ask(address, {'query': 'callers', 'names': ['pkg.b.helper']})
+
+        def fail():
+            raise RuntimeError('disk on fire')
+
+        server.project.refresh = fail
+        failed = await ask(address, {'query': 'refresh'}, {'query': 'stats'})
+        await asyncio.sleep(0.2)
+        polling = not server._poller.done()
+    finally:
+        await server.close()
+    return polled, failed, polling
+
+
+def test_graph_server_survives_errors(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), 'from pkg.b import helper\n\ndef main():\n    helper()\n', 1000)
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n', 1000)
+        polled, failed, polling = asyncio.run(poll_server(write_source))
+
+        # the invalid file keeps its last good state, and the valid one is updated
+        assert polled == [{'result': ['pkg.a.main', 'pkg.b.extra']}]
+        assert failed[0] == {'error': 'internal error: RuntimeError: disk on fire'}
+        assert failed[1] == {'result': {'files': 2, 'nodes': 3, 'edges': 2}}
+        assert polling
+
+
+async def index_server(write_source):
+    server = GraphServer(Project('pkg', recursive=True))
+    listener = await server.start()
+    address = listener.sockets[0].getsockname()[:2]
+    try:
+        first_index = server.index
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n\ndef extra():\n    helper()\n', 2000)
+        await server.refresh()
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n\ndef extra():\n    pass\n', 3000)
+        await server.refresh()
+        # refreshes leave indexing to the next query
+        refreshed_index = server.index
+        answers = await ask(address, {'query': 'callers', 'names': ['pkg.b.helper']},
+                            {'query': 'neighborhood', 'names': ['pkg.a.main'], 'depth': True})
+    finally:
+        await server.close()
+    return first_index, refreshed_index, server.index, answers
+
+
+def test_graph_server_indexes_on_query(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), 'from pkg.b import helper\n\ndef main():\n    helper()\n', 1000)
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n', 1000)
+        first_index, refreshed_index, queried_index, answers = asyncio.run(index_server(write_source))
+
+        assert refreshed_index is first_index
+        assert queried_index is not first_index
+        assert answers[0] == {'result': ['pkg.a.main']}
+        assert answers[1] == {'error': 'depth must be a non-negative integer or null, not True'}
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from cli import script
+from cli.script import cli
+from codegrapher.graph import FunctionGrapher
+from codegrapher.store import MappedGraph, save_graph, source_digest
+from codegrapher.watch import Project
+
+
+def get_graph():
+    graph = FunctionGrapher()
+    graph.add_dict_to_graph(['StringCopier'], {
+        ('code', 'DoSomething', 'something'): [('StringCopier',), ('copy',)],
+        ('code', 'StringCopier', 'copy'): [('copy', 'deepcopy'), ('copy',)],
+    }, 'code')
+    return graph
+
+
+def test_save_and_load_graph():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write('pass\n')
+        save_graph(get_graph(), 'code.cgraph', sources=['code.py'])
+
+        with MappedGraph('code.cgraph') as graph:
+            assert graph.node_count == 5
+            assert graph.edge_count == 4
+            assert [graph.label(node) for node in range(len(graph))] == sorted(
+                graph.label(node) for node in range(len(graph)))
+            assert graph.callees('code.DoSomething.something') == ['code.StringCopier.__init__', 'copy']
+            assert graph.callers('copy') == ['code.DoSomething.something', 'code.StringCopier.copy']
+            assert graph.callees('copy') == []
+            assert 'copy.deepcopy' in graph
+            assert 'missing' not in graph
+            with pytest.raises(KeyError):
+                graph.index('missing')
+            assert len(list(graph.iter_edges())) == 4
+            assert graph.sources == {'code.py': source_digest('code.py')}
+            assert graph.stale_sources() == []
+
+            with open('code.py', 'w') as f:
+                f.write('pass  # changed\n')
+            assert graph.stale_sources() == ['code.py']
+
+
+def test_load_invalid_graph():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.cgraph', 'wb') as f:
+            f.write(b'digraph {}' * 20)
+        with pytest.raises(ValueError):
+            MappedGraph('code.cgraph')
+
+
+def test_cli_save_graph():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open('code.py', 'w') as f:
+            f.write('''
+def helper():
+    pass
+
+def main():
+    helper()
+''')
+        result = runner.invoke(cli, ['code.py', '--save-graph', 'code.cgraph'])
+        assert result.exit_code == 0
+        assert sorted(os.listdir(os.path.curdir)) == ['code.cgraph', 'code.py']
+        with MappedGraph('code.cgraph') as graph:
+            assert graph.callers('code.helper') == ['code.main']
+            assert list(graph.sources) == ['code.py']
+
+
+def test_cli_watch_save_graph(monkeypatch, write_source):
+    hashed = []
+
+    def counting_digest(file_name):
+        hashed.append(file_name)
+        return source_digest(file_name)
+
+    def watch(project, interval):
+        write_source(os.path.join('pkg', 'b.py'), 'def helper():\n    pass\n\ndef extra():\n    helper()\n', 2000)
+        yield project.refresh()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(script, 'source_digest', counting_digest)
+    monkeypatch.setattr(Project, 'watch', watch)
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        for file_name, code in (('a.py', 'from pkg.b import helper\n\ndef main():\n    helper()\n'),
+                                ('b.py', 'def helper():\n    pass\n')):
+            write_source(os.path.join('pkg', file_name), code, 1000)
+        result = runner.invoke(cli, ['-r', 'pkg', '--watch', '--save-graph', 'pkg.cgraph'])
+        assert result.exit_code == 0
+
+        # only the changed file is hashed again
+        assert sorted(hashed) == [os.path.join('pkg', 'a.py'), os.path.join('pkg', 'b.py'), os.path.join('pkg', 'b.py')]
+        with MappedGraph('pkg.cgraph') as graph:
+            assert graph.callers('pkg.b.helper') == ['pkg.a.main', 'pkg.b.extra']
+            assert graph.stale_sources() == []
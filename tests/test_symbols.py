@@ -0,0 +1,73 @@
+import os
+
+from click.testing import CliRunner
+
+from cli.script import cli
+from codegrapher.parser import FileObject
+from codegrapher.symbols import SymbolIndex, absolute_module
+
+
+def test_absolute_module():
+    assert absolute_module('os.path', 'pkg.sub.mod') == 'os.path'
+    assert absolute_module('.utils', 'pkg.sub.mod') == 'pkg.sub.utils'
+    assert absolute_module('..utils', 'pkg.sub.mod') == 'pkg.utils'
+    assert absolute_module('.', 'pkg.sub.mod') == 'pkg.sub'
+    assert absolute_module('.utils', 'pkg.__init__') == 'pkg.utils'
+    assert absolute_module('...utils', 'pkg.mod') == 'utils'
+
+
+def test_relative_imports():
+    file_object = FileObject('pkg/sub/mod.py', source='''
+from . import utils
+from ..base import Base as B
+
+def run():
+    utils.helper()
+    B()
+''')
+    file_object.visit()
+    assert file_object.call_tree[('pkg.sub.mod', 'run')] == [('.utils', 'helper'), ('..base', 'Base')]
+
+
+def test_symbol_index():
+    symbols = SymbolIndex()
+    for name, source in [('src/pkg/utils.py', 'def helper():\n    pass\n'),
+                         ('src/pkg/models.py', 'class Model(object):\n    def save(self):\n        pass\n'),
+                         ('src/other/models.py', 'class Model(object):\n    pass\n')]:
+        file_object = FileObject(name, source=source)
+        file_object.visit()
+        symbols.add_file(file_object)
+
+    assert symbols.resolve(('pkg.utils', 'helper'), 'src.pkg.views') == ('src.pkg.utils', 'helper')
+    assert symbols.resolve(('.utils', 'helper'), 'src.pkg.views') == ('src.pkg.utils', 'helper')
+    assert symbols.resolve(('pkg.models', 'Model'), 'src.pkg.views') == ('src.pkg.models', 'Model', '__init__')
+    assert symbols.resolve(('pkg.models.Model', 'save'), 'src.pkg.views') == ('src.pkg.models', 'Model', 'save')
+    # `models.Model` is defined in two packages
+    assert symbols.resolve(('models', 'Model'), 'src.pkg.views') is None
+    assert symbols.resolve(('helper',), 'src.pkg.utils') == ('src.pkg.utils', 'helper')
+    assert symbols.resolve(('helper',), 'src.pkg.views') is None
+
+    symbols.remove_file('src/other/models.py')
+    assert symbols.resolve(('models', 'Model'), 'src.pkg.views') == ('src.pkg.models', 'Model', '__init__')
+
+
+def test_cli_links_calls_across_files():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        with open(os.path.join('pkg', '__init__.py'), 'w') as f:
+            f.write('from .utils import helper\n')
+        with open(os.path.join('pkg', 'utils.py'), 'w') as f:
+            f.write('def helper():\n    pass\n')
+        with open(os.path.join('pkg', 'views.py'), 'w') as f:
+            f.write('''
+from pkg import utils
+from .utils import helper as h
+
+def index():
+    utils.helper()
+    h()
+''')
+        result = runner.invoke(cli, ['query', 'pkg', 'callers', 'pkg.utils.helper'])
+        assert result.exit_code == 0
+        assert result.output == 'pkg.views.index\n'
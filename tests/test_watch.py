@@ -0,0 +1,111 @@
+import os
+
+from click.testing import CliRunner
+
+from codegrapher.graph import Node
+from codegrapher.watch import Project
+
+
+def test_project_refresh(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), '''
+class A(object):
+    def run(self):
+        helper()
+''', 1000)
+        write_source(os.path.join('pkg', 'b.py'), '''
+class B(object):
+    def run(self):
+        helper()
+''', 1000)
+        project = Project('pkg', recursive=True)
+        parsed, removed = project.refresh()
+        assert sorted(f.name for f in parsed) == [os.path.join('pkg', 'a.py'), os.path.join('pkg', 'b.py')]
+        assert (Node(('pkg.a', 'A', 'run')), Node('helper')) in project.graph.edges
+        assert project.refresh() == ([], [])
+
+        write_source(os.path.join('pkg', 'a.py'), '''
+class A(object):
+    def run(self):
+        other()
+''', 2000)
+        parsed, removed = project.refresh()
+        assert [f.name for f in parsed] == [os.path.join('pkg', 'a.py')]
+        edges = project.graph.edges
+        assert (Node(('pkg.a', 'A', 'run')), Node('helper')) not in edges
+        assert (Node(('pkg.a', 'A', 'run')), Node('other')) in edges
+        assert Node('helper') in project.graph.nodes
+
+        os.remove(os.path.join('pkg', 'b.py'))
+        parsed, removed = project.refresh()
+        assert removed == [os.path.join('pkg', 'b.py')]
+        assert Node('helper') not in project.graph.nodes
+        assert list(project.files) == [os.path.join('pkg', 'a.py')]
+
+
+def test_project_keeps_last_good_state(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_source('code.py', '''
+class A(object):
+    def run(self):
+        helper()
+''', 1000)
+        project = Project('code.py')
+        project.refresh()
+        write_source('code.py', 'class A(object:\n', 2000)
+        assert project.refresh() == ([], [])
+        assert 'code.py' in project.errors
+        assert (Node(('code', 'A', 'run')), Node('helper')) in project.graph.edges
+
+
+def test_project_parallel_refresh_with_invalid_file(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), 'def main():\n    helper()\n', 1000)
+        write_source(os.path.join('pkg', 'bad.py'), 'def broken(:\n', 1000)
+        project = Project('pkg', recursive=True, jobs=2)
+        parsed, removed = project.refresh()
+        assert [f.name for f in parsed] == [os.path.join('pkg', 'a.py')]
+        assert list(project.files) == [os.path.join('pkg', 'a.py')]
+        assert isinstance(project.errors[os.path.join('pkg', 'bad.py')], SyntaxError)
+
+        write_source(os.path.join('pkg', 'bad.py'), 'def fixed():\n    pass\n', 2000)
+        parsed, removed = project.refresh()
+        assert [f.name for f in parsed] == [os.path.join('pkg', 'bad.py')]
+        assert project.errors == {}
+
+
+def test_project_relinks_callers_of_changed_definitions(write_source):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        os.mkdir('pkg')
+        write_source(os.path.join('pkg', 'a.py'), 'from pkg.b import Helper\n\ndef main():\n    Helper()\n', 1000)
+        write_source(os.path.join('pkg', 'b.py'), 'class Helper(object):\n    pass\n', 1000)
+        project = Project('pkg', recursive=True)
+        project.refresh()
+        assert (Node(('pkg.a', 'main')), Node(('pkg.b', 'Helper', '__init__'))) in project.graph.edges
+
+        def fresh_edges():
+            graph = Project('pkg', recursive=True)
+            graph.refresh()
+            return graph.graph.edges
+
+        # a.py is not changed, but its call no longer refers to a definition of b.py
+        write_source(os.path.join('pkg', 'b.py'), 'class Other(object):\n    pass\n', 2000)
+        parsed, removed = project.refresh()
+        assert [f.name for f in parsed] == [os.path.join('pkg', 'b.py')]
+        assert project.graph.edges == fresh_edges()
+        assert (Node(('pkg.a', 'main')), Node(('pkg.b', 'Helper', '__init__'))) not in project.graph.edges
+
+        write_source(os.path.join('pkg', 'b.py'), 'class Helper(object):\n    pass\n', 3000)
+        project.refresh()
+        assert project.graph.edges == fresh_edges()
+        assert (Node(('pkg.a', 'main')), Node(('pkg.b', 'Helper', '__init__'))) in project.graph.edges
+
+        os.remove(os.path.join('pkg', 'b.py'))
+        project.refresh()
+        assert project.graph.edges == fresh_edges()